@@ -1,22 +1,23 @@
 import os
+import json
 import logging
 from flask import Flask
-from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager
+from app.utils.partitions import RoutingSQLAlchemy
 
 # Configuração de logging para depuração
 logging.basicConfig()
 logging.getLogger('sqlalchemy').setLevel(logging.INFO)
 logging.getLogger('sqlalchemy.engine').setLevel(logging.INFO)
 
-# Inicializa as extensões
-db = SQLAlchemy()
+# Inicializa as extensões (sessão roteada por partição, ver app/utils/partitions.py)
+db = RoutingSQLAlchemy()
 login_manager = LoginManager()
 login_manager.login_view = 'auth.login'
 login_manager.login_message = 'Por favor, faça login para acessar esta página.'
 login_manager.login_message_category = 'info'
 
-def create_app():
+def create_app(config=None):
     app = Flask(__name__)
     
     # Configuração do banco de dados
@@ -24,30 +25,157 @@ def create_app():
     app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///esportes.db'
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
     
-    # Inicializa o banco de dados com a aplicação
+    # Tempo de vida (segundos) do cache da página inicial
+    app.config['PAGE_CACHE_TTL'] = int(os.environ.get('PAGE_CACHE_TTL', 60))
+    
+    # Backend dos caches: vazio = memória do processo, 'file:///dev/shm/esportes' ou 'redis://host:6379/0'
+    app.config['CACHE_BACKEND'] = os.environ.get('CACHE_BACKEND', '')
+    app.config['CACHE_MAX_BYTES'] = int(os.environ.get('CACHE_MAX_BYTES', 32 * 1024 * 1024))
+    
+    # Tempo de vida (segundos) das páginas de sala abertas pelo link compartilhado
+    app.config['ROOM_CACHE_TTL'] = int(os.environ.get('ROOM_CACHE_TTL', 300))
+    
+    # Calendários .ics: meses à frente incluídos e tempo de vida (s) dos pedaços mensais
+    app.config['ICAL_MONTHS_AHEAD'] = int(os.environ.get('ICAL_MONTHS_AHEAD', 6))
+    app.config['ICAL_TTL'] = int(os.environ.get('ICAL_TTL', 3600))
+    
+    # Backend dos eventos em tempo real (vazio = apenas dentro do processo)
+    app.config['EVENTS_BACKEND'] = os.environ.get('EVENTS_BACKEND', '')
+    app.config['EVENTS_KEEPALIVE'] = 15
+    
+    # Fila de tarefas em segundo plano (arquivo SQLite próprio)
+    app.config['JOBS_DB_PATH'] = os.environ.get('JOBS_DB_PATH', '')
+    app.config['JOBS_INLINE_WORKER'] = os.environ.get('JOBS_INLINE_WORKER', '1') == '1'
+    app.config['JOBS_CONCURRENCY'] = int(os.environ.get('JOBS_CONCURRENCY', 2))
+    # Dias que execuções terminadas ficam no arquivo da fila (0 = nunca apaga)
+    app.config['JOBS_RETENTION_DAYS'] = int(os.environ.get('JOBS_RETENTION_DAYS', 7))
+    
+    # Hash de senhas: método/custo e limites de verificação simultânea
+    app.config['PASSWORD_METHOD'] = os.environ.get('PASSWORD_METHOD', 'pbkdf2:sha256:260000')
+    app.config['PASSWORD_HASH_WORKERS'] = int(os.environ.get('PASSWORD_HASH_WORKERS', os.cpu_count() or 1))
+    app.config['PASSWORD_MAX_PER_IP'] = int(os.environ.get('PASSWORD_MAX_PER_IP', 2))  # por cliente, ver abaixo
+    # Cliente do limite acima: 'ip' (endereço do cliente) ou 'username' (conta alvo do login)
+    app.config['PASSWORD_LIMIT_KEY'] = os.environ.get('PASSWORD_LIMIT_KEY', 'ip')
+    
+    # Proxies reversos confiáveis à frente da aplicação (0 = acesso direto); com N > 0 o IP do
+    # cliente (request.remote_addr) e o esquema vêm dos N últimos valores de X-Forwarded-For/-Proto
+    app.config['TRUSTED_PROXIES'] = int(os.environ.get('TRUSTED_PROXIES', 0))
+    
+    # Arquivamento de salas antigas: horizonte (dias), tamanho do lote e intervalo (s) entre execuções (0 = desligado)
+    app.config['ARCHIVE_HORIZON_DAYS'] = int(os.environ.get('ARCHIVE_HORIZON_DAYS', 90))
+    app.config['ARCHIVE_BATCH_SIZE'] = int(os.environ.get('ARCHIVE_BATCH_SIZE', 500))
+    app.config['ARCHIVE_INTERVAL'] = int(os.environ.get('ARCHIVE_INTERVAL', 24 * 60 * 60))
+    
+    # Avisos por e-mail (sem MAIL_SERVER, apenas registrados no log)
+    app.config['MAIL_SERVER'] = os.environ.get('MAIL_SERVER', '')
+    app.config['MAIL_PORT'] = int(os.environ.get('MAIL_PORT', 25))
+    app.config['MAIL_USE_TLS'] = os.environ.get('MAIL_USE_TLS', '0') == '1'
+    app.config['MAIL_USERNAME'] = os.environ.get('MAIL_USERNAME', '')
+    app.config['MAIL_PASSWORD'] = os.environ.get('MAIL_PASSWORD', '')
+    app.config['MAIL_FROM'] = os.environ.get('MAIL_FROM', 'Esportes em Grupo <nao-responda@localhost>')
+    app.config['PUBLIC_URL'] = os.environ.get('PUBLIC_URL', 'http://localhost:5000')
+    
+    # Avisos de promoção: espera (s) para agrupar, mensagens por segundo e por execução
+    app.config['NOTIFY_BATCH_DELAY'] = int(os.environ.get('NOTIFY_BATCH_DELAY', 30))
+    app.config['NOTIFY_RATE'] = float(os.environ.get('NOTIFY_RATE', 2))
+    app.config['NOTIFY_MAX_PER_RUN'] = int(os.environ.get('NOTIFY_MAX_PER_RUN', 50))
+    
+    # Ocupação das quadras: horário de funcionamento e tempo de vida (s) de cada período calculado
+    app.config['COURT_OPENING_HOURS'] = os.environ.get('COURT_OPENING_HOURS', '06:00-23:00')
+    app.config['COURT_OCCUPANCY_TTL'] = int(os.environ.get('COURT_OCCUPANCY_TTL', 3600))
+    
+    # Dias em que as exclusões ficam disponíveis para a sincronização incremental (since=)
+    app.config['TOMBSTONE_RETENTION_DAYS'] = int(os.environ.get('TOMBSTONE_RETENTION_DAYS', 7))
+    
+    # Partições por cidade/UF em bancos separados (JSON, ver app/utils/partitions.py); vazio = um único banco
+    app.config['CITY_PARTITIONS'] = json.loads(os.environ.get('CITY_PARTITIONS') or '{}')
+    
+    # Idade máxima (segundos) das estatísticas antes de agendar um novo cálculo
+    app.config['STATS_MAX_AGE'] = 300
+    
+    # Configurações adicionais (ex.: banco de dados temporário em scripts de teste)
+    if config:
+        app.config.update(config)
+    
+    if app.config['TRUSTED_PROXIES']:
+        from werkzeug.middleware.proxy_fix import ProxyFix
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config['TRUSTED_PROXIES'],
+                                x_proto=app.config['TRUSTED_PROXIES'])
+    
+    # Inicializa o banco de dados com a aplicação (partições antes: registram os binds)
+    from app.utils import partitions
+    partitions.init_app(app)
     db.init_app(app)
     login_manager.init_app(app)
     
+    # Invalidação dos caches após escritas em salas e participantes
+    from app.utils import invalidation
+    invalidation.init_app(app)
+    
+    # Sequência de alterações de quadras, salas e participantes (sincronização incremental)
+    from app.utils import sync
+    sync.init_app(app)
+    
+    # Catálogo de esportes (preenche o sport_id de salas e quadras)
+    from app.utils import sports
+    sports.init_app(app)
+    
+    # Pub/sub das listas de participantes (SSE)
+    from app.utils import events
+    events.init_app(app)
+    
+    # Fila de tarefas e comandos de linha de comando
+    from app.utils import jobs
+    from app import cli
+    jobs.init_app(app)
+    cli.init_app(app)
+    
+    # Avisos de promoção da lista de espera (enviados pela fila)
+    from app.utils import notifications
+    notifications.init_app(app)
+    
+    # Agenda o arquivamento periódico de salas antigas
+    from app.utils import archive
+    archive.init_app(app)
+    
     # Importa e registra os blueprints
     from app.controllers.main_routes import main_bp
     from app.controllers.room_routes import room_bp
     from app.controllers.auth_routes import auth_bp
     from app.controllers.admin_controller import admin_bp
+    from app.controllers.api_routes import api_bp
     
     app.register_blueprint(main_bp)
     app.register_blueprint(room_bp)
     app.register_blueprint(auth_bp)
     app.register_blueprint(admin_bp)
+    app.register_blueprint(api_bp)
+    
+    # Carrega o usuário a partir do ID na sessão (identidade em cache)
+    from app.utils import identity
     
-    # Carrega o usuário a partir do ID na sessão
-    from app.models.models import User
+    # Backend de todos os caches registrados pelos módulos importados acima
+    from app.utils import cache
+    cache.init_app(app)
     
     @login_manager.user_loader
     def load_user(user_id):
-        return User.query.get(int(user_id))
+        return identity.load_user(int(user_id))
     
     # Cria as tabelas do banco de dados
     with app.app_context():
         db.create_all()
+        partitions.setup()
+        
+        # Bancos novos já começam com o catálogo padrão de esportes
+        from app.models.models import Sport
+        if Sport.query.first() is None:
+            sports.seed_defaults()
+        
+        # Índice de busca textual das salas
+        from app.utils import search
+        search.setup()
+        
+        sync.setup()
     
     return app 
\ No newline at end of file
@@ -0,0 +1,264 @@
+"""
+Comandos de linha de comando da aplicação (flask <grupo> <comando>)
+"""
+
+import json
+import os
+import threading
+import time
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+
+from app.utils import archive, bulk_import, jobs, loadsim, migrations, passwords, query_audit
+
+jobs_cli = AppGroup('jobs', help='Fila de tarefas em segundo plano.')
+
+
+@jobs_cli.command('worker')
+@click.option('--concurrency', default=2, show_default=True, help='Número de threads consumindo a fila.')
+@click.option('--poll-interval', default=1.0, show_default=True, help='Intervalo (s) entre consultas à fila vazia.')
+def jobs_worker(concurrency, poll_interval):
+    """Consome a fila de tarefas até ser interrompido (Ctrl+C)."""
+    queue = jobs.get_queue()
+    queue.requeue_stale(current_app.config.get('JOBS_STALE_TIMEOUT', 600))
+    click.echo(f'Worker iniciado com {concurrency} thread(s) em {queue.path}')
+    jobs.Worker(current_app._get_current_object(), queue, concurrency, poll_interval).run_forever()
+
+
+@jobs_cli.command('enqueue')
+@click.argument('name')
+@click.option('--payload', default=None, help='Argumentos da tarefa em JSON.')
+def jobs_enqueue(name, payload):
+    """Coloca uma tarefa na fila."""
+    job_id = jobs.enqueue(name, json.loads(payload) if payload else None)
+    click.echo(f'Tarefa {name} agendada (id {job_id})')
+
+
+@jobs_cli.command('status')
+def jobs_status():
+    """Mostra a profundidade da fila e a duração das tarefas."""
+    stats = jobs.get_queue().stats()
+    click.echo(f"Fila: {stats['depth']} (prontas para executar: {stats['ready']})")
+    for item in stats['tasks']:
+        click.echo(f"  {item['name']:<28} {item['executions']:>5} execuções  "
+                   f"média {item['avg_seconds']:.3f}s  p95 {item['p95_seconds']:.3f}s")
+
+
+@jobs_cli.command('prune')
+@click.option('--days', type=int, default=None, help='Idade mínima (dias); padrão JOBS_RETENTION_DAYS.')
+def jobs_prune(days):
+    """Apaga execuções terminadas antigas (a última bem-sucedida de cada tarefa é mantida)."""
+    removed = jobs.get_queue().prune(days)
+    click.echo(f'{removed} execução(ões) apagada(s)')
+
+
+perf_cli = AppGroup('perf', help='Medições de desempenho.')
+
+
+@perf_cli.command('login-bench')
+@click.option('--clients', default=8, show_default=True, help='Threads simulando logins simultâneos.')
+@click.option('--logins', default=200, show_default=True, help='Total de verificações de senha.')
+@click.option('--method', default=None, help='Método de hash (padrão: PASSWORD_METHOD).')
+def perf_login_bench(clients, logins, method):
+    """Mede quantos logins (verificações de senha) por segundo o pool suporta."""
+    if method:
+        current_app.config['PASSWORD_METHOD'] = method
+    pwhash = passwords.hash_password('senha-de-teste')
+    verifier = passwords.Verifier(
+        workers=current_app.config.get('PASSWORD_HASH_WORKERS'),
+        per_key=clients,
+        max_pending=clients
+    )
+    remaining = iter(range(logins))
+    lock = threading.Lock()
+
+    def client(index):
+        while True:
+            with lock:
+                if next(remaining, None) is None:
+                    return
+            verifier.verify(pwhash, 'senha-de-teste', key=index)
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=client, args=(index,)) for index in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    verifier.shutdown()
+
+    cores = min(verifier.workers, os.cpu_count() or 1)
+    rate = logins / elapsed
+    click.echo(f'Método: {pwhash.split("$")[0]}')
+    click.echo(f'{logins} logins em {elapsed:.2f}s com {clients} clientes e {verifier.workers} thread(s) de hash')
+    click.echo(f'{rate:.1f} logins/s no total, {rate / cores:.1f} logins/s por núcleo ({cores} núcleo(s))')
+
+
+@perf_cli.command('loadsim')
+@click.option('--users', default=200, show_default=True, help='Jogadores disputando as vagas.')
+@click.option('--rooms', default=5, show_default=True, help='Salas criadas no banco temporário.')
+@click.option('--capacity', default=20, show_default=True, help='Vagas (max_participants) de cada sala.')
+@click.option('--operations', default=2000, show_default=True, help='Total de requisições.')
+@click.option('--threads', default=16, show_default=True, help='Threads por processo.')
+@click.option('--processes', default=1, show_default=True, help='Processos, cada um com sua própria aplicação.')
+@click.option('--mix', default=None, help='Pesos das operações, ex.: join=60,leave=20,remove=10,batch=10.')
+@click.option('--busy-timeout', default=5.0, show_default=True, help='Espera (s) do SQLite por um banco bloqueado.')
+@click.option('--seed', 'seed_value', default=None, type=int, help='Semente da sequência de operações.')
+@click.option('--json', 'as_json', is_flag=True, help='Imprime o relatório em JSON.')
+def perf_loadsim(users, rooms, capacity, operations, threads, processes, mix, busy_timeout, seed_value, as_json):
+    """Simula inscrições, saídas, remoções e pagamentos concorrentes e verifica as listas."""
+    weights = None
+    if mix:
+        weights = {}
+        for item in mix.split(','):
+            name, _, weight = item.partition('=')
+            if name.strip() not in loadsim.OPERATIONS:
+                raise click.BadParameter(f'operação desconhecida: {name}', param_hint='--mix')
+            weights[name.strip()] = int(weight or 0)
+
+    result, problems = loadsim.run(
+        users=users, rooms=rooms, capacity=capacity, operations=operations, threads=threads,
+        processes=processes, mix=weights, busy_timeout=busy_timeout, seed_value=seed_value
+    )
+
+    if as_json:
+        click.echo(json.dumps(dict(result, violations=problems), ensure_ascii=False, indent=2))
+    else:
+        click.echo(f"{result['operations']} operações em {result['elapsed']:.2f}s ({result['throughput']} req/s) "
+                   f"com {processes} processo(s) x {threads} thread(s)")
+        click.echo(f"{'operação':<8} {'qtd':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'máx ms':>8} {'erros':>6} {'bloqueios':>10}")
+        for row in result['by_operation']:
+            click.echo(f"{row['operation']:<8} {row['count']:>6} {row['p50_ms']:>8} {row['p95_ms']:>8} "
+                       f"{row['p99_ms']:>8} {row['max_ms']:>8} {row['errors']:>6} "
+                       f"{row['locks']:>4} ({row['lock_rate']:.1%})")
+        for problem in problems:
+            click.echo(f'VIOLAÇÃO: {problem}')
+        click.echo('Invariantes OK' if not problems else f'{len(problems)} violação(ões) encontrada(s)')
+
+    if problems:
+        raise SystemExit(1)
+
+
+@perf_cli.command('audit')
+@click.option('--scale', default=1, show_default=True, help='Multiplicador do volume de dados semeados.')
+@click.option('--database-uri', default=None, help='Banco descartável a semear (ex.: PostgreSQL para EXPLAIN ANALYZE).')
+@click.option('--limit', default=20, show_default=True, help='Comandos com achados exibidos.')
+@click.option('--all', 'show_all', is_flag=True, help='Exibe também os comandos sem achados.')
+@click.option('--json', 'as_json', is_flag=True, help='Imprime o relatório completo em JSON.')
+def perf_audit(scale, database_uri, limit, show_all, as_json):
+    """Exercita as rotas com dados semeados e audita o plano de cada comando SQL."""
+    result = query_audit.run(scale=scale, database_uri=database_uri)
+    statements = result['statements']
+
+    if as_json:
+        click.echo(json.dumps(result, ensure_ascii=False, indent=2))
+        return
+
+    failed = {route: status for route, status in result['statuses'].items() if status >= 500}
+    click.echo(f"{len(result['statuses'])} requisições, {len(statements)} comandos SQL distintos")
+    for route, status in failed.items():
+        click.echo(f'  {route}: HTTP {status}')
+
+    totals = {}
+    for item in statements:
+        for kind, _ in item['findings']:
+            totals[kind] = totals.get(kind, 0) + 1
+    click.echo(f"Varreduras completas: {totals.get('scan', 0)}  árvores B temporárias: {totals.get('temp_btree', 0)}  "
+               f"índices ausentes: {totals.get('missing_index', 0)}")
+
+    shown = [item for item in statements if show_all or item['findings']][:limit]
+    for position, item in enumerate(shown, 1):
+        statement = ' '.join(item['statement'].split())
+        click.echo('')
+        click.echo(f"#{position}  {item['total_ms']:.2f} ms em {item['calls']} execução(ões) (máx. {item['max_ms']:.2f} ms)")
+        click.echo(f"    rotas: {', '.join(item['routes'][:4])}{' ...' if len(item['routes']) > 4 else ''}")
+        click.echo(f"    sql:   {statement[:240]}{' ...' if len(statement) > 240 else ''}")
+        for line in item['plan']:
+            click.echo(f'    plano: {line}')
+        for _, description in item['findings']:
+            click.echo(f'    >> {description}')
+        for suggestion in item['suggestions']:
+            click.echo(f'    sugestão: {suggestion}')
+
+    suggestions = list(dict.fromkeys(s for item in statements for s in item['suggestions']))
+    if suggestions:
+        click.echo('')
+        click.echo('Índices sugeridos:')
+        for suggestion in suggestions:
+            click.echo(f'  {suggestion};')
+
+
+data_cli = AppGroup('data', help='Manutenção dos dados.')
+
+
+@data_cli.command('archive')
+@click.option('--horizon-days', default=None, type=int, help='Arquiva salas mais antigas que isso (padrão: ARCHIVE_HORIZON_DAYS).')
+@click.option('--batch-size', default=None, type=int, help='Salas por transação (padrão: ARCHIVE_BATCH_SIZE).')
+def data_archive(horizon_days, batch_size):
+    """Move salas antigas e suas participações para as tabelas de arquivo."""
+    started = time.perf_counter()
+    result = archive.archive_old(horizon_days, batch_size)
+    click.echo(f"{result['rooms']} sala(s) e {result['participants']} participação(ões) arquivadas "
+               f"em {result['batches']} lote(s) ({time.perf_counter() - started:.2f}s)")
+
+
+@data_cli.command('import')
+@click.argument('kind', type=click.Choice(bulk_import.KINDS))
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'jsonl']), default=None, help='Formato (padrão: pela extensão).')
+@click.option('--creator-id', default=None, type=int, help='Organizador das salas sem creator_id.')
+@click.option('--chunk-size', default=bulk_import.CHUNK_SIZE, show_default=True, help='Linhas por transação.')
+@click.option('--errors', 'show_errors', default=20, show_default=True, help='Quantos erros mostrar.')
+def data_import(kind, path, fmt, creator_id, chunk_size, show_errors):
+    """Importa quadras, salas ou participantes de um arquivo CSV ou JSONL."""
+    with open(path, 'rb') as stream:
+        report = bulk_import.import_file(
+            kind, stream, fmt or bulk_import.detect_format(path),
+            creator_id=creator_id, chunk_size=chunk_size
+        )
+    click.echo(f"{report['inseridos']} de {report['linhas']} linha(s) importadas em {report['segundos']:.2f}s, "
+               f"{report['total_erros']} com erro")
+    for error in report['erros'][:show_errors]:
+        click.echo(f"  linha {error['linha']}: {error['erro']}")
+
+
+schema_cli = AppGroup('schema', help='Migrações versionadas do banco de dados.')
+
+
+@schema_cli.command('status')
+def schema_status():
+    """Lista as migrações e quando foram aplicadas."""
+    for migration, applied_at in migrations.status():
+        situacao = f'aplicada em {applied_at}' if applied_at else 'pendente'
+        click.echo(f'{migration.version}  {migration.description:<66} {situacao}')
+
+
+@schema_cli.command('upgrade')
+@click.option('--to', 'target', default=None, help='Para na versão informada (inclusive).')
+@click.option('--batch-size', default=None, type=int, help='Linhas por transação nos backfills.')
+def schema_upgrade(target, batch_size):
+    """Aplica as migrações pendentes (backfills continuam do último checkpoint)."""
+    if batch_size:
+        current_app.config['MIGRATIONS_BATCH_SIZE'] = batch_size
+    applied = migrations.upgrade(target)
+    for migration in applied:
+        click.echo(f'Aplicada {migration.version}: {migration.description}')
+    if not applied:
+        click.echo('Nenhuma migração pendente.')
+
+
+@schema_cli.command('downgrade')
+def schema_downgrade():
+    """Desfaz a última migração aplicada."""
+    migration = migrations.downgrade()
+    click.echo(f'Desfeita {migration.version}: {migration.description}' if migration else 'Nenhuma migração aplicada.')
+
+
+def init_app(app):
+    app.cli.add_command(jobs_cli)
+    app.cli.add_command(perf_cli)
+    app.cli.add_command(data_cli)
+    app.cli.add_command(schema_cli)
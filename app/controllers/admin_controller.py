@@ -1,8 +1,11 @@
-from flask import Blueprint, render_template, jsonify, request, flash, redirect, url_for
+from flask import Blueprint, render_template, jsonify, request, flash, redirect, url_for, current_app
 from app.models.models import Room, User, Participant, Court
 from app import db
+from app.utils import jobs, estatisticas, sports, bulk_import, cache, pricing, notifications, ocupacao, sync
+from app.utils.scheduling import weekly_occurrences, best_slots
 from datetime import datetime, timedelta
 from flask_login import login_required, current_user
+import time
 import traceback
 
 admin_bp = Blueprint('admin', __name__, url_prefix='/admin')
@@ -17,11 +20,51 @@ def index():
 # API para Gestão de Quadras
 # ===============================
 
+def _sincronizacao():
+    """Retorna (sequência atual, since, reset) da requisição; since None = carga completa
+    
+    A sequência é lida antes das linhas: uma alteração feita durante a leitura
+    volta de novo no próximo since, nunca se perde.
+    """
+    seq = sync.token(sync.current())
+    since = sync.parse_since(request.args.get('since'))
+    if since is not None and sync.needs_reset(since):
+        return seq, None, True
+    return seq, since, False
+
+def _resposta_sincronizada(seq, since, reset, itens, excluidos=()):
+    """Lista completa (sem since) ou apenas as linhas alteradas e os ids excluídos desde since"""
+    if since is None and not reset:
+        response = jsonify(itens)
+    else:
+        response = jsonify({
+            'seq': seq,
+            'reset': reset,
+            'changed': itens,
+            'deleted': list(excluidos)
+        })
+    response.headers['X-Change-Seq'] = str(seq)
+    return response
+
+def _since_invalido(e):
+    return jsonify({
+        'message': f'Parâmetro since inválido: {e}',
+        'error': True
+    }), 400
+
 @admin_bp.route('/api/courts', methods=['GET'])
 @login_required
 def get_courts():
-    """Retorna todas as quadras cadastradas"""
-    courts = Court.query.all()
+    """Retorna todas as quadras cadastradas (com since=<seq>, só as alteradas e excluídas desde então)"""
+    try:
+        seq, since, reset = _sincronizacao()
+    except ValueError as e:
+        return _since_invalido(e)
+    
+    query = Court.query
+    if since is not None:
+        query = query.filter(sync.changed_since(Court, since))
+    courts = query.all()
     
     result = []
     for court in courts:
@@ -37,7 +80,8 @@ def get_courts():
             'created_at': court.created_at.isoformat()
         })
     
-    return jsonify(result)
+    excluidas = sync.deleted_since('courts', since) if since is not None else ()
+    return _resposta_sincronizada(seq, since, reset, result, excluidas)
 
 @admin_bp.route('/api/courts/<int:court_id>', methods=['GET'])
 @login_required
@@ -237,6 +281,107 @@ def check_court_availability(court_id):
         'availability': availability
     })
 
+@admin_bp.route('/api/courts/slots', methods=['GET'])
+@login_required
+def buscar_horarios():
+    """Busca os melhores horários livres entre todas as quadras ativas
+    
+    Parâmetros: sport, city, date (YYYY-MM-DD) ou weekday (0 = segunda, próxima
+    ocorrência), inicio e fim da janela (HH:MM), duration_hours, max_price
+    (valor total da reserva), step (minutos) e limit.
+    """
+    try:
+        if request.args.get('date'):
+            dia = datetime.strptime(request.args['date'], '%Y-%m-%d').date()
+        elif request.args.get('weekday'):
+            hoje = datetime.now().date()
+            dia = hoje + timedelta(days=(int(request.args['weekday']) - hoje.weekday()) % 7)
+        else:
+            return jsonify({
+                'message': 'Informe a data (date) ou o dia da semana (weekday)',
+                'error': True
+            }), 400
+        
+        inicio = datetime.strptime(request.args.get('inicio', '06:00'), '%H:%M').time()
+        fim = datetime.strptime(request.args.get('fim', '22:00'), '%H:%M').time()
+        duration_hours = float(request.args.get('duration_hours', 1.0))
+        max_price = float(request.args['max_price']) if request.args.get('max_price') else None
+        step = int(request.args.get('step', 30))
+        limit = min(int(request.args.get('limit', 10)), 50)
+    except ValueError:
+        return jsonify({
+            'message': 'Parâmetros inválidos. Use date=YYYY-MM-DD e horários no formato HH:MM',
+            'error': True
+        }), 400
+    
+    janela_inicio = datetime.combine(dia, inicio)
+    janela_fim = datetime.combine(dia, fim)
+    if janela_fim <= janela_inicio or duration_hours <= 0 or step <= 0:
+        return jsonify({
+            'message': 'A janela, a duração e o intervalo devem ser positivos',
+            'error': True
+        }), 400
+    
+    query = db.session.query(
+        Court.id, Court.name, Court.location, Court.city, Court.hourly_price
+    ).filter(Court.is_active == True)
+    
+    if request.args.get('sport'):
+        query = query.filter(Court.sport_id.in_(sports.matching_ids(request.args['sport'])))
+    if request.args.get('city'):
+        query = query.filter(Court.city == request.args['city'])
+    if max_price is not None:
+        query = query.filter(Court.hourly_price * duration_hours <= max_price)
+    
+    quadras = [
+        (court.id, round(court.hourly_price * duration_hours, 2), court)
+        for court in query
+    ]
+    
+    ocupacao = Court.busy_intervals([quadra[0] for quadra in quadras], janela_inicio, janela_fim)
+    candidatos = best_slots(
+        quadras, ocupacao, janela_inicio, janela_fim,
+        timedelta(hours=duration_hours), step=timedelta(minutes=step), limit=limit
+    )
+    
+    return jsonify({
+        'date': dia.isoformat(),
+        'window': {'start': janela_inicio.isoformat(), 'end': janela_fim.isoformat()},
+        'duration_hours': duration_hours,
+        'courts_checked': len(quadras),
+        'slots': [{
+            'court_id': court.id,
+            'court_name': court.name,
+            'location': court.location,
+            'city': court.city,
+            'start': start.isoformat(),
+            'end': (start + timedelta(hours=duration_hours)).isoformat(),
+            'total_price': price
+        } for start, price, _, court in candidatos]
+    })
+
+@admin_bp.route('/api/courts/ocupacao', methods=['GET'])
+@login_required
+def ocupacao_quadras():
+    """Ocupação das quadras por dia da semana x hora e receita por hora disponível
+    
+    Parâmetros: inicio e fim (YYYY-MM-DD, inclusive; padrão: últimas 4 semanas),
+    court_id (pode repetir), city e abertura (HH:MM-HH:MM; padrão COURT_OPENING_HOURS).
+    """
+    try:
+        inicio, fim = ocupacao.periodo(request.args.get('inicio'), request.args.get('fim'))
+        court_ids = [int(court_id) for court_id in request.args.getlist('court_id')]
+        abertura = request.args.get('abertura') or None
+        if abertura:
+            ocupacao.minutos_abertos(abertura)
+    except ValueError as e:
+        return jsonify({
+            'message': f'Parâmetros inválidos: {e}',
+            'error': True
+        }), 400
+    
+    return jsonify(ocupacao.ocupacao(inicio, fim, court_ids, request.args.get('city'), abertura))
+
 # ===============================
 # API para Gestão de Salas/Jogos
 # ===============================
@@ -244,26 +389,43 @@ def check_court_availability(court_id):
 @admin_bp.route('/api/rooms', methods=['GET'])
 @login_required
 def get_rooms():
+    """Salas para o calendário (com since=<seq>, só as alteradas, inclusive nos participantes, e as excluídas)"""
+    try:
+        seq, since, reset = _sincronizacao()
+    except ValueError as e:
+        return _since_invalido(e)
+    
     sport = request.args.get('sport')
     date = request.args.get('date')
     
     query = Room.query
     
     if sport:
-        query = query.filter_by(sport=sport)
+        # Mesmo critério da página inicial e da API: busca parcial no catálogo (texto desconhecido = nenhuma sala)
+        query = query.filter(Room.sport_id.in_(sports.matching_ids(sport)))
     if date:
         date_obj = datetime.strptime(date, '%Y-%m-%d').date()
         query = query.filter(db.func.date(Room.date) == date_obj)
     
-    rooms = query.all()
+    excluidas = ()
+    if since is not None:
+        alteradas = sync.rooms_touched_since(since).subquery()
+        query = query.filter(Room.id.in_(db.select([alteradas.c[0]])))
+        # Salas alteradas que saíram do filtro também somem do painel
+        fora_do_filtro = db.session.query(alteradas.c[0]).filter(
+            alteradas.c[0] != None,
+            ~alteradas.c[0].in_(query.with_entities(Room.id))
+        )
+        excluidas = set(sync.deleted_since('rooms', since)) | {row[0] for row in fora_do_filtro}
+    
+    rooms = query.options(db.joinedload(Room.court)).all()
+    
+    # Valores e ocupação de todas as salas em uma única consulta
+    precos = pricing.for_rooms(rooms)
     
     eventos = []
     for room in rooms:
-        # Calcular valor por pessoa
-        valor_por_pessoa = room.valor
-        if room.court_id:
-            valor_por_pessoa = room.calculate_price_per_person()
-        
+        preco = precos[room.id]
         eventos.append({
             'id': room.id,
             'title': f"{room.name} - {room.sport}",
@@ -271,30 +433,27 @@ def get_rooms():
             'end': room.end_time.isoformat() if room.end_time else room.date.isoformat(),
             'sport': room.sport,
             'max_participants': room.max_participants,
-            'current_participants': len(room.get_active_participants()),
+            'current_participants': preco.active,
             'location': room.location,
             'city': room.city,
             'description': room.description,
             'is_private': room.is_private,
             'is_active': room.is_active,
-            'valor': valor_por_pessoa,
+            'valor': preco.price_per_person,
             'court_id': room.court_id,
             'duration_hours': room.duration_hours,
             'court_name': room.court.name if room.court else None,
             'court_price': room.court.hourly_price if room.court else None,
-            'total_price': room.calculate_total_price() if room.court_id else None
+            'total_price': preco.total_price if room.court_id else None,
+            'confirmed_participants': preco.confirmed,
+            'paid_amount': preco.paid_amount,
+            'pending_amount': preco.pending_amount
         })
     
-    return jsonify(eventos)
+    return _resposta_sincronizada(seq, since, reset, eventos, sorted(excluidas))
 
-@admin_bp.route('/api/rooms', methods=['POST'])
-@login_required
-def criar_room():
-    data = request.json
-    
-    # Calcular data de término com base na duração
-    date = datetime.strptime(data['date'], '%Y-%m-%dT%H:%M')
-    duration_hours = float(data.get('duration_hours', 1.0))
+def _nova_room(data, date, duration_hours):
+    """Monta uma sala a partir dos dados do formulário, puxando local e valor da quadra"""
     end_time = date + timedelta(hours=duration_hours)
     
     # Inicializar valores padrão
@@ -337,11 +496,22 @@ def criar_room():
     
     # Definir explicitamente o end_time
     nova_room.end_time = end_time
+    return nova_room
+
+@admin_bp.route('/api/rooms', methods=['POST'])
+@login_required
+def criar_room():
+    data = request.json
+    
+    # Calcular data de término com base na duração
+    date = datetime.strptime(data['date'], '%Y-%m-%dT%H:%M')
+    duration_hours = float(data.get('duration_hours', 1.0))
+    nova_room = _nova_room(data, date, duration_hours)
     
     # Verificar a disponibilidade da quadra, se especificada
     if nova_room.court_id:
         court = Court.query.get(nova_room.court_id)
-        if court and not court.is_available(date, end_time):
+        if court and not court.is_available(date, nova_room.end_time):
             return jsonify({
                 'message': 'A quadra não está disponível no horário selecionado',
                 'error': True
@@ -352,6 +522,74 @@ def criar_room():
     
     return jsonify({'message': 'Jogo criado com sucesso', 'id': nova_room.id})
 
+@admin_bp.route('/api/rooms/serie', methods=['POST'])
+@login_required
+def criar_serie():
+    """Cria uma série semanal de jogos, pulando as ocorrências em que a quadra está ocupada
+    
+    Além dos campos de criação de um jogo, recebe 'ocorrencias' e/ou 'ate'
+    (YYYY-MM-DD) e, opcionalmente, 'intervalo_semanas'.
+    """
+    data = request.json
+    
+    try:
+        date = datetime.strptime(data['date'], '%Y-%m-%dT%H:%M')
+        duration_hours = float(data.get('duration_hours', 1.0))
+        ocorrencias = int(data['ocorrencias']) if data.get('ocorrencias') else None
+        ate = datetime.strptime(data['ate'], '%Y-%m-%d') if data.get('ate') else None
+        intervalo = int(data.get('intervalo_semanas') or 1)
+        inicios = weekly_occurrences(date, count=ocorrencias, until=ate, interval_weeks=intervalo)
+    except (KeyError, ValueError) as e:
+        return jsonify({
+            'message': f'Dados da série inválidos: {e}',
+            'error': True
+        }), 400
+    
+    if duration_hours <= 0 or duration_hours >= intervalo * 7 * 24:
+        return jsonify({
+            'message': 'A duração do jogo deve ser menor que o intervalo entre as ocorrências',
+            'error': True
+        }), 400
+    
+    periodos = [(inicio, inicio + timedelta(hours=duration_hours)) for inicio in inicios]
+    
+    # Uma única consulta para todas as ocorrências
+    conflitos_por_periodo = [[] for _ in periodos]
+    court = Court.query.get(data['court_id']) if data.get('court_id') else None
+    if court:
+        conflitos_por_periodo = court.find_conflicts(periodos)
+    
+    novas_rooms = []
+    conflitos = []
+    for (inicio, fim), reservas in zip(periodos, conflitos_por_periodo):
+        if reservas:
+            conflitos.append({
+                'start': inicio.isoformat(),
+                'end': fim.isoformat(),
+                'reservas': [{
+                    'id': reserva.id,
+                    'name': reserva.name,
+                    'start': reserva.date.isoformat(),
+                    'end': reserva.end_time.isoformat()
+                } for reserva in reservas]
+            })
+        else:
+            novas_rooms.append(_nova_room(data, inicio, duration_hours))
+    
+    # Todas as ocorrências livres são gravadas na mesma transação
+    db.session.add_all(novas_rooms)
+    db.session.commit()
+    
+    return jsonify({
+        'message': f'{len(novas_rooms)} jogo(s) criado(s), {len(conflitos)} ocorrência(s) com conflito',
+        'criados': [{
+            'id': room.id,
+            'start': room.date.isoformat(),
+            'link_code': room.link_code
+        } for room in novas_rooms],
+        'conflitos': conflitos
+    })
+
 @admin_bp.route('/api/rooms', methods=['PUT'])
 @login_required
 def atualizar_room():
@@ -397,7 +635,7 @@ def atualizar_room():
                 # Calcular valor total da quadra
                 valor_total = court.hourly_price * room.duration_hours
                 # Dividir pelo número de participantes ativos ou pelo máximo
-                participantes_ativos = len(room.get_active_participants())
+                participantes_ativos = room.pricing.active
                 divisor = max(1, participantes_ativos) if participantes_ativos > 0 else room.max_participants
                 valor_por_pessoa = valor_total / divisor
     else:
@@ -446,18 +684,36 @@ def excluir_room(id):
 @admin_bp.route('/api/rooms/<int:room_id>/participants', methods=['GET'])
 @login_required
 def get_participants(room_id):
+    """Participantes da sala (com since=<seq>, a lista só volta se algo mudou na sala desde então)
+    
+    Posição na fila e valor por pessoa dependem dos demais participantes: havendo
+    mudança, todas as linhas voltam, junto com os ids excluídos.
+    """
+    try:
+        seq, since, reset = _sincronizacao()
+    except ValueError as e:
+        return _since_invalido(e)
+    
     room = Room.query.get_or_404(room_id)
-    participants = room.participants
+    if since is not None:
+        alteradas = sync.rooms_touched_since(since).subquery()
+        if not db.session.query(alteradas).filter(alteradas.c[0] == room.id).first():
+            return _resposta_sincronizada(seq, since, reset, [])
+    
+    participants = Participant.query.options(db.joinedload(Participant.user)).filter_by(room_id=room.id).order_by(Participant.id).all()
     
     # Debug
     print(f"Sala {room.name}: {len(participants)} participantes encontrados")
     
-    # Calcular valor por pessoa
-    valor_por_pessoa = room.calculate_price_per_person() if room.court_id else room.valor
+    valor_por_pessoa = room.pricing.price_per_person
+    
+    # Lista de espera: ativos além de max_participants, pela ordem de inscrição (sem recarregar a lista por participante)
+    ativos = sorted((p for p in participants if p.is_active), key=lambda p: (p.registered_at, p.id))
+    em_espera = {p.id for p in ativos[room.max_participants:]}
     
     participantes = []
     for p in participants:
-        is_in_waiting = p.is_in_waiting_list()
+        is_in_waiting = p.id in em_espera
         participantes.append({
             'id': p.id,
             'user_id': p.user_id,
@@ -477,7 +733,8 @@ def get_participants(room_id):
         # Debug para cada participante
         print(f"Participante {p.user.name}: ativo={p.is_active}, lista_espera={is_in_waiting}")
     
-    return jsonify(participantes)
+    excluidos = sync.deleted_since('participants', since, room_id=room.id) if since is not None else ()
+    return _resposta_sincronizada(seq, since, reset, participantes, excluidos)
 
 @admin_bp.route('/api/rooms/<int:room_id>/participants/<int:participant_id>', methods=['PUT'])
 @login_required
@@ -488,7 +745,11 @@ def atualizar_participant(room_id, participant_id):
     if participant.room_id != room_id:
         return jsonify({'error': 'Participante não pertence a este jogo'}), 400
     
-    participant.is_active = data.get('is_active', participant.is_active)
+    is_active = data.get('is_active', participant.is_active)
+    if participant.is_active and not is_active:
+        # Desativar pela API também libera a vaga: avisa quem sai da lista de espera
+        notifications.participant_leaving(participant.room, participant)
+    participant.is_active = is_active
     participant.checked_in = data.get('checked_in', participant.checked_in)
     participant.pagamento_status = data.get('pagamento_status', participant.pagamento_status)
     participant.pagamento_metodo = data.get('pagamento_metodo', participant.pagamento_metodo)
@@ -509,6 +770,7 @@ def remover_participant(room_id, participant_id):
     if participant.room_id != room_id:
         return jsonify({'error': 'Participante não pertence a este jogo'}), 400
     
+    notifications.participant_leaving(participant.room, participant)
     db.session.delete(participant)
     db.session.commit()
     
@@ -561,299 +823,99 @@ def atualizar_participantes_lote(room_id):
         'updated_count': participantes_atualizados
     })
 
+def _estatistica(nome):
+    """Retorna o último resultado da estatística, agendando o recálculo se estiver desatualizado"""
+    fila = jobs.get_queue()
+    tarefa = f'estatisticas.{nome}'
+    resultado, gerado_em = fila.latest_result(tarefa)
+    
+    if resultado is None:
+        # Primeira vez: calcula na requisição e guarda o resultado
+        inicio = time.time()
+        resultado = estatisticas.ROLLUPS[nome]()
+        fila.record(tarefa, resultado, inicio)
+    elif time.time() - gerado_em > current_app.config.get('STATS_MAX_AGE', 300):
+        fila.enqueue(tarefa, unique=True)
+    
+    return jsonify(resultado)
+
 @admin_bp.route('/api/estatisticas/resumo', methods=['GET'])
 @login_required
 def estatisticas_resumo():
-    # Total de jogos
-    total_jogos = Room.query.count()
-    
-    # Total de participantes únicos
-    total_participantes = db.session.query(db.func.count(db.distinct(Participant.user_id))).scalar()
-    
-    # Média de jogadores por jogo
-    total_participacoes = Participant.query.filter_by(is_active=True).count()
-    media_jogadores = round(total_participacoes / total_jogos, 1) if total_jogos > 0 else 0
-    
-    # Total de esportes diferentes
-    total_esportes = db.session.query(db.func.count(db.distinct(Room.sport))).scalar()
-    
-    # Jogos por mês
-    # Formatar datas para agrupar por mês
-    jogos_por_mes_query = db.session.query(
-        db.func.strftime('%m/%Y', Room.date).label('mes'),
-        db.func.count(Room.id).label('count')
-    ).group_by('mes').order_by('mes').all()
-    
-    jogos_por_mes = [{'mes': res[0], 'quantidade': res[1]} for res in jogos_por_mes_query]
-    
-    # Próximos jogos
-    proximos_jogos = Room.query.filter(
-        Room.date >= datetime.now(),
-        Room.is_active == True
-    ).order_by(Room.date).limit(5).all()
-    
-    proximos_jogos_data = []
-    for jogo in proximos_jogos:
-        participantes_ativos = len(jogo.get_active_participants())
-        proximos_jogos_data.append({
-            'id': jogo.id,
-            'name': jogo.name,
-            'sport': jogo.sport,
-            'date': jogo.date.isoformat(),
-            'max_participants': jogo.max_participants,
-            'participantes_ativos': participantes_ativos,
-            'court_name': jogo.court.name if jogo.court else None
-        })
-    
-    # Estatísticas de quadras
-    total_quadras = Court.query.count()
-    quadras_mais_usadas = db.session.query(
-        Court.name, 
-        db.func.count(Room.id).label('count')
-    ).join(Room, Court.id == Room.court_id
-    ).group_by(Court.id
-    ).order_by(db.func.count(Room.id).desc()
-    ).limit(5).all()
-    
-    quadras_stats = [{
-        'name': quad[0], 
-        'reservas': quad[1]
-    } for quad in quadras_mais_usadas]
-    
-    return jsonify({
-        'total_jogos': total_jogos,
-        'total_participantes': total_participantes,
-        'media_jogadores': media_jogadores,
-        'total_esportes': total_esportes,
-        'total_quadras': total_quadras,
-        'jogos_por_mes': jogos_por_mes,
-        'proximos_jogos': proximos_jogos_data,
-        'quadras_mais_usadas': quadras_stats
-    })
+    """Retorna o resumo geral das estatísticas"""
+    return _estatistica('resumo')
 
 @admin_bp.route('/api/estatisticas/esportes', methods=['GET'])
 @login_required
 def estatisticas_esportes():
     """Retorna estatísticas relacionadas aos esportes"""
-    
-    # Distribuição de esportes
-    distribuicao_query = db.session.query(
-        Room.sport.label('esporte'),
-        db.func.count(Room.id).label('quantidade')
-    ).group_by(Room.sport).all()
-    
-    distribuicao = [{'esporte': res[0], 'quantidade': res[1]} for res in distribuicao_query]
-    
-    # Participantes por esporte
-    participantes_por_esporte_query = db.session.query(
-        Room.sport.label('esporte'),
-        db.func.count(Participant.id).label('participantes')
-    ).join(Participant, Room.id == Participant.room_id
-    ).filter(Participant.is_active == True
-    ).group_by(Room.sport).all()
-    
-    participantes_por_esporte = [{'esporte': res[0], 'participantes': res[1]} for res in participantes_por_esporte_query]
-    
-    # Detalhes por esporte
-    detalhes_esportes = []
-    for esporte in db.session.query(db.distinct(Room.sport)).all():
-        nome_esporte = esporte[0]
-        total_jogos = Room.query.filter_by(sport=nome_esporte).count()
-        
-        # Total de participantes para este esporte
-        total_participantes = db.session.query(db.func.count(Participant.id)).join(
-            Room, Room.id == Participant.room_id
-        ).filter(
-            Room.sport == nome_esporte,
-            Participant.is_active == True
-        ).scalar()
-        
-        # Média de participantes por jogo
-        media_participantes = total_participantes / total_jogos if total_jogos > 0 else 0
-        
-        # Valor médio por jogo
-        valor_medio_query = db.session.query(db.func.avg(Room.valor)).filter_by(sport=nome_esporte).scalar()
-        valor_medio = valor_medio_query or 0
-        
-        detalhes_esportes.append({
-            'nome': nome_esporte,
-            'total_jogos': total_jogos,
-            'total_participantes': total_participantes,
-            'media_participantes': media_participantes,
-            'valor_medio': valor_medio
-        })
-    
-    return jsonify({
-        'distribuicao': distribuicao,
-        'participantes_por_esporte': participantes_por_esporte,
-        'detalhes': detalhes_esportes
-    })
+    return _estatistica('esportes')
 
 @admin_bp.route('/api/estatisticas/jogadores', methods=['GET'])
 @login_required
 def estatisticas_jogadores():
     """Retorna estatísticas relacionadas aos jogadores"""
-    
-    # Jogadores mais frequentes (com mais participações)
-    jogadores_frequentes_query = db.session.query(
-        User.name.label('nome'),
-        db.func.count(Participant.id).label('participacoes')
-    ).join(
-        Participant, User.id == Participant.user_id
-    ).filter(
-        Participant.is_active == True
-    ).group_by(User.id
-    ).order_by(db.func.count(Participant.id).desc()
-    ).limit(10).all()
-    
-    jogadores_frequentes = [{'nome': res[0], 'jogos_participados': res[1]} for res in jogadores_frequentes_query]
-    
-    # Taxa de check-in
-    com_checkin = Participant.query.filter_by(checked_in=True).count()
-    sem_checkin = Participant.query.filter_by(checked_in=False).count()
-    
-    taxa_checkin = {
-        'com_checkin': com_checkin,
-        'sem_checkin': sem_checkin
-    }
-    
-    # Ranking de jogadores
-    ranking = []
-    jogadores_query = db.session.query(
-        User.id, User.name
-    ).join(
-        Participant, User.id == Participant.user_id
-    ).filter(
-        Participant.is_active == True
-    ).group_by(User.id
-    ).having(db.func.count(Participant.id) > 1
-    ).order_by(db.func.count(Participant.id).desc()).all()
-    
-    for jogador_id, jogador_nome in jogadores_query:
-        # Total de jogos que participou
-        jogos_participados = Participant.query.filter_by(user_id=jogador_id, is_active=True).count()
-        
-        # Taxa de check-in
-        checkins = Participant.query.filter_by(user_id=jogador_id, is_active=True, checked_in=True).count()
-        taxa_checkin_jogador = checkins / jogos_participados if jogos_participados > 0 else 0
-        
-        # Esporte favorito (que mais participou)
-        esporte_favorito_query = db.session.query(
-            Room.sport.label('esporte'),
-            db.func.count(Participant.id).label('count')
-        ).join(
-            Participant, Room.id == Participant.room_id
-        ).filter(
-            Participant.user_id == jogador_id,
-            Participant.is_active == True
-        ).group_by(Room.sport
-        ).order_by(db.func.count(Participant.id).desc()).first()
-        
-        esporte_favorito = esporte_favorito_query[0] if esporte_favorito_query else "Não definido"
-        
-        ranking.append({
-            'nome': jogador_nome,
-            'jogos_participados': jogos_participados,
-            'taxa_checkin': taxa_checkin_jogador,
-            'esporte_favorito': esporte_favorito
-        })
-    
-    return jsonify({
-        'mais_frequentes': jogadores_frequentes,
-        'taxa_checkin': taxa_checkin,
-        'ranking': ranking
-    })
+    return _estatistica('jogadores')
 
 @admin_bp.route('/api/estatisticas/financeiro', methods=['GET'])
 @login_required
 def estatisticas_financeiro():
     """Retorna estatísticas financeiras"""
+    return _estatistica('financeiro')
+
+# ===============================
+# Importação em lote
+# ===============================
+
+@admin_bp.route('/api/import/<kind>', methods=['POST'])
+@login_required
+def importar(kind):
+    """Importa quadras, salas ou participantes de um arquivo CSV ou JSONL
+    
+    O arquivo pode vir no campo 'arquivo' (multipart) ou no corpo da requisição;
+    o formato é deduzido da extensão/content type ou informado em ?formato=.
+    Retorna o relatório com o total inserido e os erros por linha.
+    """
+    if kind not in bulk_import.KINDS:
+        return jsonify({
+            'message': f'Tipo de importação inválido: {kind}',
+            'error': True
+        }), 404
     
-    # Total arrecadado (participantes com status 'pago')
-    total_arrecadado_query = db.session.query(
-        db.func.sum(Room.valor)
-    ).join(
-        Participant, Room.id == Participant.room_id
-    ).filter(
-        Participant.pagamento_status == 'pago'
-    ).scalar()
-    
-    total_arrecadado = total_arrecadado_query or 0
-    
-    # Total pendente (participantes com status 'pendente')
-    total_pendente_query = db.session.query(
-        db.func.sum(Room.valor)
-    ).join(
-        Participant, Room.id == Participant.room_id
-    ).filter(
-        Participant.pagamento_status == 'pendente',
-        Participant.is_active == True
-    ).scalar()
-    
-    total_pendente = total_pendente_query or 0
-    
-    # Valor médio por jogo
-    valor_medio_jogo_query = db.session.query(db.func.avg(Room.valor)).scalar()
-    valor_medio_jogo = valor_medio_jogo_query or 0
-    
-    # Arrecadação mensal
-    arrecadacao_mensal_query = db.session.query(
-        db.func.strftime('%m/%Y', Participant.pagamento_data).label('mes'),
-        db.func.sum(Room.valor).label('valor')
-    ).join(
-        Room, Room.id == Participant.room_id
-    ).filter(
-        Participant.pagamento_status == 'pago',
-        Participant.pagamento_data != None
-    ).group_by('mes').order_by('mes').all()
-    
-    arrecadacao_mensal = [{'mes': res[0], 'valor': res[1]} for res in arrecadacao_mensal_query]
-    
-    # Status de pagamentos
-    status_query = db.session.query(
-        Participant.pagamento_status,
-        db.func.count(Participant.id)
-    ).filter(
-        Participant.is_active == True
-    ).group_by(Participant.pagamento_status).all()
-    
-    status_pagamentos = {status[0]: status[1] for status in status_query}
-    
-    # Últimos pagamentos
-    ultimos_pagamentos_query = db.session.query(
-        Participant.pagamento_data.label('data'),
-        User.name.label('jogador'),
-        Room.name.label('jogo'),
-        Room.valor.label('valor'),
-        Participant.pagamento_metodo.label('metodo'),
-        Participant.pagamento_status.label('status')
-    ).join(
-        User, User.id == Participant.user_id
-    ).join(
-        Room, Room.id == Participant.room_id
-    ).filter(
-        Participant.pagamento_status.in_(['pago', 'pendente']),
-        Participant.is_active == True
-    ).order_by(Participant.pagamento_data.desc()
-    ).limit(10).all()
-    
-    ultimos_pagamentos = []
-    for pagamento in ultimos_pagamentos_query:
-        if pagamento.data:  # Verificar se a data não é None
-            ultimos_pagamentos.append({
-                'data': pagamento.data.isoformat() if pagamento.data else None,
-                'jogador': pagamento.jogador,
-                'jogo': pagamento.jogo,
-                'valor': pagamento.valor,
-                'metodo': pagamento.metodo,
-                'status': pagamento.status
-            })
+    upload = request.files.get('arquivo')
+    if upload:
+        stream = upload.stream
+        fmt = request.args.get('formato') or bulk_import.detect_format(upload.filename, upload.mimetype)
+    else:
+        stream = request.stream
+        fmt = request.args.get('formato') or bulk_import.detect_format(content_type=request.mimetype)
+    
+    if fmt not in ('csv', 'jsonl'):
+        return jsonify({
+            'message': f'Formato inválido: {fmt} (use csv ou jsonl)',
+            'error': True
+        }), 400
     
+    report = bulk_import.import_file(kind, stream, fmt, creator_id=current_user.id)
+    report['message'] = f"{report['inseridos']} registro(s) importado(s), {report['total_erros']} linha(s) com erro"
+    report['error'] = False
+    return jsonify(report)
+
+# ===============================
+# Tarefas em segundo plano
+# ===============================
+
+@admin_bp.route('/api/jobs', methods=['GET'])
+@login_required
+def jobs_status():
+    """Profundidade da fila e duração das tarefas em segundo plano"""
+    return jsonify(jobs.get_queue().stats())
+
+@admin_bp.route('/api/cache', methods=['GET'])
+@login_required
+def cache_stats():
+    """Taxa de acerto e tamanho de cada cache (contadores do worker que atendeu)"""
     return jsonify({
-        'total_arrecadado': total_arrecadado,
-        'total_pendente': total_pendente,
-        'valor_medio_jogo': valor_medio_jogo,
-        'arrecadacao_mensal': arrecadacao_mensal,
-        'status_pagamentos': status_pagamentos,
-        'ultimos_pagamentos': ultimos_pagamentos
-    }) 
\ No newline at end of file
+        'backend': current_app.config.get('CACHE_BACKEND') or 'memory://',
+        'caches': cache.stats()
+    })
@@ -0,0 +1,32 @@
+from flask import Blueprint, jsonify, request
+from app.utils import room_api
+
+api_bp = Blueprint('api', __name__, url_prefix='/api/v1')
+
+@api_bp.route('/salas')
+def list_rooms():
+    """Salas públicas ativas, paginadas por cursor (fields, sport, city, upcoming, cursor, limit)"""
+    try:
+        return room_api.list_response(request.args)
+    except ValueError as e:
+        return jsonify({
+            'message': str(e),
+            'error': True
+        }), 400
+
+@api_bp.route('/salas/<link_code>')
+def room_detail(link_code):
+    """Detalhe da sala pelo link compartilhado (fields)"""
+    try:
+        response = room_api.detail_response(link_code, request.args)
+    except ValueError as e:
+        return jsonify({
+            'message': str(e),
+            'error': True
+        }), 400
+    if response is None:
+        return jsonify({
+            'message': 'Sala não encontrada',
+            'error': True
+        }), 404
+    return response
@@ -3,6 +3,7 @@ from flask_login import login_user, logout_user, login_required, current_user
 from app import db
 from app.models.models import User, Room, Participant
 from app.models.forms import LoginForm, RegisterForm
+from app.utils import archive, ical, passwords
 
 auth_bp = Blueprint('auth', __name__, url_prefix='/auth')
 
@@ -20,7 +21,18 @@ def login():
         user = User.query.filter_by(username=form.username.data).first()
         
         # Verifica se o usuário existe e a senha está correta
-        if user and user.check_password(form.password.data):
+        try:
+            valid = user is not None and user.check_password(
+                form.password.data, key=passwords.client_key(form.username.data))
+        except passwords.TooManyAttempts:
+            flash('Muitas tentativas de login ao mesmo tempo. Aguarde alguns segundos e tente novamente.', 'warning')
+            return render_template('auth/login.html', form=form), 429
+        
+        if valid:
+            # Atualiza o hash se a configuração de senhas mudou
+            if user.rehash_password(form.password.data):
+                db.session.commit()
+            
             # Faz o login do usuário
             login_user(user, remember=form.remember_me.data)
             
@@ -84,6 +96,14 @@ def profile():
         Participant.is_active == True
     ).all()
     
+    # Jogos antigos já arquivados
+    past_games = archive.past_games(current_user.id)
+    
+    # Link pessoal para assinar os jogos em aplicativos de calendário
+    calendar_url = url_for('main.user_calendar', token=ical.user_token(current_user.id), _external=True)
+    
     return render_template('auth/profile.html', 
                           rooms_created=rooms_created,
-                          participations=participations) 
\ No newline at end of file
+                          participations=participations,
+                          past_games=past_games,
+                          calendar_url=calendar_url) 
\ No newline at end of file
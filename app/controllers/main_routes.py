@@ -1,9 +1,9 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, session
 from flask_login import current_user, login_required
 from app import db
-from app.models.models import Room
 from app.models.forms import SearchRoomForm
-from app.utils.cities import search_cities, get_cities_from_api
+from app.utils.cities import search_cities
+from app.utils import page_cache, jobs, ical, search, sports
 from datetime import datetime
 
 main_bp = Blueprint('main', __name__)
@@ -11,24 +11,26 @@ main_bp = Blueprint('main', __name__)
 @main_bp.route('/')
 def index():
     """Página inicial com lista de salas ativas"""
-    search_form = SearchRoomForm()
-    
     # Filtrar por esporte e/ou cidade se especificado
     sport_filter = request.args.get('sport')
     city_filter = request.args.get('city')
+    search_text = request.args.get('q')
     
-    # Construir a query base para salas ativas e públicas
-    rooms_query = Room.query.filter(Room.is_active == True, Room.is_private == False)
+    # Visitantes anônimos sem mensagens pendentes recebem a página já renderizada
+    is_anonymous_page = not current_user.is_authenticated and '_flashes' not in session
+    if is_anonymous_page:
+        page = page_cache.get_page(sport_filter, city_filter, search_text)
+        if page:
+            return page_cache.page_response(page)
     
-    # Aplicar filtros se especificados
-    if sport_filter:
-        rooms_query = rooms_query.filter(Room.sport.ilike(f'%{sport_filter}%'))
+    search_form = SearchRoomForm()
     
-    if city_filter:
-        rooms_query = rooms_query.filter(Room.city == city_filter)
+    # Geração e data lidas antes da consulta: a página guardada nunca é mais nova que elas
+    generation = page_cache.listing_generation(city_filter)
+    modified = page_cache.last_modified(city_filter)
     
-    # Executar a query e ordenar por data
-    rooms = rooms_query.order_by(Room.date).all()
+    # Listagem compartilhada entre todos os visitantes do mesmo filtro
+    rooms = page_cache.get_listing(sport_filter, city_filter, search_text)
     
     # Separar salas em próximas e passadas
     now = datetime.utcnow()
@@ -36,15 +38,29 @@ def index():
     past_rooms = [room for room in rooms if room.date <= now]
     
     # Obter as participações do usuário atual (se estiver logado)
-    user_participations = []
+    user_participations = set()
     if current_user.is_authenticated:
-        user_participations = [p.room_id for p in current_user.participations if p.is_active]
+        user_participations = page_cache.get_user_participations(
+            current_user.id, sport_filter, city_filter, rooms, search_text)
     
-    return render_template('index.html', 
+    # A página anônima guardada serve a qualquer grafia da mesma chave: mostra o nome do catálogo,
+    # não o texto de quem a renderizou; usuários logados veem o que digitaram
+    sport_value = sports.display_name(sport_filter) if is_anonymous_page else (sport_filter or '')
+    
+    html = render_template('index.html', 
                           upcoming_rooms=upcoming_rooms, 
                           past_rooms=past_rooms,
                           search_form=search_form,
-                          user_participations=user_participations)
+                          user_participations=user_participations,
+                          # Na página anônima, a forma normalizada da chave do cache (serve a qualquer grafia)
+                          search_text=search.normalize_query(search_text) if is_anonymous_page else (search_text or ''),
+                          sport_filter=sport_value)
+    
+    if is_anonymous_page:
+        return page_cache.page_response(page_cache.store_page(
+            sport_filter, city_filter, html, generation, modified, search_text))
+    
+    return html
 
 @main_bp.route('/sobre')
 def about():
@@ -58,6 +74,48 @@ def search_cities_api():
     results = search_cities(query)
     return jsonify(results)
 
+@main_bp.route('/api/salas/busca')
+def search_rooms_api():
+    """API de busca textual de salas (nome, descrição, local, cidade e esporte)"""
+    search_text = request.args.get('q', '')
+    if not search_text.strip():
+        return jsonify({
+            'message': 'Informe o texto da busca (q)',
+            'error': True
+        }), 400
+    
+    rooms = page_cache.get_listing(request.args.get('sport'), request.args.get('city'), search_text)
+    return jsonify([{
+        'id': room.id,
+        'name': room.name,
+        'sport': room.sport,
+        'date': room.date.isoformat(),
+        'city': room.city,
+        'link_code': room.link_code,
+        'url': url_for('room.view_room', link_code=room.link_code),
+        'max_participants': room.max_participants,
+        'active_count': room.active_count,
+        'creator_name': room.creator_name
+    } for room in rooms])
+
+@main_bp.route('/calendario/quadra/<int:court_id>.ics')
+def court_calendar(court_id):
+    """Calendário (.ics) com os jogos de uma quadra"""
+    return ical.feed_response('quadra', court_id) or ('Quadra não encontrada', 404)
+
+@main_bp.route('/calendario/cidade/<city>.ics')
+def city_calendar(city):
+    """Calendário (.ics) com os jogos públicos de uma cidade"""
+    return ical.feed_response('cidade', city)
+
+@main_bp.route('/calendario/usuario/<token>.ics')
+def user_calendar(token):
+    """Calendário (.ics) com os jogos em que o usuário está inscrito (link pessoal)"""
+    user_id = ical.user_from_token(token)
+    if user_id is None:
+        return 'Link de calendário inválido', 404
+    return ical.feed_response('usuario', user_id)
+
 @main_bp.route('/admin/atualizar-cidades')
 @login_required
 def update_cities_cache():
@@ -67,10 +125,8 @@ def update_cities_cache():
         flash('Acesso negado. Apenas administradores podem atualizar o cache de cidades.', 'danger')
         return redirect(url_for('main.index'))
     
-    try:
-        cities = get_cities_from_api()
-        flash(f'Cache de cidades atualizado com sucesso! {len(cities)} cidades carregadas.', 'success')
-    except Exception as e:
-        flash(f'Erro ao atualizar o cache de cidades: {str(e)}', 'danger')
+    # A consulta ao IBGE é lenta: roda em segundo plano
+    jobs.enqueue('cidades.atualizar', unique=True)
+    flash('Atualização do cache de cidades agendada. A nova lista estará disponível em alguns instantes.', 'success')
     
-    return redirect(url_for('main.index')) 
\ No newline at end of file
+    return redirect(url_for('main.index'))
\ No newline at end of file
@@ -1,8 +1,10 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, abort
+from flask import Blueprint, render_template, request, redirect, url_for, flash, abort, Response, current_app, session
 from flask_login import login_required, current_user
 from app import db
 from app.models.models import Room, Participant
 from app.models.forms import CreateRoomForm, EditRoomForm
+from app.utils import events, page_cache, partitions, room_cache, notifications, sync
+from datetime import datetime
 
 room_bp = Blueprint('room', __name__, url_prefix='/sala')
 
@@ -46,6 +48,14 @@ def create_room():
 @room_bp.route('/<link_code>')
 def view_room(link_code):
     """Visualizar uma sala específica"""
+    # Links compartilhados: visitantes anônimos recebem a página já renderizada
+    is_anonymous_page = not current_user.is_authenticated and '_flashes' not in session
+    if is_anonymous_page:
+        page = room_cache.get_page(link_code)
+        if page:
+            return page_cache.page_response(page)
+    
+    generation = room_cache.generation()
     room = Room.query.filter_by(link_code=link_code).first_or_404()
     
     # Verificar se o usuário está participando
@@ -64,12 +74,57 @@ def view_room(link_code):
     
     # Qualquer pessoa com o link pode acessar a sala, mesmo que seja privada
     
-    return render_template('view_room.html', 
+    html = render_template('view_room.html', 
                           room=room, 
                           is_owner=is_owner,
                           is_participating=is_participating,
                           is_in_waiting_list=is_in_waiting_list,
                           user_participation=user_participation)
+    
+    if is_anonymous_page:
+        page = page_cache.make_page(html, datetime.utcnow().replace(microsecond=0))
+        room_cache.store_page(room, page, generation)
+        return page_cache.page_response(page)
+    
+    return html
+
+@room_bp.route('/<link_code>/eventos')
+def room_events(link_code):
+    """Stream SSE com as atualizações da lista de participantes da sala"""
+    snapshot = room_cache.get_snapshot(link_code)
+    if snapshot is None:
+        generation = room_cache.generation()
+        room_id = db.session.query(Room.id).filter_by(link_code=link_code).scalar()
+        if room_id is None:
+            abort(404)
+        snapshot = events.current_snapshot(room_id)
+        room_cache.store_snapshot(room_id, link_code, snapshot, generation)
+    room_id = snapshot['room_id']
+    keepalive = current_app.config.get('EVENTS_KEEPALIVE', 15)
+    subscription = events.subscribe(room_id)
+    
+    # O gerador roda depois do fim da requisição: não usa o banco nem o contexto
+    def stream():
+        try:
+            yield 'retry: 5000\n\n'
+            yield events.format_sse(snapshot, event='roster')
+            while True:
+                message = subscription.get(timeout=keepalive)
+                if message is None:
+                    # Comentário para manter a conexão aberta em proxies
+                    yield ': keepalive\n\n'
+                elif message.get('deleted'):
+                    yield events.format_sse(message, event='closed')
+                    return
+                else:
+                    yield events.format_sse(message, event='roster')
+        finally:
+            subscription.close()
+    
+    return Response(stream(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
 
 @room_bp.route('/<link_code>/participar')
 @login_required
@@ -77,37 +132,23 @@ def join_room(link_code):
     """Participar de uma sala (inscrição rápida)"""
     room = Room.query.filter_by(link_code=link_code).first_or_404()
     
-    # Verificar se o usuário é o organizador e já está participando
+    # Inscrição atômica: não duplica participações e já devolve a posição na fila
+    result = room.join(current_user.id)
+    db.session.commit()
+    
+    # Verificar se o usuário é o organizador
     if room.creator_id == current_user.id:
-        participation = current_user.get_participation(room.id)
-        if participation and participation.is_active:
-            flash('Você já está inscrito nesta sala como organizador!', 'info')
-        else:
-            # Adicionar o organizador como participante (caso tenha sido removido por algum motivo)
-            new_participant = Participant(
-                user_id=current_user.id,
-                room_id=room.id
-            )
-            db.session.add(new_participant)
-            db.session.commit()
+        if result.created:
+            # Organizador readicionado (caso tenha sido removido por algum motivo)
             flash('Você foi adicionado como organizador da sala!', 'success')
+        else:
+            flash('Você já está inscrito nesta sala como organizador!', 'info')
         return redirect(url_for('room.view_room', link_code=link_code))
     
-    # Verificar se o usuário já está participando
-    if current_user.is_participating(room.id):
+    # Verificar se o usuário já estava participando
+    if not result.created:
         flash('Você já está inscrito nesta sala!', 'info')
-        return redirect(url_for('room.view_room', link_code=link_code))
-    
-    # Criar novo participante
-    new_participant = Participant(
-        user_id=current_user.id,
-        room_id=room.id
-    )
-    
-    db.session.add(new_participant)
-    db.session.commit()
-    
-    if room.is_full():
+    elif result.is_waiting:
         flash('Você foi adicionado à lista de espera! Atenção: participantes na lista de espera não estão garantidos no jogo.', 'warning')
     else:
         flash('Você foi adicionado à lista de participantes!', 'success')
@@ -132,7 +173,8 @@ def leave_room(link_code):
         flash('Você não está inscrito nesta sala!', 'warning')
         return redirect(url_for('room.view_room', link_code=link_code))
     
-    # Desativar a participação (não excluir)
+    # Desativar a participação (não excluir), avisando quem sai da lista de espera
+    notifications.participant_leaving(room, participation)
     participation.is_active = False
     db.session.commit()
     
@@ -174,7 +216,8 @@ def remove_participant(link_code, participant_id):
         flash('O organizador não pode ser removido da sala', 'warning')
         return redirect(url_for('room.manage_room', link_code=link_code))
     
-    # Desativar o participante (não excluir)
+    # Desativar o participante (não excluir), avisando quem sai da lista de espera
+    notifications.participant_leaving(room, participant)
     participant.is_active = False
     db.session.commit()
     
@@ -212,8 +255,10 @@ def delete_room(link_code):
     # Obter o nome da sala para mensagem de confirmação
     room_name = room.name
     
-    # Excluir todas as participações relacionadas à sala
-    Participant.query.filter_by(room_id=room.id).delete()
+    # Excluir todas as participações relacionadas à sala (exclusão em lote: lápides gravadas à parte)
+    with partitions.scope(partitions.for_instance(room)):
+        sync.record_deleted(Participant.__table__, Participant.room_id == room.id)
+        Participant.query.filter_by(room_id=room.id).delete()
     
     # Excluir a sala
     db.session.delete(room)
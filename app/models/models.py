@@ -1,8 +1,15 @@
 from datetime import datetime, timedelta
+from collections import namedtuple
 import secrets
-from werkzeug.security import generate_password_hash, check_password_hash
+from sqlalchemy.exc import IntegrityError
 from flask_login import UserMixin
 from app import db
+from app.utils import participations, passwords
+from app.utils.scheduling import find_overlaps
+
+# Resultado de uma inscrição: posição na fila (1 = primeiro) e se caiu na lista de espera
+JoinResult = namedtuple('JoinResult', ['participant_id', 'position', 'is_waiting', 'created'])
+
 
 class User(db.Model, UserMixin):
     __tablename__ = 'users'
@@ -26,21 +33,63 @@ class User(db.Model, UserMixin):
         self.set_password(password)
     
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = passwords.hash_password(password)
         
-    def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+    def check_password(self, password, key=None):
+        """Verifica a senha no pool de verificação; key identifica o cliente (ver passwords.client_key) para o limite de concorrência"""
+        return passwords.verify(self.password_hash, password, key)
+    
+    def rehash_password(self, password):
+        """Refaz o hash se o método ou custo configurado mudou (chamar após um login válido)"""
+        if passwords.needs_rehash(self.password_hash):
+            self.set_password(password)
+            return True
+        return False
     
     def is_participating(self, room_id):
-        """Verifica se o usuário está participando de uma sala"""
-        return any(p.room_id == room_id and p.is_active for p in self.participations)
+        """Verifica se o usuário está participando de uma sala (consulta indexada, memorizada na requisição)"""
+        return room_id in participations.active_room_ids(self.id, [room_id])
     
     def get_participation(self, room_id):
-        """Retorna a participação do usuário em uma sala específica"""
-        for p in self.participations:
-            if p.room_id == room_id and p.is_active:
-                return p
-        return None
+        """Retorna a participação ativa do usuário em uma sala específica"""
+        return participations.get_active(self.id, room_id)
+
+
+class Sport(db.Model):
+    """Catálogo de esportes com nome canônico
+
+    Room.sport e Court.sport_type continuam guardando o texto digitado; o
+    sport_id correspondente é preenchido automaticamente no flush (ver
+    app/utils/sports.py) e é usado nos filtros e agrupamentos.
+    """
+    __tablename__ = 'sports'
+
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(50), unique=True, nullable=False)
+    slug = db.Column(db.String(50), unique=True, nullable=False)  # Nome normalizado (sem acentos, minúsculo)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    aliases = db.relationship('SportAlias', backref='sport', lazy=True, cascade='all, delete-orphan')
+
+    def __init__(self, name, slug):
+        self.name = name
+        self.slug = slug
+
+    def __repr__(self):
+        return f"<Sport id={self.id}, name={self.name}>"
+
+
+class SportAlias(db.Model):
+    """Outros nomes pelos quais um esporte é digitado (ex.: 'volei', 'voleibol')"""
+    __tablename__ = 'sport_aliases'
+
+    id = db.Column(db.Integer, primary_key=True)
+    sport_id = db.Column(db.Integer, db.ForeignKey('sports.id'), nullable=False, index=True)
+    slug = db.Column(db.String(50), unique=True, nullable=False)
+
+    def __init__(self, slug, sport=None):
+        self.slug = slug
+        self.sport = sport
 
 
 class Court(db.Model):
@@ -52,6 +101,7 @@ class Court(db.Model):
     location = db.Column(db.String(200), nullable=True, default='')
     description = db.Column(db.Text, nullable=True, default='')
     sport_type = db.Column(db.String(50), nullable=False)  # Tipo de esporte (futebol, vôlei, etc.)
+    sport_id = db.Column(db.Integer, db.ForeignKey('sports.id'), nullable=True, index=True)  # Preenchido a partir de sport_type
     type = db.Column(db.String(50), nullable=False, default='default')  # Tipo de quadra (campo necessário na tabela)
     city = db.Column(db.String(100), nullable=False, default='Cidade')  # Cidade da quadra
     valor_hora = db.Column(db.Float, nullable=False, default=0.0)  # Preço por hora (campo legado)
@@ -59,9 +109,11 @@ class Court(db.Model):
     is_active = db.Column(db.Boolean, default=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     capacity = db.Column(db.Integer, nullable=False, default=10)  # Capacidade máxima de jogadores
+    change_seq = db.Column(db.Integer, nullable=True, index=True)  # Sequência da última alteração (ver app/utils/sync.py)
     
     # Relacionamento com reservas
     reservations = db.relationship('Room', backref='court', lazy=True)
+    sport_ref = db.relationship('Sport', lazy=True)
     
     def __init__(self, name=None, sport_type=None, hourly_price=0.0, location=None, description=None, capacity=10, is_active=True, city=None):
         self.name = name or ''
@@ -90,7 +142,47 @@ class Court(db.Model):
         ).count()
         
         return overlapping_reservations == 0
-    
+
+    def find_conflicts(self, intervals):
+        """Verifica vários períodos de uma vez e retorna, para cada um, as reservas conflitantes
+
+        Faz uma única consulta cobrindo todos os períodos (ex.: as ocorrências de
+        uma série) em vez de chamar is_available para cada um.
+        """
+        if not intervals:
+            return []
+
+        reservations = db.session.query(
+            Room.date, Room.end_time, Room.id, Room.name
+        ).filter(
+            Room.court_id == self.id,
+            Room.is_active == True,
+            Room.date < max(end for _, end in intervals),
+            Room.end_time > min(start for start, _ in intervals)
+        ).all()
+
+        return find_overlaps(intervals, reservations)
+
+    @staticmethod
+    def busy_intervals(court_ids, start_time, end_time):
+        """Retorna {court_id: [(início, fim), ...]} com as reservas das quadras no período (uma consulta)"""
+        busy = {}
+        if not court_ids:
+            return busy
+
+        rows = db.session.query(
+            Room.court_id, Room.date, Room.end_time
+        ).filter(
+            Room.court_id.in_(court_ids),
+            Room.is_active == True,
+            Room.date < end_time,
+            Room.end_time > start_time
+        ).order_by(Room.court_id, Room.date)
+
+        for court_id, start, end in rows:
+            busy.setdefault(court_id, []).append((start, end))
+        return busy
+
     def get_reservations_for_day(self, date):
         """Retorna todas as reservas para uma data específica"""
         start_of_day = datetime.combine(date.date(), datetime.min.time())
@@ -106,10 +198,13 @@ class Court(db.Model):
 
 class Room(db.Model):
     __tablename__ = 'rooms'
+    # AUTOINCREMENT: o id de uma sala arquivada nunca é reaproveitado (ver app/utils/archive.py)
+    __table_args__ = {'sqlite_autoincrement': True}
     
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
     sport = db.Column(db.String(50), nullable=False)
+    sport_id = db.Column(db.Integer, db.ForeignKey('sports.id'), nullable=True, index=True)  # Preenchido a partir de sport
     date = db.Column(db.DateTime, nullable=False)
     max_participants = db.Column(db.Integer, nullable=False)
     description = db.Column(db.Text, nullable=True)
@@ -126,9 +221,11 @@ class Room(db.Model):
     court_id = db.Column(db.Integer, db.ForeignKey('courts.id'), nullable=True)
     duration_hours = db.Column(db.Float, nullable=False, default=1.0)  # Duração em horas
     end_time = db.Column(db.DateTime, nullable=True)  # Horário de término calculado
+    change_seq = db.Column(db.Integer, nullable=True, index=True)  # Sequência da última alteração (ver app/utils/sync.py)
     
     # Relacionamento com os participantes
     participants = db.relationship('Participant', backref='room', lazy=True)
+    sport_ref = db.relationship('Sport', lazy=True)
     
     def __init__(self, name, sport, date, max_participants, creator_id, description=None, is_private=False, location=None, city=None, valor=0.0, court_id=None, duration_hours=1.0):
         self.name = name
@@ -149,6 +246,78 @@ class Room(db.Model):
         if date:
             self.end_time = date + timedelta(hours=duration_hours)
     
+    def join(self, user_id):
+        """Inscreve o usuário na sala de forma atômica e retorna um JoinResult
+        
+        O INSERT só acontece se não houver participação ativa do usuário na sala
+        (o índice único parcial garante isso também sob concorrência). A posição
+        na fila é calculada na mesma transação, que já detém o lock de escrita,
+        sem recarregar a lista de participantes. Não faz commit.
+        """
+        from app.utils import invalidation, partitions, sync
+        
+        # Todas as instruções na partição da sala (o INSERT via Core não tem outro roteamento)
+        with partitions.scope(partitions.for_instance(self)):
+            active = db.and_(
+                Participant.user_id == user_id,
+                Participant.room_id == self.id,
+                Participant.is_active == True
+            )
+        
+            # O horário de inscrição nunca fica antes da última inscrição da sala, para que a
+            # ordem da fila siga a ordem em que as transações obtiveram o lock de escrita
+            now = db.literal(datetime.utcnow(), db.DateTime)
+            latest = db.select([db.func.max(Participant.registered_at)]).where(
+                Participant.room_id == self.id
+            ).scalar_subquery()
+            registered_at = db.case([(latest > now, latest)], else_=now)
+        
+            insert = Participant.__table__.insert().from_select(
+                ['user_id', 'room_id', 'registered_at', 'is_active', 'checked_in', 'pagamento_status'],
+                db.select([
+                    db.literal(user_id),
+                    db.literal(self.id),
+                    registered_at,
+                    db.literal(True),
+                    db.literal(False),
+                    db.literal('pendente')
+                ]).where(~db.exists().where(active))
+            )
+        
+            try:
+                created = db.session.execute(insert).rowcount == 1
+            except IntegrityError:
+                # Outra requisição inscreveu o mesmo usuário entre a verificação e o INSERT
+                db.session.rollback()
+                created = False
+        
+            participant_id, registered_at = db.session.query(
+                Participant.id, Participant.registered_at
+            ).filter(active).first()
+        
+            if created:
+                # Sequência reservada só quando houve inscrição: o toque repetido continua
+                # sem escrita e o commit dele não grava nada no disco
+                db.session.execute(
+                    Participant.__table__.update().where(
+                        Participant.id == participant_id
+                    ).values(change_seq=sync.next_value())
+                )
+        
+            position = db.session.query(db.func.count(Participant.id)).filter(
+                Participant.room_id == self.id,
+                Participant.is_active == True,
+                db.or_(
+                    Participant.registered_at < registered_at,
+                    db.and_(Participant.registered_at == registered_at, Participant.id <= participant_id)
+                )
+            ).scalar()
+        
+            if created:
+                invalidation.track(self)
+        
+            return JoinResult(participant_id, position, position > self.max_participants, created)
+    
     def is_full(self):
         """Verifica se a sala está cheia"""
         return len(self.get_active_participants()) >= self.max_participants
@@ -159,7 +328,7 @@ class Room(db.Model):
         active_participants = [p for p in self.participants if p.is_active]
         
         # Ordenar por data de registro (os mais antigos primeiro)
-        active_participants.sort(key=lambda p: p.registered_at)
+        active_participants.sort(key=lambda p: (p.registered_at, p.id))
         
         # Debug
         print(f"Sala {self.name} (ID: {self.id}) - Participantes ativos: {len(active_participants)}")
@@ -181,26 +350,34 @@ class Room(db.Model):
         active_participants = self.get_active_participants()
         return active_participants[:min(len(active_participants), self.max_participants)]
     
+    @property
+    def pricing(self):
+        """Resumo de valores da sala (PriceBreakdown), calculado uma vez por requisição"""
+        from app.utils import pricing
+        return pricing.for_room(self)
+    
     def calculate_total_price(self):
         """Calcula o preço total da reserva com base na quadra e duração"""
-        if not self.court_id:
-            return self.valor * len(self.get_confirmed_participants())
-        
-        return self.court.hourly_price * self.duration_hours
+        return self.pricing.total_price
     
     def calculate_price_per_person(self):
         """Calcula o valor por pessoa com base no preço total e número de participantes"""
-        total_price = self.calculate_total_price()
-        participants_count = len(self.get_confirmed_participants())
-        
-        if participants_count == 0:
-            return 0.0
-            
-        return total_price / participants_count
+        return self.pricing.price_per_person
 
 
 class Participant(db.Model):
     __tablename__ = 'participants'
+    __table_args__ = (
+        # Um usuário só pode ter uma participação ativa por sala
+        db.Index(
+            'ix_participants_active_user_room', 'user_id', 'room_id',
+            unique=True,
+            sqlite_where=db.text('is_active = 1'),
+            postgresql_where=db.text('is_active')
+        ),
+        # Como em Room: ids arquivados não voltam a ser usados
+        {'sqlite_autoincrement': True},
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -212,6 +389,7 @@ class Participant(db.Model):
     pagamento_data = db.Column(db.DateTime, nullable=True)
     pagamento_metodo = db.Column(db.String(50), nullable=True)
     observacoes = db.Column(db.Text, nullable=True)
+    change_seq = db.Column(db.Integer, nullable=True, index=True)  # Sequência da última alteração (ver app/utils/sync.py)
     
     def __init__(self, user_id, room_id):
         self.user_id = user_id
@@ -237,4 +415,72 @@ class Participant(db.Model):
         except ValueError:
             # Se o participante não estiver na lista de participantes ativos
             print(f"Participante {self.user.name} (ID: {self.id}) não está na lista de participantes ativos")
-            return False 
\ No newline at end of file
+            return False 
+
+
+class Notification(db.Model):
+    """Aviso pendente de envio (caixa de saída gravada na mesma transação da mudança)"""
+    __tablename__ = 'notifications'
+    __table_args__ = (
+        db.Index('ix_notifications_pending', 'sent_at', 'user_id'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    room_id = db.Column(db.Integer, nullable=False)  # Sem chave estrangeira: a sala pode ser excluída ou arquivada
+    kind = db.Column(db.String(20), nullable=False)  # promocao
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    sent_at = db.Column(db.DateTime, nullable=True)
+    
+    def __init__(self, user_id, room_id, kind):
+        self.user_id = user_id
+        self.room_id = room_id
+        self.kind = kind
+
+
+class Tombstone(db.Model):
+    """Registro de uma linha excluída de quadras, salas ou participantes, para a sincronização incremental"""
+    __tablename__ = 'tombstones'
+    __table_args__ = (
+        db.Index('ix_tombstones_table_seq', 'table_name', 'change_seq'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    table_name = db.Column(db.String(20), nullable=False)
+    row_id = db.Column(db.Integer, nullable=False)
+    room_id = db.Column(db.Integer, nullable=True)  # Sala do participante excluído
+    change_seq = db.Column(db.Integer, nullable=False)
+    deleted_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def __init__(self, table_name, row_id, change_seq, room_id=None):
+        self.table_name = table_name
+        self.row_id = row_id
+        self.change_seq = change_seq
+        self.room_id = room_id
+
+
+# Contadores com uma linha por nome: 'alteracoes' (última sequência) e 'podadas' (lápides descartadas até)
+change_sequence = db.Table(
+    'change_sequence',
+    db.Column('name', db.String(20), primary_key=True),
+    db.Column('value', db.Integer, nullable=False, default=0)
+)
+
+
+def _archive_table(name, source, *extra):
+    """Tabela de arquivo com as mesmas colunas da tabela de origem, sem chaves estrangeiras"""
+    columns = [db.Column(column.name, column.type, primary_key=column.primary_key) for column in source.columns]
+    return db.Table(name, *columns, db.Column('archived_at', db.DateTime, nullable=False), *extra)
+
+
+# Salas antigas e suas participações são movidas para cá pelo arquivamento (ver app/utils/archive.py)
+rooms_archive = _archive_table(
+    'rooms_archive', Room.__table__,
+    db.Index('ix_rooms_archive_date', 'date')
+)
+
+participants_archive = _archive_table(
+    'participants_archive', Participant.__table__,
+    db.Index('ix_participants_archive_user_id', 'user_id'),
+    db.Index('ix_participants_archive_room_id', 'room_id')
+)
@@ -1,19 +1,61 @@
 from app import db
-from datetime import date
+from datetime import date, datetime, time, timedelta
+from sqlalchemy import event
+
+MINUTOS_POR_DIA = 24 * 60
+
+
+def minutos(hora):
+    """Converte 'HH:MM' em minutos desde 00:00"""
+    horas, _, mins = hora.partition(':')
+    total = int(horas) * 60 + int(mins)
+    if not 0 <= total <= MINUTOS_POR_DIA:
+        raise ValueError(f'Horário inválido: {hora}')
+    return total
+
+
+def intervalo_minutos(hora_inicio, hora_fim):
+    """Retorna (início, fim) em minutos; o fim passa de 1440 se a reserva atravessar a meia-noite"""
+    inicio, fim = minutos(hora_inicio), minutos(hora_fim)
+    if fim <= inicio:
+        fim += MINUTOS_POR_DIA
+    return inicio, fim
+
 
 class Reserva(db.Model):
     __tablename__ = 'reservas'
+    __table_args__ = (
+        # Verificação de conflitos: sala + dia + horário de início
+        db.Index('ix_reservas_sala_data_inicio', 'sala_id', 'data', 'inicio_min'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     sala_id = db.Column(db.Integer, db.ForeignKey('salas.id'), nullable=False)
     data = db.Column(db.Date, nullable=False)
     hora_inicio = db.Column(db.String(5), nullable=False)  # Formato HH:MM
     hora_fim = db.Column(db.String(5), nullable=False)    # Formato HH:MM
+    inicio_min = db.Column(db.Integer, nullable=False)  # Minutos desde 00:00 (preenchido a partir de hora_inicio)
+    fim_min = db.Column(db.Integer, nullable=False)     # Minutos desde 00:00 do dia da reserva (preenchido a partir de hora_fim)
     responsavel = db.Column(db.String(100), nullable=False)
     observacoes = db.Column(db.Text)
     
     # Relacionamento com a sala
     sala = db.relationship('Sala', backref=db.backref('reservas', lazy=True))
     
+    @property
+    def inicio(self):
+        return datetime.combine(self.data, time()) + timedelta(minutes=self.inicio_min)
+    
+    @property
+    def fim(self):
+        return datetime.combine(self.data, time()) + timedelta(minutes=self.fim_min)
+    
     def __repr__(self):
-        return f'<Reserva {self.id}: {self.sala.nome} - {self.data} {self.hora_inicio}-{self.hora_fim}>' 
\ No newline at end of file
+        return f'<Reserva {self.id}: {self.sala.nome} - {self.data} {self.hora_inicio}-{self.hora_fim}>' 
+
+
+@event.listens_for(Reserva, 'before_insert')
+@event.listens_for(Reserva, 'before_update')
+def _preencher_minutos(mapper, connection, reserva):
+    """Mantém as colunas inteiras em dia com os horários 'HH:MM'"""
+    reserva.inicio_min, reserva.fim_min = intervalo_minutos(reserva.hora_inicio, reserva.hora_fim)
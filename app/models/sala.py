@@ -1,4 +1,6 @@
 from app import db
+from datetime import datetime, time, timedelta
+from app.utils.scheduling import find_overlaps
 
 class Sala(db.Model):
     __tablename__ = 'salas'
@@ -9,5 +11,45 @@ class Sala(db.Model):
     descricao = db.Column(db.Text)
     status = db.Column(db.String(20), default='ativo')  # ativo, inativo, manutenção
     
+    def find_conflicts(self, intervals):
+        """Verifica vários períodos (início, fim) de uma vez, como Court.find_conflicts
+        
+        Uma única consulta pelo índice (sala, data) cobre todos os períodos; a
+        sobreposição é verificada em memória sobre os minutos inteiros, sem
+        comparar textos 'HH:MM'.
+        """
+        from app.models.reserva import Reserva
+        
+        if not intervals:
+            return []
+        
+        # Reservas do dia anterior podem atravessar a meia-noite
+        first_day = min(start for start, _ in intervals).date() - timedelta(days=1)
+        last_day = max(end for _, end in intervals).date()
+        
+        rows = db.session.query(
+            Reserva.data, Reserva.inicio_min, Reserva.fim_min, Reserva.id, Reserva.responsavel
+        ).filter(
+            Reserva.sala_id == self.id,
+            Reserva.data >= first_day,
+            Reserva.data <= last_day
+        )
+        
+        reservations = []
+        for data, inicio_min, fim_min, reserva_id, responsavel in rows:
+            midnight = datetime.combine(data, time())
+            reservations.append((
+                midnight + timedelta(minutes=inicio_min),
+                midnight + timedelta(minutes=fim_min),
+                reserva_id,
+                responsavel
+            ))
+        
+        return find_overlaps(intervals, reservations)
+    
+    def is_available(self, start_time, end_time):
+        """Verifica se a sala está livre no período especificado"""
+        return not self.find_conflicts([(start_time, end_time)])[0]
+    
     def __repr__(self):
-        return f'<Sala {self.id}: {self.nome}>' 
\ No newline at end of file
+        return f'<Sala {self.id}: {self.nome}>' 
@@ -0,0 +1,166 @@
+"""
+Arquivamento de salas antigas
+
+Salas encerradas e jogos passados continuam nas tabelas rooms e participants
+para sempre, e toda listagem e estatística paga por elas. O arquivamento move,
+em lotes com uma transação cada, as salas cuja data ficou mais antiga que o
+horizonte configurado (ARCHIVE_HORIZON_DAYS) para rooms_archive, junto com suas
+participações, e também as participações canceladas antigas de salas atuais.
+
+As estatísticas e o histórico do usuário leem as duas tabelas através de
+room_history() e participant_history(), entidades do ORM sobre um UNION ALL
+das tabelas atuais e de arquivo. Com partições por cidade, cada partição é
+arquivada em lotes próprios (o arquivo fica na mesma partição da sala).
+"""
+
+import logging
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy.orm import aliased
+
+from app import db
+from app.utils import invalidation, partitions, sync
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HORIZON_DAYS = 90
+DEFAULT_BATCH_SIZE = 500
+
+# Lotes por execução da tarefa; se sobrar trabalho, ela se reagenda imediatamente
+MAX_BATCHES_PER_JOB = 20
+
+TASK_NAME = 'arquivo.arquivar'
+
+_history = {}
+
+
+def _history_entity(model, archive_table):
+    """Entidade do ORM com as mesmas colunas do modelo sobre o UNION ALL das tabelas atual e de arquivo"""
+    if model not in _history:
+        names = model.__table__.columns.keys()
+        union = db.union_all(
+            db.select([model.__table__.c[name] for name in names]),
+            db.select([archive_table.c[name] for name in names])
+        ).subquery(f'{model.__tablename__}_history')
+        _history[model] = aliased(model, union, adapt_on_names=True)
+    return _history[model]
+
+
+def room_history():
+    from app.models.models import Room, rooms_archive
+    return _history_entity(Room, rooms_archive)
+
+
+def participant_history():
+    from app.models.models import Participant, participants_archive
+    return _history_entity(Participant, participants_archive)
+
+
+def _copy(source, target, condition, archived_at):
+    """INSERT INTO target SELECT ... FROM source WHERE condition, nas colunas em comum"""
+    names = [name for name in source.columns.keys() if name in target.columns]
+    select = db.select(
+        [source.c[name] for name in names] + [db.literal(archived_at).label('archived_at')]
+    ).where(condition)
+    return db.session.execute(target.insert().from_select(names + ['archived_at'], select)).rowcount
+
+
+def archive_batch(cutoff, batch_size=DEFAULT_BATCH_SIZE):
+    """Arquiva um lote de salas anteriores a cutoff (na partição do scope() ativo); retorna (salas, participações) movidas"""
+    from app.models.models import Room, Participant, rooms_archive, participants_archive
+
+    rooms = Room.__table__
+    participants = Participant.__table__
+    now = datetime.utcnow()
+
+    batch = db.session.execute(
+        db.select([rooms.c.id, rooms.c.city]).where(rooms.c.date < cutoff).order_by(rooms.c.id).limit(batch_size)
+    ).fetchall()
+    room_ids = [row[0] for row in batch]
+
+    moved_participants = 0
+    if room_ids:
+        _copy(rooms, rooms_archive, rooms.c.id.in_(room_ids), now)
+        moved_participants = _copy(participants, participants_archive, participants.c.room_id.in_(room_ids), now)
+        # Para os painéis, as linhas arquivadas somem das tabelas atuais
+        sync.record_deleted(participants, participants.c.room_id.in_(room_ids))
+        sync.record_deleted(rooms, rooms.c.id.in_(room_ids))
+        db.session.execute(participants.delete().where(participants.c.room_id.in_(room_ids)))
+        db.session.execute(rooms.delete().where(rooms.c.id.in_(room_ids)))
+
+    # Participações canceladas antigas de salas que continuam nas tabelas atuais
+    stale = [row[0] for row in db.session.execute(
+        db.select([participants.c.id]).where(
+            participants.c.is_active == False,
+            participants.c.registered_at < cutoff
+        ).order_by(participants.c.id).limit(batch_size)
+    )]
+    if stale:
+        moved_participants += _copy(participants, participants_archive, participants.c.id.in_(stale), now)
+        sync.record_deleted(participants, participants.c.id.in_(stale))
+        db.session.execute(participants.delete().where(participants.c.id.in_(stale)))
+
+    db.session.commit()
+
+    # Escritas feitas via Core: avisa os caches manualmente
+    if room_ids:
+        invalidation.notify(cities={row[1] for row in batch}, room_ids=room_ids)
+
+    return len(room_ids), moved_participants
+
+
+def archive_old(horizon_days=None, batch_size=None, max_batches=None):
+    """Arquiva em lotes até não restar nada anterior ao horizonte (ou até max_batches lotes)"""
+    horizon_days = horizon_days or current_app.config.get('ARCHIVE_HORIZON_DAYS', DEFAULT_HORIZON_DAYS)
+    batch_size = batch_size or current_app.config.get('ARCHIVE_BATCH_SIZE', DEFAULT_BATCH_SIZE)
+    cutoff = datetime.utcnow() - timedelta(days=horizon_days)
+
+    total_rooms = total_participants = batches = 0
+    for _ in partitions.each():
+        while max_batches is None or batches < max_batches:
+            rooms, participants = archive_batch(cutoff, batch_size)
+            batches += 1
+            total_rooms += rooms
+            total_participants += participants
+            if rooms < batch_size and participants < batch_size:
+                break
+        else:
+            return {'rooms': total_rooms, 'participants': total_participants, 'batches': batches, 'done': False}
+
+    logger.info('Arquivamento: %s salas e %s participações em %s lote(s)', total_rooms, total_participants, batches)
+    return {'rooms': total_rooms, 'participants': total_participants, 'batches': batches, 'done': True}
+
+
+def past_games(user_id, limit=20):
+    """Jogos arquivados de que o usuário participou, do mais recente para o mais antigo"""
+    from app.models.models import rooms_archive, participants_archive
+
+    rows = db.session.execute(
+        db.select([
+            rooms_archive.c.name, rooms_archive.c.sport, rooms_archive.c.date,
+            rooms_archive.c.location, participants_archive.c.checked_in
+        ]).select_from(
+            participants_archive.join(rooms_archive, rooms_archive.c.id == participants_archive.c.room_id)
+        ).where(
+            participants_archive.c.user_id == user_id,
+            participants_archive.c.is_active == True
+        ).order_by(rooms_archive.c.date.desc()).limit(limit)
+    ).fetchall()
+    return partitions.ordered(rows, key=lambda row: row[2], reverse=True, limit=limit)
+
+
+def schedule(delay=None):
+    """Agenda a próxima execução da tarefa de arquivamento (sem duplicar uma já agendada)"""
+    from app.utils import jobs
+
+    if delay is None:
+        delay = current_app.config.get('ARCHIVE_INTERVAL', 0)
+    return jobs.enqueue(TASK_NAME, unique=True, delay=delay)
+
+
+def init_app(app):
+    """Garante que a tarefa periódica esteja agendada (ARCHIVE_INTERVAL = 0 desliga)"""
+    if app.config.get('ARCHIVE_INTERVAL'):
+        with app.app_context():
+            schedule()
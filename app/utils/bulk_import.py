@@ -0,0 +1,458 @@
+"""
+Importação em lote de quadras, salas e participantes
+
+Cadastrar uma arena nova pelo painel significa criar dezenas de quadras e uma
+temporada de jogos, um a um. Aqui o arquivo (CSV ou JSONL) é lido em fluxo,
+sem carregar tudo na memória, e processado em blocos de CHUNK_SIZE linhas:
+cada bloco é validado, tem os conflitos de quadra verificados com uma única
+consulta e é gravado com um INSERT executemany em uma transação própria.
+
+Linhas inválidas não interrompem a importação: são reportadas com o número da
+linha e o motivo, e as demais seguem normalmente.
+
+Colunas aceitas (as mesmas das APIs de criação):
+  - courts: name, sport_type, hourly_price, location, description, capacity, city, is_active
+  - rooms: name, sport, date, max_participants, duration_hours, court_id, valor,
+    description, location, city, is_private, creator_id
+  - participants: user_id ou username, room_id ou link_code, pagamento_status,
+    pagamento_metodo, checked_in, registered_at
+"""
+
+import csv
+import io
+import json
+import secrets
+import time
+from datetime import datetime, timedelta
+from itertools import islice
+
+from sqlalchemy.exc import SQLAlchemyError
+
+from app import db
+from app.utils import invalidation, partitions, sports, sync
+from app.utils.scheduling import BusySchedule
+
+# Linhas por transação (o custo de cada commit, com fsync e o índice FTS, é alto)
+CHUNK_SIZE = 5000
+
+# Erros detalhados no relatório (os demais são apenas contados)
+MAX_REPORTED_ERRORS = 1000
+
+KINDS = ('courts', 'rooms', 'participants')
+
+PAGAMENTO_STATUS = ('pendente', 'pago', 'cancelado')
+
+_TRUE = {'1', 'true', 'sim', 's', 'yes', 'y', 'x'}
+_FALSE = {'', '0', 'false', 'nao', 'não', 'n', 'no'}
+
+
+class RowError(ValueError):
+    """Linha inválida; a mensagem vai para o relatório"""
+
+
+# ===============================
+# Leitura
+# ===============================
+
+def detect_format(filename=None, content_type=None):
+    """Escolhe 'csv' ou 'jsonl' pela extensão do arquivo ou pelo content type"""
+    name = (filename or '').lower()
+    if name.endswith(('.jsonl', '.ndjson', '.json')) or 'json' in (content_type or ''):
+        return 'jsonl'
+    return 'csv'
+
+
+def read_rows(stream, fmt='csv'):
+    """Gera (número da linha, dicionário) a partir de um arquivo binário ou texto, em fluxo"""
+    if isinstance(stream, io.TextIOBase):
+        text = stream
+    else:
+        text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+
+    if fmt == 'jsonl':
+        for number, line in enumerate(text, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as e:
+                yield number, RowError(f'JSON inválido: {e}')
+                continue
+            yield number, row if isinstance(row, dict) else RowError('Cada linha deve ser um objeto JSON')
+        return
+
+    header = text.readline()
+    if not header:
+        return
+    # Planilhas em português costumam exportar CSV separado por ponto e vírgula
+    delimiter = ';' if header.count(';') > header.count(',') else ','
+    fields = [field.strip() for field in next(csv.reader([header], delimiter=delimiter))]
+    reader = csv.DictReader(text, fieldnames=fields, delimiter=delimiter)
+    for row in reader:
+        # A linha 1 é o cabeçalho
+        yield reader.line_num + 1, {key: value for key, value in row.items() if key}
+
+
+# ===============================
+# Conversão de campos
+# ===============================
+
+def _text(row, name, required=False, max_length=None):
+    value = row.get(name)
+    value = '' if value is None else str(value).strip()
+    if required and not value:
+        raise RowError(f'Campo obrigatório ausente ou vazio: {name}')
+    if max_length and len(value) > max_length:
+        raise RowError(f'{name} deve ter no máximo {max_length} caracteres')
+    return value
+
+
+def _number(row, name, cast=float, default=None, required=False, minimum=None):
+    value = row.get(name)
+    if value is None or (isinstance(value, str) and not value.strip()):
+        if required:
+            raise RowError(f'Campo obrigatório ausente ou vazio: {name}')
+        return default
+    try:
+        number = cast(float(str(value).strip().replace(',', '.'))) if isinstance(value, str) else cast(value)
+    except (TypeError, ValueError):
+        raise RowError(f'{name} inválido: {value!r}')
+    if minimum is not None and number < minimum:
+        raise RowError(f'{name} deve ser maior ou igual a {minimum}')
+    return number
+
+
+def _bool(row, name, default=False):
+    value = row.get(name)
+    if value is None:
+        return default
+    if isinstance(value, bool):
+        return value
+    value = str(value).strip().lower()
+    if value in _TRUE:
+        return True
+    if value in _FALSE:
+        return default if value == '' else False
+    raise RowError(f'{name} inválido: {value!r}')
+
+
+def _datetime(row, name, required=False):
+    value = _text(row, name, required=required)
+    if not value:
+        return None
+    for parse in (datetime.fromisoformat, lambda text: datetime.strptime(text, '%d/%m/%Y %H:%M')):
+        try:
+            return parse(value)
+        except ValueError:
+            continue
+    raise RowError(f'{name} inválida: {value!r} (use YYYY-MM-DDTHH:MM ou DD/MM/YYYY HH:MM)')
+
+
+# ===============================
+# Preparação dos blocos
+# ===============================
+
+class _Context:
+    """Estado compartilhado entre os blocos de uma importação"""
+
+    def __init__(self, creator_id):
+        self.creator_id = creator_id
+        self.sport_ids = {}
+        self.courts = {}
+
+    def sport_id(self, text):
+        # Indexado pelo texto original: arquivos repetem o mesmo esporte em milhares de linhas
+        if text not in self.sport_ids:
+            self.sport_ids[text] = sports.resolve(text)
+        return self.sport_ids[text]
+
+    def load_courts(self, court_ids):
+        from app.models.models import Court
+
+        missing = [court_id for court_id in court_ids if court_id not in self.courts]
+        if missing:
+            rows = db.session.query(
+                Court.id, Court.location, Court.city, Court.is_active
+            ).filter(Court.id.in_(missing))
+            for court_id, location, city, is_active in rows:
+                self.courts[court_id] = {'location': location, 'city': city, 'is_active': is_active}
+            for court_id in missing:
+                self.courts.setdefault(court_id, None)
+
+
+def _prepare_courts(rows, context):
+    """Valida as quadras do bloco; retorna (valores, erros, alterações)"""
+    values, errors = [], []
+    now = datetime.utcnow()
+    for number, row in rows:
+        try:
+            sport_type = _text(row, 'sport_type', required=True, max_length=50)
+            hourly_price = _number(row, 'hourly_price', required=True, minimum=0)
+            court = {
+                'name': _text(row, 'name', required=True, max_length=100),
+                'sport_type': sport_type,
+                'type': sport_type,
+                'hourly_price': hourly_price,
+                'valor_hora': hourly_price,
+                'location': _text(row, 'location', max_length=200),
+                'description': _text(row, 'description'),
+                'capacity': _number(row, 'capacity', int, default=10, minimum=1),
+                'city': _text(row, 'city', max_length=100) or 'Cidade',
+                'is_active': _bool(row, 'is_active', default=True),
+                'created_at': now
+            }
+        except RowError as e:
+            errors.append((number, str(e)))
+            continue
+        # Só cadastra esportes novos para linhas válidas
+        court['sport_id'] = context.sport_id(sport_type)
+        values.append(court)
+    return values, errors, invalidation.Changes()
+
+
+def _prepare_rooms(rows, context):
+    """Valida as salas do bloco e descarta as que conflitam com reservas da quadra"""
+    parsed, errors = [], []
+    now = datetime.utcnow()
+    for number, row in rows:
+        try:
+            date = _datetime(row, 'date', required=True)
+            duration_hours = _number(row, 'duration_hours', default=1.0)
+            if duration_hours <= 0 or duration_hours > 24:
+                raise RowError('duration_hours deve estar entre 0 e 24')
+            creator_id = _number(row, 'creator_id', int, default=context.creator_id)
+            if not creator_id:
+                raise RowError('Informe o creator_id da sala')
+            sport = _text(row, 'sport', required=True, max_length=50)
+            parsed.append((number, {
+                'name': _text(row, 'name', required=True, max_length=100),
+                'sport': sport,
+                'date': date,
+                'end_time': date + timedelta(hours=duration_hours),
+                'duration_hours': duration_hours,
+                'max_participants': _number(row, 'max_participants', int, required=True, minimum=1),
+                'description': _text(row, 'description'),
+                'is_private': _bool(row, 'is_private'),
+                'location': _text(row, 'location', max_length=200),
+                'city': _text(row, 'city', max_length=100),
+                'valor': _number(row, 'valor', default=0.0, minimum=0),
+                'court_id': _number(row, 'court_id', int),
+                'creator_id': creator_id,
+                'link_code': secrets.token_urlsafe(6),
+                'is_active': True,
+                'created_at': now
+            }))
+        except RowError as e:
+            errors.append((number, str(e)))
+
+    # Quadras e reservas existentes: uma consulta cada para o bloco inteiro
+    court_ids = {values['court_id'] for _, values in parsed if values['court_id']}
+    context.load_courts(court_ids)
+    schedules = {}
+    if court_ids:
+        from app.models.models import Court
+        with_court = [values for _, values in parsed if values['court_id']]
+        busy = Court.busy_intervals(
+            list(court_ids),
+            min(values['date'] for values in with_court),
+            max(values['end_time'] for values in with_court)
+        )
+        schedules = {court_id: BusySchedule(busy.get(court_id, ())) for court_id in court_ids}
+
+    values_list = []
+    changes = invalidation.Changes()
+    for number, values in parsed:
+        try:
+            court_id = values['court_id']
+            if court_id:
+                court = context.courts.get(court_id)
+                if court is None:
+                    raise RowError(f'Quadra {court_id} não encontrada')
+                conflicts = schedules[court_id].conflicts(values['date'], values['end_time'])
+                if conflicts:
+                    start, end = conflicts[0]
+                    raise RowError(
+                        f'A quadra {court_id} já está reservada de '
+                        f'{start:%d/%m/%Y %H:%M} a {end:%d/%m/%Y %H:%M}'
+                    )
+                # Conflitos com as próximas linhas do arquivo também contam
+                schedules[court_id].add(values['date'], values['end_time'])
+                values['location'] = values['location'] or court['location']
+                values['city'] = values['city'] or court['city']
+            values['city'] = values['city'] or 'Não informada'
+            values['sport_id'] = context.sport_id(values['sport'])
+        except RowError as e:
+            errors.append((number, str(e)))
+            continue
+        values_list.append(values)
+        changes.cities.add(values['city'])
+        changes.months.add(invalidation.month_of(values['date']))
+
+    return values_list, errors, changes
+
+
+def _prepare_participants(rows, context):
+    """Valida as participações do bloco, resolvendo usuários e salas em poucas consultas"""
+    from app.models.models import User, Room, Participant
+
+    parsed, errors = [], []
+    for number, row in rows:
+        try:
+            user = _number(row, 'user_id', int) or _text(row, 'username')
+            room = _number(row, 'room_id', int) or _text(row, 'link_code')
+            if not user:
+                raise RowError('Informe user_id ou username')
+            if not room:
+                raise RowError('Informe room_id ou link_code')
+            status = _text(row, 'pagamento_status') or 'pendente'
+            if status not in PAGAMENTO_STATUS:
+                raise RowError(f'pagamento_status inválido: {status!r}')
+            parsed.append((number, user, room, {
+                'pagamento_status': status,
+                'pagamento_metodo': _text(row, 'pagamento_metodo', max_length=50) or None,
+                'checked_in': _bool(row, 'checked_in'),
+                'registered_at': _datetime(row, 'registered_at') or datetime.utcnow(),
+                'is_active': True
+            }))
+        except RowError as e:
+            errors.append((number, str(e)))
+
+    user_keys = {user for _, user, _, _ in parsed}
+    room_keys = {room for _, _, room, _ in parsed}
+    users = {}
+    for user_id, username in db.session.query(User.id, User.username).filter(db.or_(
+        User.id.in_([key for key in user_keys if isinstance(key, int)]),
+        User.username.in_([key for key in user_keys if isinstance(key, str)])
+    )):
+        users[user_id] = users[username] = user_id
+    rooms = {}
+    for room_id, link_code, city, date in db.session.query(Room.id, Room.link_code, Room.city, Room.date).filter(db.or_(
+        Room.id.in_([key for key in room_keys if isinstance(key, int)]),
+        Room.link_code.in_([key for key in room_keys if isinstance(key, str)])
+    )):
+        rooms[room_id] = rooms[link_code] = (room_id, city, date)
+
+    # Participações ativas já existentes (o índice único parcial rejeitaria o bloco inteiro)
+    existing = set(db.session.query(Participant.user_id, Participant.room_id).filter(
+        Participant.is_active == True,
+        Participant.room_id.in_({room_id for room_id, _, _ in rooms.values()}),
+        Participant.user_id.in_(set(users.values()))
+    )) if users and rooms else set()
+
+    values_list = []
+    changes = invalidation.Changes()
+    for number, user, room, values in parsed:
+        if user not in users:
+            errors.append((number, f'Usuário {user} não encontrado'))
+            continue
+        if room not in rooms:
+            errors.append((number, f'Sala {room} não encontrada'))
+            continue
+        room_id, city, date = rooms[room]
+        pair = (users[user], room_id)
+        if pair in existing:
+            errors.append((number, f'O usuário {user} já participa da sala {room}'))
+            continue
+        existing.add(pair)
+        values.update(user_id=users[user], room_id=room_id)
+        values_list.append(values)
+        changes.cities.add(city)
+        changes.room_ids.add(room_id)
+        changes.user_ids.add(users[user])
+        changes.months.add(invalidation.month_of(date))
+
+    return values_list, errors, changes
+
+
+def _table(kind):
+    from app.models.models import Court, Room, Participant
+    return {'courts': Court, 'rooms': Room, 'participants': Participant}[kind].__table__
+
+
+_PREPARE = {
+    'courts': _prepare_courts,
+    'rooms': _prepare_rooms,
+    'participants': _prepare_participants
+}
+
+
+# ===============================
+# Importação
+# ===============================
+
+def _by_partition(values):
+    """Linhas agrupadas pela partição de destino: a da sala (participantes) ou a da cidade"""
+    groups = {}
+    for value in values:
+        if 'room_id' in value:
+            partition = partitions.for_id(value['room_id'])
+        else:
+            partition = partitions.for_city(value.get('city'))
+        groups.setdefault(partition, []).append(value)
+    return groups.items()
+
+
+def import_rows(kind, rows, creator_id=None, chunk_size=CHUNK_SIZE):
+    """Importa as linhas (número, dicionário) em blocos e retorna o relatório
+
+    Cada bloco é uma transação: se o banco recusar o bloco, suas linhas são
+    reportadas como erro e a importação continua com o próximo.
+    """
+    if kind not in _PREPARE:
+        raise ValueError(f'Tipo de importação desconhecido: {kind}')
+
+    started = time.perf_counter()
+    table = _table(kind)
+    context = _Context(creator_id)
+    report = {'tipo': kind, 'linhas': 0, 'inseridos': 0, 'total_erros': 0, 'erros': []}
+
+    def add_error(number, message):
+        report['total_erros'] += 1
+        if len(report['erros']) < MAX_REPORTED_ERRORS:
+            report['erros'].append({'linha': number, 'erro': message})
+
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            break
+        report['linhas'] += len(chunk)
+
+        valid, unreadable = [], []
+        for number, row in chunk:
+            if isinstance(row, RowError):
+                unreadable.append((number, str(row)))
+            else:
+                valid.append((number, row))
+
+        try:
+            values, errors, changes = _PREPARE[kind](valid, context)
+            # Todas as linhas têm as mesmas chaves: um único executemany (por partição)
+            for partition, group in _by_partition(values):
+                with partitions.scope(partition):
+                    seq = sync.next_value()
+                    for value in group:
+                        value['change_seq'] = seq
+                    db.session.execute(table.insert(), group)
+            db.session.commit()
+        except SQLAlchemyError as e:
+            db.session.rollback()
+            # Esportes cadastrados no bloco desfeito não existem mais
+            context.sport_ids.clear()
+            values, changes = [], invalidation.Changes()
+            errors = [(number, f'Bloco recusado pelo banco: {e.__class__.__name__}') for number, _ in valid]
+
+        for number, message in sorted(unreadable + errors):
+            add_error(number, message)
+        report['inseridos'] += len(values)
+
+        # Escritas feitas via Core: avisa os caches manualmente
+        invalidation.notify(changes.cities, changes.room_ids, changes.user_ids, changes.months)
+
+    report['segundos'] = round(time.perf_counter() - started, 3)
+    return report
+
+
+def import_file(kind, stream, fmt='csv', creator_id=None, chunk_size=CHUNK_SIZE):
+    """Lê o arquivo em fluxo e importa suas linhas (ver import_rows)"""
+    return import_rows(kind, read_rows(stream, fmt), creator_id=creator_id, chunk_size=chunk_size)
@@ -0,0 +1,601 @@
+"""
+Cache usado pelas páginas e consultas mais acessadas
+
+Os módulos registram seus caches com register(nome, ...) e usam sempre a mesma
+interface: get, set, delete, clear, generation e bump. Cada namespace possui
+um número de geração: incrementá-lo invalida de uma vez todas as chaves
+montadas com a geração anterior.
+
+O armazenamento é escolhido por CACHE_BACKEND, igual para todos os caches:
+  - vazio ou 'memory://': LRU dentro do processo, limitado por número de
+    entradas e por tamanho (CACHE_MAX_BYTES por cache);
+  - 'file:///caminho': um arquivo por entrada em um diretório compartilhado
+    pelos workers da mesma máquina (use um tmpfs, ex.: /dev/shm/esportes);
+  - 'redis://host:6379/0': servidor Redis ou compatível, falando o protocolo
+    RESP diretamente (não requer o pacote redis).
+Com vários workers, apenas os backends compartilhados mantêm os caches e as
+gerações consistentes entre eles. Caches registrados com local=True guardam
+estado do próprio processo e ficam sempre em memória.
+
+Nos backends compartilhados os valores são serializados com pickle: o
+diretório e o servidor precisam ser acessíveis apenas pela aplicação. Falhas
+do backend compartilhado não derrubam a requisição: a leitura vira uma falta
+e a gravação é descartada.
+
+Cada cache conta acertos, faltas, gravações e descartes (por processo); veja stats().
+"""
+
+import fcntl
+import hashlib
+import logging
+import os
+import pickle
+import socket
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import unquote, urlparse
+
+logger = logging.getLogger(__name__)
+
+# Tamanho máximo padrão (bytes) de cada cache em memória ou em arquivos; 0 = sem limite
+DEFAULT_MAX_BYTES = 32 * 1024 * 1024
+
+# Prefixo das chaves dos caches no Redis
+DEFAULT_PREFIX = 'esportes:cache:'
+
+# Segundos sem consultar um backend compartilhado depois de uma falha
+RETRY_AFTER = 5
+
+
+def _size(value):
+    """Tamanho aproximado de um valor, usado no limite por bytes"""
+    if isinstance(value, (str, bytes)):
+        return len(value)
+    try:
+        return len(pickle.dumps(value, pickle.HIGHEST_PROTOCOL))
+    except Exception:
+        return 0
+
+
+class LRUCache:
+    """Cache LRU thread-safe com expiração opcional por entrada e limite por tamanho"""
+
+    def __init__(self, max_entries=256, ttl=None, max_bytes=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_bytes = max_bytes or None
+        self.evictions = 0
+        self._bytes = 0
+        self._data = OrderedDict()
+        self._generations = {}
+        self._lock = threading.Lock()
+
+    def _discard(self, key):
+        _, _, size = self._data.pop(key)
+        self._bytes -= size
+
+    def get(self, key):
+        """Retorna o valor armazenado ou None se não existir ou estiver expirado"""
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+
+            value, expires_at, _ = item
+            if expires_at is not None and expires_at < time.monotonic():
+                self._discard(key)
+                return None
+
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        """Armazena um valor, descartando as entradas menos usadas se necessário"""
+        ttl = ttl if ttl is not None else self.ttl
+        expires_at = time.monotonic() + ttl if ttl else None
+        size = _size(value) if self.max_bytes else 0
+        if self.max_bytes and size > self.max_bytes:
+            # Maior que o cache inteiro: não vale descartar todo o resto
+            self.delete(key)
+            return
+
+        with self._lock:
+            if key in self._data:
+                self._discard(key)
+            self._data[key] = (value, expires_at, size)
+            self._bytes += size
+            while len(self._data) > self.max_entries or (self.max_bytes and self._bytes > self.max_bytes):
+                self._discard(next(iter(self._data)))
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            if key in self._data:
+                self._discard(key)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._generations.clear()
+            self._bytes = 0
+
+    def generation(self, namespace):
+        """Retorna a geração atual de um namespace"""
+        with self._lock:
+            return self._generations.get(namespace, 0)
+
+    def bump(self, namespace):
+        """Invalida todas as chaves do namespace incrementando sua geração"""
+        with self._lock:
+            self._generations[namespace] = self._generations.get(namespace, 0) + 1
+            return self._generations[namespace]
+
+    def info(self):
+        with self._lock:
+            return {'entries': len(self._data), 'bytes': self._bytes}
+
+
+class FileCache:
+    """Cache em um diretório compartilhado pelos processos da mesma máquina
+
+    Cada entrada é um arquivo com o pickle de (expiração, valor), gravado em um
+    arquivo temporário e renomeado (os leitores nunca veem uma entrada pela
+    metade). As gerações ficam em um único arquivo alterado sob flock. O limite
+    de tamanho é aplicado periodicamente, removendo os arquivos acessados há
+    mais tempo.
+    """
+
+    # Gravações entre duas verificações do tamanho do diretório
+    SWEEP_EVERY = 200
+
+    def __init__(self, directory, ttl=None, max_bytes=None):
+        self.directory = directory
+        self.ttl = ttl
+        self.max_bytes = max_bytes or None
+        self.evictions = 0
+        self._writes = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        digest = hashlib.sha1(repr(key).encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, f'{digest}.entry')
+
+    def _write(self, path, data):
+        fd, temporary = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(temporary, path)
+        except BaseException:
+            try:
+                os.unlink(temporary)
+            except OSError:
+                pass
+            raise
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                expires_at, value = pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception:
+            # Arquivo corrompido ou de uma versão antiga do código
+            self.delete(key)
+            return None
+        if expires_at is not None and expires_at < time.time():
+            self.delete(key)
+            return None
+        try:
+            # O horário de acesso orienta a remoção das entradas menos usadas
+            os.utime(path)
+        except OSError:
+            pass
+        return value
+
+    def set(self, key, value, ttl=None):
+        ttl = ttl if ttl is not None else self.ttl
+        expires_at = time.time() + ttl if ttl else None
+        data = pickle.dumps((expires_at, value), pickle.HIGHEST_PROTOCOL)
+        if self.max_bytes and len(data) > self.max_bytes:
+            self.delete(key)
+            return
+        self._write(self._path(key), data)
+
+        with self._lock:
+            self._writes += 1
+            sweep = self._writes % self.SWEEP_EVERY == 0
+        if sweep:
+            self.sweep()
+
+    def delete(self, key):
+        try:
+            os.unlink(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def _entries(self):
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith('.entry'):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return entries
+
+    def sweep(self):
+        """Remove as entradas expiradas e, acima de max_bytes, as acessadas há mais tempo"""
+        now = time.time()
+        entries = []
+        for mtime, size, path in self._entries():
+            try:
+                with open(path, 'rb') as f:
+                    expires_at = pickle.load(f)[0]
+            except Exception:
+                expires_at = now - 1
+            if expires_at is not None and expires_at < now:
+                self._unlink(path)
+            else:
+                entries.append((mtime, size, path))
+
+        total = sum(size for _, size, _ in entries)
+        if self.max_bytes and total > self.max_bytes:
+            for _, size, path in sorted(entries):
+                self._unlink(path)
+                self.evictions += 1
+                total -= size
+                if total <= self.max_bytes:
+                    break
+
+    @staticmethod
+    def _unlink(path):
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+
+    def clear(self):
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith('.entry') or entry.name == 'generations':
+                self._unlink(entry.path)
+
+    def _generations(self, update=None):
+        path = os.path.join(self.directory, 'generations')
+        with open(path, 'a+b') as f:
+            fcntl.flock(f, fcntl.LOCK_EX if update else fcntl.LOCK_SH)
+            try:
+                f.seek(0)
+                data = f.read()
+                generations = pickle.loads(data) if data else {}
+                if update:
+                    update(generations)
+                    f.seek(0)
+                    f.truncate()
+                    f.write(pickle.dumps(generations, pickle.HIGHEST_PROTOCOL))
+                    f.flush()
+                return generations
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def generation(self, namespace):
+        return self._generations().get(namespace, 0)
+
+    def bump(self, namespace):
+        def increment(generations):
+            generations[namespace] = generations.get(namespace, 0) + 1
+        return self._generations(increment)[namespace]
+
+    def info(self):
+        entries = self._entries()
+        return {'entries': len(entries), 'bytes': sum(size for _, size, _ in entries)}
+
+
+class RespError(Exception):
+    """Erro devolvido pelo servidor Redis"""
+
+
+class RespClient:
+    """Cliente mínimo do protocolo do Redis (RESP), suficiente para o cache
+
+    Uma conexão por thread, reaberta automaticamente após uma falha.
+    """
+
+    def __init__(self, url, timeout=1.0):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or 'localhost'
+        self.port = parsed.port or 6379
+        self.password = unquote(parsed.password) if parsed.password else None
+        self.db = int(parsed.path.lstrip('/') or 0)
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connect(self):
+        sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        connection = (sock, sock.makefile('rb'))
+        self._local.connection = connection
+        if self.password:
+            self._call(connection, 'AUTH', self.password)
+        if self.db:
+            self._call(connection, 'SELECT', self.db)
+        return connection
+
+    def close(self):
+        connection = getattr(self._local, 'connection', None)
+        self._local.connection = None
+        if connection:
+            connection[1].close()
+            connection[0].close()
+
+    @staticmethod
+    def _encode(args):
+        parts = [b'*%d\r\n' % len(args)]
+        for arg in args:
+            if not isinstance(arg, bytes):
+                arg = str(arg).encode('utf-8')
+            parts.append(b'$%d\r\n%s\r\n' % (len(arg), arg))
+        return b''.join(parts)
+
+    def _read(self, reader):
+        line = reader.readline()
+        if not line.endswith(b'\r\n'):
+            raise ConnectionError('Conexão com o Redis encerrada')
+        kind, rest = line[:1], line[1:-2]
+        if kind == b'+':
+            return rest.decode('utf-8')
+        if kind == b'-':
+            raise RespError(rest.decode('utf-8'))
+        if kind == b':':
+            return int(rest)
+        if kind == b'$':
+            length = int(rest)
+            if length < 0:
+                return None
+            data = reader.read(length + 2)
+            return data[:-2]
+        if kind == b'*':
+            length = int(rest)
+            return None if length < 0 else [self._read(reader) for _ in range(length)]
+        raise ConnectionError(f'Resposta inválida do Redis: {line!r}')
+
+    def _call(self, connection, *args):
+        sock, reader = connection
+        sock.sendall(self._encode(args))
+        return self._read(reader)
+
+    def execute(self, *args):
+        """Envia um comando e retorna a resposta; tenta de novo uma vez se a conexão caiu"""
+        for attempt in (1, 2):
+            connection = getattr(self._local, 'connection', None) or self._connect()
+            try:
+                return self._call(connection, *args)
+            except RespError:
+                raise
+            except (OSError, ConnectionError):
+                self.close()
+                if attempt == 2:
+                    raise
+
+
+class RedisCache:
+    """Cache compartilhado entre processos via Redis, com a mesma interface do LRUCache
+
+    A remoção das entradas menos usadas fica a cargo do próprio Redis (maxmemory-policy).
+    """
+
+    def __init__(self, url, prefix=DEFAULT_PREFIX, ttl=None, client=None):
+        self.prefix = prefix
+        self.ttl = ttl
+        self._client = client or RespClient(url)
+
+    def _key(self, key):
+        return f'{self.prefix}{key!r}'
+
+    def _generation_key(self, namespace):
+        return f'{self.prefix}geracao:{namespace}'
+
+    def get(self, key):
+        value = self._client.execute('GET', self._key(key))
+        return pickle.loads(value) if value is not None else None
+
+    def set(self, key, value, ttl=None):
+        ttl = ttl if ttl is not None else self.ttl
+        data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        if ttl:
+            self._client.execute('SET', self._key(key), data, 'EX', max(int(ttl), 1))
+        else:
+            self._client.execute('SET', self._key(key), data)
+
+    def delete(self, key):
+        self._client.execute('DEL', self._key(key))
+
+    def clear(self):
+        cursor = b'0'
+        while True:
+            cursor, keys = self._client.execute('SCAN', cursor, 'MATCH', f'{self.prefix}*', 'COUNT', 500)
+            if keys:
+                self._client.execute('DEL', *keys)
+            if cursor in (b'0', 0, '0'):
+                break
+
+    def generation(self, namespace):
+        return int(self._client.execute('GET', self._generation_key(namespace)) or 0)
+
+    def bump(self, namespace):
+        return self._client.execute('INCR', self._generation_key(namespace))
+
+    def info(self):
+        return {}
+
+
+# ===============================
+# Caches registrados
+# ===============================
+
+class Cache:
+    """Cache registrado por um módulo; o armazenamento é trocado por init_app
+
+    Conta acertos, faltas, gravações e descartes deste processo. Erros do
+    backend compartilhado são registrados e tratados como falta; por
+    RETRY_AFTER segundos o backend não é consultado (sem esperar timeouts a
+    cada requisição).
+    """
+
+    def __init__(self, name, max_entries=256, ttl=None, max_bytes=None, local=False):
+        self.name = name
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.local = local
+        self.backend = LRUCache(max_entries, ttl, max_bytes)
+        self._counts = {'hits': 0, 'misses': 0, 'sets': 0, 'deletes': 0, 'errors': 0}
+        self._down_until = 0
+        self._lock = threading.Lock()
+
+    def _count(self, name):
+        with self._lock:
+            self._counts[name] += 1
+
+    def _failed(self, operation):
+        self._count('errors')
+        self._down_until = time.monotonic() + RETRY_AFTER
+        logger.warning('Cache %s: falha em %s', self.name, operation, exc_info=True)
+
+    def _available(self):
+        if self._down_until and time.monotonic() < self._down_until:
+            self._count('errors')
+            return False
+        return True
+
+    def get(self, key):
+        value = None
+        if self._available():
+            try:
+                value = self.backend.get(key)
+            except Exception:
+                self._failed('get')
+        self._count('misses' if value is None else 'hits')
+        return value
+
+    def set(self, key, value, ttl=None):
+        if not self._available():
+            return
+        try:
+            self.backend.set(key, value, ttl=ttl)
+            self._count('sets')
+        except Exception:
+            self._failed('set')
+
+    def delete(self, key):
+        if not self._available():
+            return
+        try:
+            self.backend.delete(key)
+            self._count('deletes')
+        except Exception:
+            self._failed('delete')
+
+    def clear(self):
+        if not self._available():
+            return
+        try:
+            self.backend.clear()
+        except Exception:
+            self._failed('clear')
+
+    def generation(self, namespace):
+        if self._available():
+            try:
+                return self.backend.generation(namespace)
+            except Exception:
+                self._failed('generation')
+        # Geração que não coincide com nenhuma chave gravada: força a consulta ao banco
+        return -1
+
+    def bump(self, namespace):
+        if not self._available():
+            return None
+        try:
+            return self.backend.bump(namespace)
+        except Exception:
+            self._failed('bump')
+
+    def stats(self):
+        with self._lock:
+            counts = dict(self._counts)
+        lookups = counts['hits'] + counts['misses']
+        counts.update(
+            name=self.name,
+            backend=type(self.backend).__name__,
+            hit_rate=round(counts['hits'] / lookups, 4) if lookups else None,
+            evictions=getattr(self.backend, 'evictions', None),
+        )
+        try:
+            counts.update(self.backend.info())
+        except Exception:
+            pass
+        return counts
+
+    def reset_stats(self):
+        with self._lock:
+            for name in self._counts:
+                self._counts[name] = 0
+
+
+_registry = {}
+
+# Configuração aplicada por init_app: (CACHE_BACKEND, CACHE_MAX_BYTES, CACHE_PREFIX)
+_settings = None
+_clients = {}
+
+
+def _backend_for(cache):
+    url, max_bytes, prefix = _settings or ('', None, DEFAULT_PREFIX)
+    max_bytes = cache.max_bytes or max_bytes
+    if cache.local or not url or url.startswith('memory://'):
+        return LRUCache(cache.max_entries, cache.ttl, max_bytes)
+    if url.startswith('file://'):
+        return FileCache(os.path.join(urlparse(url).path, cache.name), cache.ttl, max_bytes)
+    if url.startswith('redis://'):
+        # Uma conexão por thread compartilhada por todos os caches
+        client = _clients.setdefault(url, RespClient(url))
+        return RedisCache(url, prefix=f'{prefix}{cache.name}:', ttl=cache.ttl, client=client)
+    raise ValueError(f'CACHE_BACKEND desconhecido: {url}')
+
+
+def register(name, max_entries=256, ttl=None, max_bytes=None, local=False):
+    """Registra (ou retorna, se já existir) o cache com esse nome
+
+    O nome identifica o cache nas métricas e separa suas chaves nos backends
+    compartilhados. local=True mantém o cache sempre dentro do processo.
+    """
+    if name not in _registry:
+        cache = Cache(name, max_entries=max_entries, ttl=ttl, max_bytes=max_bytes, local=local)
+        if _settings is not None:
+            cache.backend = _backend_for(cache)
+        _registry[name] = cache
+    return _registry[name]
+
+
+def init_app(app):
+    """Troca o armazenamento de todos os caches registrados de acordo com CACHE_BACKEND"""
+    global _settings
+    _settings = (
+        app.config.get('CACHE_BACKEND') or '',
+        app.config.get('CACHE_MAX_BYTES', DEFAULT_MAX_BYTES),
+        app.config.get('CACHE_PREFIX', DEFAULT_PREFIX),
+    )
+    for cache in _registry.values():
+        cache.backend = _backend_for(cache)
+        cache._down_until = 0
+        cache.reset_stats()
+
+
+def stats():
+    """Métricas de todos os caches registrados, em ordem de nome"""
+    return [_registry[name].stats() for name in sorted(_registry)]
@@ -8,11 +8,16 @@ import json
 import os
 from datetime import datetime, timedelta
 
+from app.utils import cache
+
 # Caminho para o arquivo de cache
 CACHE_FILE = os.path.join(os.path.dirname(__file__), 'cities_cache.json')
 # Tempo de expiração do cache em dias
 CACHE_EXPIRATION_DAYS = 30
 
+# Lista já lida do arquivo, para a busca da digitação não reler o JSON a cada tecla
+_cities_cache = cache.register('cidades', max_entries=1, ttl=3600)
+
 def get_cities_from_api():
     """
     Obtém a lista de cidades da API do IBGE
@@ -76,6 +81,7 @@ def get_cities_from_api():
         
         with open(CACHE_FILE, 'w', encoding='utf-8') as f:
             json.dump(cache_data, f, ensure_ascii=False)
+        _cities_cache.delete('cidades')
         
         return cidades
     except Exception as e:
@@ -190,9 +196,12 @@ def get_all_cities():
     Returns:
         list: Lista de cidades brasileiras
     """
-    cities = get_cities_from_cache()
+    cities = _cities_cache.get('cidades')
     if cities is None:
-        cities = get_cities_from_api()
+        cities = get_cities_from_cache()
+        if cities is None:
+            cities = get_cities_from_api()
+        _cities_cache.set('cidades', cities)
     return cities
 
 def get_cities_list():
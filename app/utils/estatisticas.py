@@ -0,0 +1,401 @@
+"""
+Cálculo das estatísticas do painel administrativo
+
+Cada função retorna um dicionário serializável em JSON. Elas rodam como
+tarefas em segundo plano (ver app/utils/tasks.py) e o painel lê o último
+resultado calculado.
+
+Os números históricos incluem as salas e participações arquivadas (ver
+app/utils/archive.py): Room e Participant são trocados, dentro de cada função,
+pelas entidades de histórico, que têm as mesmas colunas.
+
+Com partições por cidade (app/utils/partitions.py) as consultas agregadas
+rodam em cada partição; contagens, somas e grupos são combinados aqui, e
+médias saem de soma / quantidade para valerem no total.
+"""
+
+from datetime import datetime
+from app import db
+from app.models.models import Room, User, Participant, Court, Sport
+from app.utils import archive, partitions
+
+
+def _mais(a, b):
+    """Soma como o SUM do SQL: None só se os dois forem None"""
+    if a is None:
+        return b
+    if b is None:
+        return a
+    return a + b
+
+
+def _soma(consulta):
+    """Soma do valor de `consulta()` em cada partição"""
+    total = None
+    for _ in partitions.each():
+        total = _mais(total, consulta())
+    return total
+
+
+def _agrupado(linhas, chaves=1):
+    """Junta os grupos repetidos entre partições (mesmas `chaves` primeiras colunas), somando as demais"""
+    if not partitions.enabled():
+        return linhas
+    grupos = {}
+    for linha in linhas:
+        chave, valores = tuple(linha[:chaves]), list(linha[chaves:])
+        if chave in grupos:
+            grupos[chave] = [_mais(a, b) for a, b in zip(grupos[chave], valores)]
+        else:
+            grupos[chave] = valores
+    return [chave + tuple(valores) for chave, valores in grupos.items()]
+
+
+def _distintos(coluna):
+    """COUNT(DISTINCT coluna) em todas as partições"""
+    if not partitions.enabled():
+        return db.session.query(db.func.count(db.distinct(coluna))).scalar()
+    return len({linha[0] for linha in db.session.query(db.distinct(coluna)) if linha[0] is not None})
+
+
+def _limite(query, quantidade):
+    """LIMIT no banco; com partições só depois de combinar os grupos (ver partitions.ordered)"""
+    return query if partitions.enabled() else query.limit(quantidade)
+
+
+def resumo():
+    """Resumo geral: totais, jogos por mês, próximos jogos e quadras mais usadas"""
+    RoomHistory, ParticipantHistory = archive.room_history(), archive.participant_history()
+
+    # Total de jogos
+    total_jogos = _soma(lambda: db.session.query(RoomHistory).count())
+    
+    # Total de participantes únicos
+    total_participantes = _distintos(ParticipantHistory.user_id)
+    
+    # Média de jogadores por jogo
+    total_participacoes = _soma(lambda: db.session.query(ParticipantHistory).filter_by(is_active=True).count())
+    media_jogadores = round(total_participacoes / total_jogos, 1) if total_jogos > 0 else 0
+    
+    # Total de esportes diferentes
+    total_esportes = _distintos(RoomHistory.sport_id)
+    
+    # Jogos por mês
+    # Formatar datas para agrupar por mês
+    jogos_por_mes_query = db.session.query(
+        db.func.strftime('%m/%Y', RoomHistory.date).label('mes'),
+        db.func.count(RoomHistory.id).label('count')
+    ).group_by('mes').order_by('mes').all()
+    jogos_por_mes_query = partitions.ordered(_agrupado(jogos_por_mes_query), key=lambda res: res[0])
+    
+    jogos_por_mes = [{'mes': res[0], 'quantidade': res[1]} for res in jogos_por_mes_query]
+    
+    # Próximos jogos (só salas atuais: jogos futuros nunca são arquivados)
+    proximos_jogos = Room.query.filter(
+        Room.date >= datetime.now(),
+        Room.is_active == True
+    ).order_by(Room.date).limit(5).all()
+    proximos_jogos = partitions.ordered(proximos_jogos, key=lambda jogo: jogo.date, limit=5)
+    
+    proximos_jogos_data = []
+    for jogo in proximos_jogos:
+        participantes_ativos = len(jogo.get_active_participants())
+        proximos_jogos_data.append({
+            'id': jogo.id,
+            'name': jogo.name,
+            'sport': jogo.sport,
+            'date': jogo.date.isoformat(),
+            'max_participants': jogo.max_participants,
+            'participantes_ativos': participantes_ativos,
+            'court_name': jogo.court.name if jogo.court else None
+        })
+    
+    # Estatísticas de quadras
+    total_quadras = _soma(lambda: Court.query.count())
+    quadras_mais_usadas = db.session.query(
+        Court.name, 
+        db.func.count(RoomHistory.id).label('count')
+    ).join(RoomHistory, Court.id == RoomHistory.court_id
+    ).group_by(Court.id
+    ).order_by(db.func.count(RoomHistory.id).desc()
+    ).limit(5).all()
+    # Cada quadra está em uma só partição: os 5 primeiros de cada uma bastam
+    quadras_mais_usadas = partitions.ordered(quadras_mais_usadas, key=lambda quad: quad[1], reverse=True, limit=5)
+    
+    quadras_stats = [{
+        'name': quad[0], 
+        'reservas': quad[1]
+    } for quad in quadras_mais_usadas]
+    
+    return {
+        'total_jogos': total_jogos,
+        'total_participantes': total_participantes,
+        'media_jogadores': media_jogadores,
+        'total_esportes': total_esportes,
+        'total_quadras': total_quadras,
+        'jogos_por_mes': jogos_por_mes,
+        'proximos_jogos': proximos_jogos_data,
+        'quadras_mais_usadas': quadras_stats
+    }
+
+
+def esportes():
+    """Retorna estatísticas relacionadas aos esportes"""
+    Room, Participant = archive.room_history(), archive.participant_history()
+    
+    # Jogos e valor médio por esporte (agrupados pelo id do catálogo; média = soma / salas com valor)
+    jogos_query = db.session.query(
+        Sport.id,
+        Sport.name,
+        db.func.count(Room.id),
+        db.func.sum(Room.valor),
+        db.func.count(Room.valor)
+    ).join(Room, Room.sport_id == Sport.id
+    ).group_by(Sport.id
+    ).order_by(db.func.count(Room.id).desc()).all()
+    jogos_query = [
+        (sport_id, nome, total, soma / com_valor if com_valor else None)
+        for sport_id, nome, total, soma, com_valor
+        in partitions.ordered(_agrupado(jogos_query, 2), key=lambda res: res[2], reverse=True)
+    ]
+    
+    # Participantes ativos por esporte
+    participantes_query = dict(_agrupado(db.session.query(
+        Room.sport_id,
+        db.func.count(Participant.id)
+    ).join(Participant, Room.id == Participant.room_id
+    ).filter(Participant.is_active == True
+    ).group_by(Room.sport_id).all()))
+    
+    distribuicao = [{'esporte': nome, 'quantidade': total} for _, nome, total, _ in jogos_query]
+    
+    participantes_por_esporte = [
+        {'esporte': nome, 'participantes': participantes_query[sport_id]}
+        for sport_id, nome, _, _ in jogos_query if sport_id in participantes_query
+    ]
+    
+    # Detalhes por esporte
+    detalhes_esportes = []
+    for sport_id, nome_esporte, total_jogos, valor_medio in jogos_query:
+        total_participantes = participantes_query.get(sport_id, 0)
+        
+        # Média de participantes por jogo
+        media_participantes = total_participantes / total_jogos if total_jogos > 0 else 0
+        
+        detalhes_esportes.append({
+            'nome': nome_esporte,
+            'total_jogos': total_jogos,
+            'total_participantes': total_participantes,
+            'media_participantes': media_participantes,
+            'valor_medio': valor_medio or 0
+        })
+    
+    return {
+        'distribuicao': distribuicao,
+        'participantes_por_esporte': participantes_por_esporte,
+        'detalhes': detalhes_esportes
+    }
+
+
+def jogadores():
+    """Retorna estatísticas relacionadas aos jogadores"""
+    Room, Participant = archive.room_history(), archive.participant_history()
+    
+    # Jogadores mais frequentes (com mais participações)
+    jogadores_frequentes_query = _limite(db.session.query(
+        User.id,
+        User.name.label('nome'),
+        db.func.count(Participant.id).label('participacoes')
+    ).join(
+        Participant, User.id == Participant.user_id
+    ).filter(
+        Participant.is_active == True
+    ).group_by(User.id
+    ).order_by(db.func.count(Participant.id).desc()), 10).all()
+    jogadores_frequentes_query = partitions.ordered(
+        _agrupado(jogadores_frequentes_query, 2), key=lambda res: res[2], reverse=True, limit=10
+    )
+    
+    jogadores_frequentes = [{'nome': res[1], 'jogos_participados': res[2]} for res in jogadores_frequentes_query]
+    
+    # Taxa de check-in
+    com_checkin = _soma(lambda: db.session.query(Participant).filter_by(checked_in=True).count())
+    sem_checkin = _soma(lambda: db.session.query(Participant).filter_by(checked_in=False).count())
+    
+    taxa_checkin = {
+        'com_checkin': com_checkin,
+        'sem_checkin': sem_checkin
+    }
+    
+    # Ranking de jogadores
+    ranking = []
+    jogadores_query = db.session.query(
+        User.id, User.name, db.func.count(Participant.id)
+    ).join(
+        Participant, User.id == Participant.user_id
+    ).filter(
+        Participant.is_active == True
+    ).group_by(User.id)
+    if not partitions.enabled():
+        # Com partições o mínimo vale para a soma de todas (filtrado abaixo)
+        jogadores_query = jogadores_query.having(db.func.count(Participant.id) > 1)
+    jogadores_query = partitions.ordered(
+        _agrupado(jogadores_query.order_by(db.func.count(Participant.id).desc()).all(), 2),
+        key=lambda res: res[2], reverse=True
+    )
+    
+    for jogador_id, jogador_nome, participacoes in jogadores_query:
+        if participacoes <= 1:
+            continue
+        
+        # Total de jogos que participou
+        jogos_participados = _soma(
+            lambda: db.session.query(Participant).filter_by(user_id=jogador_id, is_active=True).count()
+        )
+        
+        # Taxa de check-in
+        checkins = _soma(
+            lambda: db.session.query(Participant).filter_by(user_id=jogador_id, is_active=True, checked_in=True).count()
+        )
+        taxa_checkin_jogador = checkins / jogos_participados if jogos_participados > 0 else 0
+        
+        # Esporte favorito (que mais participou)
+        esporte_favorito_query = db.session.query(
+            Sport.id,
+            Sport.name.label('esporte'),
+            db.func.count(Participant.id).label('count')
+        ).join(
+            Room, Room.sport_id == Sport.id
+        ).join(
+            Participant, Room.id == Participant.room_id
+        ).filter(
+            Participant.user_id == jogador_id,
+            Participant.is_active == True
+        ).group_by(Sport.id
+        ).order_by(db.func.count(Participant.id).desc()).all()
+        esporte_favorito_query = partitions.ordered(
+            _agrupado(esporte_favorito_query, 2), key=lambda res: res[2], reverse=True
+        )
+        
+        esporte_favorito = esporte_favorito_query[0][1] if esporte_favorito_query else "Não definido"
+        
+        ranking.append({
+            'nome': jogador_nome,
+            'jogos_participados': jogos_participados,
+            'taxa_checkin': taxa_checkin_jogador,
+            'esporte_favorito': esporte_favorito
+        })
+    
+    return {
+        'mais_frequentes': jogadores_frequentes,
+        'taxa_checkin': taxa_checkin,
+        'ranking': ranking
+    }
+
+
+def financeiro():
+    """Retorna estatísticas financeiras"""
+    Room, Participant = archive.room_history(), archive.participant_history()
+    
+    # Total arrecadado (participantes com status 'pago')
+    total_arrecadado_query = _soma(lambda: db.session.query(
+        db.func.sum(Room.valor)
+    ).join(
+        Participant, Room.id == Participant.room_id
+    ).filter(
+        Participant.pagamento_status == 'pago'
+    ).scalar())
+    
+    total_arrecadado = total_arrecadado_query or 0
+    
+    # Total pendente (participantes com status 'pendente')
+    total_pendente_query = _soma(lambda: db.session.query(
+        db.func.sum(Room.valor)
+    ).join(
+        Participant, Room.id == Participant.room_id
+    ).filter(
+        Participant.pagamento_status == 'pendente',
+        Participant.is_active == True
+    ).scalar())
+    
+    total_pendente = total_pendente_query or 0
+    
+    # Valor médio por jogo
+    soma_valores = _soma(lambda: db.session.query(db.func.sum(Room.valor)).scalar())
+    jogos_com_valor = _soma(lambda: db.session.query(db.func.count(Room.valor)).scalar())
+    valor_medio_jogo = (soma_valores / jogos_com_valor if jogos_com_valor else None) or 0
+    
+    # Arrecadação mensal
+    arrecadacao_mensal_query = db.session.query(
+        db.func.strftime('%m/%Y', Participant.pagamento_data).label('mes'),
+        db.func.sum(Room.valor).label('valor')
+    ).join(
+        Room, Room.id == Participant.room_id
+    ).filter(
+        Participant.pagamento_status == 'pago',
+        Participant.pagamento_data != None
+    ).group_by('mes').order_by('mes').all()
+    arrecadacao_mensal_query = partitions.ordered(_agrupado(arrecadacao_mensal_query), key=lambda res: res[0])
+    
+    arrecadacao_mensal = [{'mes': res[0], 'valor': res[1]} for res in arrecadacao_mensal_query]
+    
+    # Status de pagamentos
+    status_query = db.session.query(
+        Participant.pagamento_status,
+        db.func.count(Participant.id)
+    ).filter(
+        Participant.is_active == True
+    ).group_by(Participant.pagamento_status).all()
+    
+    status_pagamentos = {status[0]: status[1] for status in _agrupado(status_query)}
+    
+    # Últimos pagamentos
+    ultimos_pagamentos_query = db.session.query(
+        Participant.pagamento_data.label('data'),
+        User.name.label('jogador'),
+        Room.name.label('jogo'),
+        Room.valor.label('valor'),
+        Participant.pagamento_metodo.label('metodo'),
+        Participant.pagamento_status.label('status')
+    ).join(
+        User, User.id == Participant.user_id
+    ).join(
+        Room, Room.id == Participant.room_id
+    ).filter(
+        Participant.pagamento_status.in_(['pago', 'pendente']),
+        Participant.is_active == True
+    ).order_by(Participant.pagamento_data.desc()
+    ).limit(10).all()
+    # Como no ORDER BY ... DESC do SQLite, pagamentos sem data ficam por último
+    ultimos_pagamentos_query = partitions.ordered(
+        ultimos_pagamentos_query, key=lambda res: (res.data is not None, res.data or datetime.min), reverse=True, limit=10
+    )
+    
+    ultimos_pagamentos = []
+    for pagamento in ultimos_pagamentos_query:
+        if pagamento.data:  # Verificar se a data não é None
+            ultimos_pagamentos.append({
+                'data': pagamento.data.isoformat() if pagamento.data else None,
+                'jogador': pagamento.jogador,
+                'jogo': pagamento.jogo,
+                'valor': pagamento.valor,
+                'metodo': pagamento.metodo,
+                'status': pagamento.status
+            })
+    
+    return {
+        'total_arrecadado': total_arrecadado,
+        'total_pendente': total_pendente,
+        'valor_medio_jogo': valor_medio_jogo,
+        'arrecadacao_mensal': arrecadacao_mensal,
+        'status_pagamentos': status_pagamentos,
+        'ultimos_pagamentos': ultimos_pagamentos
+    }
+
+
+ROLLUPS = {
+    'resumo': resumo,
+    'esportes': esportes,
+    'jogadores': jogadores,
+    'financeiro': financeiro
+}
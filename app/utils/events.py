@@ -0,0 +1,276 @@
+"""
+Eventos em tempo real das salas (pub/sub)
+
+Depois de cada commit que altera participantes, publicamos um retrato da lista
+da sala (confirmados, lista de espera e contagem) junto com as mudanças de
+posição em relação ao retrato anterior. O endpoint SSE de cada sala apenas
+repassa essas mensagens aos navegadores conectados.
+
+Por padrão as mensagens circulam somente dentro do processo. Com vários workers,
+configure EVENTS_BACKEND='redis://host:6379/0' (requer o pacote redis).
+"""
+
+import json
+import logging
+import queue
+import threading
+from collections import defaultdict
+
+from app import db
+from app.utils import cache, partitions
+from app.utils.invalidation import on_change
+
+logger = logging.getLogger(__name__)
+
+# Quantidade máxima de mensagens pendentes por conexão antes de descartar as antigas
+SUBSCRIBER_QUEUE_SIZE = 50
+
+CHANNEL_PREFIX = 'sala:'
+
+
+class Subscription:
+    """Fila de mensagens de um canal para uma conexão"""
+
+    def __init__(self, backend, channel):
+        self.backend = backend
+        self.channel = channel
+        self.queue = queue.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+
+    def put(self, message):
+        try:
+            self.queue.put_nowait(message)
+        except queue.Full:
+            # Cliente lento: descarta a mensagem mais antiga (a nova traz a lista completa)
+            try:
+                self.queue.get_nowait()
+                self.queue.put_nowait(message)
+            except (queue.Empty, queue.Full):
+                pass
+
+    def get(self, timeout=None):
+        """Aguarda a próxima mensagem; retorna None se o tempo esgotar"""
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        self.backend.unsubscribe(self)
+
+
+class LocalBackend:
+    """Pub/sub dentro do processo"""
+
+    def __init__(self):
+        self._subscriptions = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def subscribe(self, channel):
+        subscription = Subscription(self, channel)
+        with self._lock:
+            self._subscriptions[channel].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._subscriptions.get(subscription.channel)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscriptions[subscription.channel]
+
+    def has_subscribers(self, channel):
+        with self._lock:
+            return bool(self._subscriptions.get(channel))
+
+    def publish(self, channel, message):
+        with self._lock:
+            subscribers = list(self._subscriptions.get(channel, ()))
+        for subscription in subscribers:
+            subscription.put(message)
+
+
+class RedisBackend:
+    """Pub/sub entre processos via Redis
+
+    Cada processo mantém uma thread ouvindo os canais das salas no Redis e
+    entrega as mensagens para as conexões locais.
+    """
+
+    def __init__(self, url):
+        import redis
+
+        self._redis = redis.Redis.from_url(url)
+        self._local = LocalBackend()
+        self._listener = threading.Thread(target=self._listen, daemon=True)
+        self._listener.start()
+
+    def _listen(self):
+        pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+        pubsub.psubscribe(CHANNEL_PREFIX + '*')
+        for item in pubsub.listen():
+            try:
+                channel = item['channel'].decode('utf-8')
+                self._local.publish(channel, json.loads(item['data']))
+            except Exception:
+                logger.exception('Mensagem inválida recebida do Redis')
+
+    def subscribe(self, channel):
+        return self._local.subscribe(channel)
+
+    def unsubscribe(self, subscription):
+        self._local.unsubscribe(subscription)
+
+    def has_subscribers(self, channel):
+        # Outros processos podem ter conexões abertas para a sala
+        return True
+
+    def publish(self, channel, message):
+        self._redis.publish(channel, json.dumps(message))
+
+
+backend = LocalBackend()
+
+# Último retrato publicado por este processo de cada sala, usado para calcular as mudanças
+_last_snapshots = cache.register('retratos_publicados', max_entries=1024, local=True)
+
+
+def init_app(app):
+    """Escolhe o backend de acordo com EVENTS_BACKEND"""
+    global backend
+    url = app.config.get('EVENTS_BACKEND')
+    if url and url.startswith('redis://') and not isinstance(backend, RedisBackend):
+        backend = RedisBackend(url)
+
+
+def channel_for(room_id):
+    return f'{CHANNEL_PREFIX}{room_id}'
+
+
+def subscribe(room_id):
+    return backend.subscribe(channel_for(room_id))
+
+
+def roster_snapshot(room_id, connection=None):
+    """Monta o retrato atual da lista de participantes de uma sala"""
+    from app.models.models import Room, User, Participant
+
+    connection = connection or db.session
+    max_participants = connection.execute(
+        db.select([Room.max_participants]).where(Room.id == room_id)
+    ).scalar()
+    if max_participants is None:
+        return None
+
+    rows = connection.execute(
+        db.select([
+            Participant.id, Participant.user_id, User.name,
+            Participant.checked_in, Participant.pagamento_status
+        ]).select_from(
+            Participant.__table__.join(User.__table__, User.id == Participant.user_id)
+        ).where(
+            Participant.room_id == room_id,
+            Participant.is_active == True
+        ).order_by(Participant.registered_at, Participant.id)
+    ).fetchall()
+
+    roster = [{
+        'participant_id': row[0],
+        'user_id': row[1],
+        'name': row[2],
+        'position': position,
+        'is_waiting': position > max_participants,
+        'checked_in': bool(row[3]),
+        'pago': row[4] == 'pago'
+    } for position, row in enumerate(rows, start=1)]
+
+    return {
+        'room_id': room_id,
+        'max_participants': max_participants,
+        'count': len(roster),
+        'confirmed': min(len(roster), max_participants),
+        'waiting': max(0, len(roster) - max_participants),
+        'roster': roster
+    }
+
+
+def current_snapshot(room_id):
+    """Retrato enviado ao abrir uma conexão, guardado como base para as próximas mudanças"""
+    snapshot = roster_snapshot(room_id)
+    if snapshot is not None:
+        snapshot['changes'] = []
+        if _last_snapshots.get(room_id) is None:
+            _last_snapshots.set(room_id, snapshot)
+    return snapshot
+
+
+def diff_snapshots(previous, current):
+    """Lista as entradas, saídas e mudanças de posição/status entre dois retratos"""
+    if previous is None:
+        return []
+
+    before = {entry['participant_id']: entry for entry in previous['roster']}
+    after = {entry['participant_id']: entry for entry in current['roster']}
+    changes = []
+
+    for participant_id, entry in after.items():
+        old = before.get(participant_id)
+        if old is None:
+            changes.append({'type': 'added', 'participant_id': participant_id,
+                            'user_id': entry['user_id'], 'position': entry['position'],
+                            'is_waiting': entry['is_waiting']})
+        elif (old['position'], old['checked_in'], old['pago']) != (entry['position'], entry['checked_in'], entry['pago']):
+            changes.append({'type': 'updated', 'participant_id': participant_id,
+                            'user_id': entry['user_id'],
+                            'old_position': old['position'], 'position': entry['position'],
+                            'promoted': old['is_waiting'] and not entry['is_waiting'],
+                            'is_waiting': entry['is_waiting']})
+
+    for participant_id, entry in before.items():
+        if participant_id not in after:
+            changes.append({'type': 'removed', 'participant_id': participant_id,
+                            'user_id': entry['user_id']})
+
+    return changes
+
+
+def publish_roster(room_id, connection=None):
+    """Publica o retrato atual da sala com as mudanças desde o último envio"""
+    channel = channel_for(room_id)
+    if not backend.has_subscribers(channel):
+        # Ninguém assistindo: o próximo retrato será calculado na conexão
+        _last_snapshots.delete(room_id)
+        return
+
+    snapshot = roster_snapshot(room_id, connection)
+    if snapshot is None:
+        backend.publish(channel, {'room_id': room_id, 'deleted': True})
+        return
+
+    snapshot['changes'] = diff_snapshots(_last_snapshots.get(room_id), snapshot)
+    _last_snapshots.set(room_id, snapshot)
+    backend.publish(channel, snapshot)
+
+
+@on_change
+def publish_changes(changes):
+    """Publica as listas das salas alteradas no commit"""
+    if not changes.room_ids:
+        return
+    # A sessão acabou de fazer commit: usamos uma conexão própria (a da partição de cada sala)
+    by_partition = defaultdict(list)
+    for room_id in changes.room_ids:
+        by_partition[partitions.for_id(room_id)].append(room_id)
+    for partition, room_ids in by_partition.items():
+        with partitions.engine(partition).connect() as connection:
+            for room_id in room_ids:
+                publish_roster(room_id, connection)
+
+
+def format_sse(data, event=None):
+    """Formata uma mensagem no protocolo Server-Sent Events"""
+    lines = []
+    if event:
+        lines.append(f'event: {event}')
+    lines.append(f'data: {json.dumps(data, ensure_ascii=False)}')
+    return '\n'.join(lines) + '\n\n'
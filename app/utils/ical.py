@@ -0,0 +1,228 @@
+"""
+Calendários iCalendar (.ics) por quadra, por usuário e por cidade
+
+Aplicativos de calendário consultam o feed a cada poucos minutos. Cada feed é
+montado a partir de pedaços mensais: os eventos de um mês saem de uma consulta
+por intervalo de datas e ficam em cache já formatados. Cada mês tem um número
+de geração incrementado apenas quando um commit altera uma sala (ou suas
+participações) daquele mês, então só os meses alterados são consultados de
+novo. O ETag do feed é derivado dos pedaços, e um cliente com o feed em dia
+recebe 304 sem nenhuma consulta ao banco.
+
+O feed do usuário não pode depender do cookie de sessão (o aplicativo de
+calendário não faz login): ele é acessado por um link com token assinado.
+"""
+
+import hashlib
+from datetime import datetime
+
+from flask import current_app, make_response, request, url_for
+from itsdangerous import BadSignature, URLSafeSerializer
+
+from app import db
+from app.models.models import Court, Participant, Room
+from app.utils import cache as caches
+from app.utils import partitions
+from app.utils.invalidation import on_change
+
+# Meses incluídos no feed: o anterior, o atual e os próximos
+MONTHS_BEFORE = 1
+DEFAULT_MONTHS_AHEAD = 6
+
+# Tempo de vida (segundos) dos pedaços: cobre alterações indiretas (ex.: nome da quadra)
+DEFAULT_TTL = 3600
+
+# Namespace incrementado quando não se sabe quais meses mudaram
+ALL_MONTHS = 'meses'
+
+FEEDS = ('quadra', 'cidade', 'usuario')
+
+cache = caches.register('calendarios', max_entries=8192)
+
+
+# ===============================
+# Formatação
+# ===============================
+
+def _escape(text):
+    return (str(text or '').replace('\\', '\\\\').replace(';', '\\;')
+            .replace(',', '\\,').replace('\r\n', '\\n').replace('\n', '\\n'))
+
+
+def _fold(line):
+    """Quebra linhas com mais de 75 bytes, como pede a RFC 5545"""
+    encoded = line.encode('utf-8')
+    if len(encoded) <= 75:
+        return line
+    parts, current = [], b''
+    for char in line:
+        size = len(char.encode('utf-8'))
+        if len(current) + size > (75 if not parts else 74):
+            parts.append(current.decode('utf-8'))
+            current = b''
+        current += char.encode('utf-8')
+    parts.append(current.decode('utf-8'))
+    return '\r\n '.join(parts)
+
+
+def _timestamp(value):
+    # Horários locais "flutuantes", como são gravados no banco
+    return value.strftime('%Y%m%dT%H%M%S')
+
+
+def _event(room, host, show_details=True):
+    lines = [
+        'BEGIN:VEVENT',
+        f'UID:sala-{room.id}@{host}',
+        f'DTSTAMP:{_timestamp(room.created_at or datetime.utcnow())}Z',
+        f'DTSTART:{_timestamp(room.date)}',
+        f'DTEND:{_timestamp(room.end_time or room.date)}',
+    ]
+    if show_details:
+        lines += [
+            f'SUMMARY:{_escape(room.name)}',
+            f'DESCRIPTION:{_escape(f"{room.sport} - até {room.max_participants} participantes")}',
+            f'URL:{url_for("room.view_room", link_code=room.link_code, _external=True)}',
+        ]
+    else:
+        # Salas privadas aparecem no feed da quadra apenas como horário ocupado
+        lines.append('SUMMARY:Reservado')
+    location = ', '.join(part for part in (room.location, room.city) if part)
+    if location:
+        lines.append(f'LOCATION:{_escape(location)}')
+    lines.append('END:VEVENT')
+    return '\r\n'.join(_fold(line) for line in lines) + '\r\n'
+
+
+# ===============================
+# Consultas por mês
+# ===============================
+
+def _month_bounds(year, month):
+    start = datetime(year, month, 1)
+    end = datetime(year + month // 12, month % 12 + 1, 1)
+    return start, end
+
+
+def _window():
+    today = datetime.now()
+    ahead = current_app.config.get('ICAL_MONTHS_AHEAD', DEFAULT_MONTHS_AHEAD)
+    index = today.year * 12 + today.month - 1
+    return [divmod(value, 12) for value in range(index - MONTHS_BEFORE, index + ahead + 1)]
+
+
+def _rooms(feed, feed_id, start, end):
+    query = db.session.query(Room).filter(
+        Room.is_active == True,
+        Room.date >= start,
+        Room.date < end
+    )
+    if feed == 'quadra':
+        query = query.filter(Room.court_id == feed_id)
+    elif feed == 'cidade':
+        query = query.filter(Room.city == feed_id, Room.is_private == False)
+    else:
+        query = query.join(Participant, Participant.room_id == Room.id).filter(
+            Participant.user_id == feed_id,
+            Participant.is_active == True
+        )
+    return partitions.ordered(query.order_by(Room.date).all(), key=lambda room: room.date)
+
+
+def _chunk(feed, feed_id, year, month):
+    """Eventos de um mês do feed, em cache até uma escrita alterar esse mês"""
+    key = (feed, feed_id, year, month,
+           cache.generation(f'{year}-{month:02d}'), cache.generation(ALL_MONTHS))
+    chunk = cache.get(key)
+    if chunk is None:
+        start, end = _month_bounds(year, month)
+        host = request.host
+        body = ''.join(
+            _event(room, host, show_details=feed != 'quadra' or not room.is_private)
+            for room in _rooms(feed, feed_id, start, end)
+        )
+        chunk = (body, hashlib.sha1(body.encode('utf-8')).hexdigest())
+        cache.set(key, chunk, ttl=current_app.config.get('ICAL_TTL', DEFAULT_TTL))
+    return chunk
+
+
+def _title(feed, feed_id):
+    """Nome do calendário; None se a quadra ou o usuário não existir"""
+    key = ('titulo', feed, feed_id)
+    title = cache.get(key)
+    if title is None:
+        if feed == 'quadra':
+            court = db.session.query(Court.name).filter(Court.id == feed_id).scalar()
+            title = court or ''
+        elif feed == 'cidade':
+            title = f'Jogos em {feed_id}'
+        else:
+            title = 'Meus jogos'
+        cache.set(key, title, ttl=current_app.config.get('ICAL_TTL', DEFAULT_TTL))
+    return title or None
+
+
+# ===============================
+# Feeds
+# ===============================
+
+def feed_response(feed, feed_id):
+    """Resposta .ics do feed com ETag; 304 quando o cliente já tem a versão atual"""
+    title = _title(feed, feed_id)
+    if title is None:
+        return None
+
+    chunks = [_chunk(feed, feed_id, year, month + 1) for year, month in _window()]
+    etag = hashlib.sha1(''.join([title] + [digest for _, digest in chunks]).encode('utf-8')).hexdigest()
+
+    if request.if_none_match.contains(etag):
+        response = make_response('', 304)
+    else:
+        body = ''.join([
+            'BEGIN:VCALENDAR\r\n',
+            'VERSION:2.0\r\n',
+            'PRODID:-//Esportes em Grupo//Salas//PT-BR\r\n',
+            'CALSCALE:GREGORIAN\r\n',
+            _fold(f'X-WR-CALNAME:{_escape(title)}') + '\r\n',
+            'REFRESH-INTERVAL;VALUE=DURATION:PT15M\r\n',
+        ] + [body for body, _ in chunks] + ['END:VCALENDAR\r\n'])
+        response = make_response(body)
+        response.mimetype = 'text/calendar'
+
+    response.set_etag(etag)
+    response.cache_control.max_age = 0
+    response.cache_control.must_revalidate = True
+    if feed == 'usuario':
+        response.cache_control.private = True
+    else:
+        response.cache_control.public = True
+    return response
+
+
+def _serializer():
+    return URLSafeSerializer(current_app.config['SECRET_KEY'], salt='calendario-usuario')
+
+
+def user_token(user_id):
+    """Token do link do calendário pessoal"""
+    return _serializer().dumps(user_id)
+
+
+def user_from_token(token):
+    """Id do usuário do token, ou None se a assinatura for inválida"""
+    try:
+        return int(_serializer().loads(token))
+    except (BadSignature, TypeError, ValueError):
+        return None
+
+
+@on_change
+def invalidate(changes):
+    """Descarta apenas os meses com salas ou participações alteradas"""
+    if not changes.cities and not changes.room_ids:
+        return
+    if not changes.months:
+        cache.bump(ALL_MONTHS)
+        return
+    for year, month in changes.months:
+        cache.bump(f'{year}-{month:02d}')
@@ -0,0 +1,50 @@
+"""
+Carregamento barato do usuário logado
+
+O Flask-Login chama o user_loader em toda requisição. Guardamos apenas as
+colunas de identidade (sem o histórico de participações) e reanexamos o objeto
+à sessão com merge(load=False), sem consulta ao banco. Colunas que não estão em
+cache (ex.: password_hash) são carregadas sob demanda se forem acessadas.
+"""
+
+from sqlalchemy.orm import make_transient_to_detached
+
+from app import db
+from app.utils import cache
+from app.utils.invalidation import on_change
+
+# Tempo de vida (segundos) da identidade em cache; alterações via ORM invalidam antes
+IDENTITY_TTL = 300
+
+IDENTITY_COLUMNS = ('id', 'username', 'email', 'name', 'created_at', 'is_active')
+
+_identities = cache.register('identidades', max_entries=4096, ttl=IDENTITY_TTL)
+
+
+def load_user(user_id):
+    """Retorna o usuário anexado à sessão atual, consultando o banco só na primeira vez"""
+    from app.models.models import User
+
+    data = _identities.get(user_id)
+    if data is None:
+        row = db.session.query(
+            *[getattr(User, column) for column in IDENTITY_COLUMNS]
+        ).filter(User.id == user_id).first()
+        if row is None:
+            return None
+        data = dict(zip(IDENTITY_COLUMNS, row))
+        _identities.set(user_id, data)
+
+    # Monta a instância sem passar pelo __init__ (que gera o hash da senha)
+    user = User.__mapper__.class_manager.new_instance()
+    for column, value in data.items():
+        setattr(user, column, value)
+    make_transient_to_detached(user)
+    return db.session.merge(user, load=False)
+
+
+@on_change
+def invalidate(changes):
+    """Descarta as identidades dos usuários alterados no commit"""
+    for user_id in changes.user_ids:
+        _identities.delete(user_id)
@@ -0,0 +1,114 @@
+"""
+Rastreamento de escritas em salas, participantes e usuários
+
+Os listeners da sessão acumulam as cidades, salas e usuários afetados durante o flush e,
+somente depois do commit, repassam as alterações para os caches registrados.
+Caminhos que escrevem sem passar pelo ORM devem chamar notify() diretamente.
+"""
+
+import logging
+from itertools import chain
+
+from sqlalchemy import event, inspect
+
+from app import db
+
+logger = logging.getLogger(__name__)
+
+_handlers = []
+
+
+def month_of(date):
+    """Mês (ano, mês) de uma data, usado para invalidar dados agrupados por mês"""
+    return (date.year, date.month)
+
+
+class Changes:
+    """Conjunto de cidades, salas, usuários e meses de jogos alterados em uma transação
+
+    `months` fica vazio quando quem notificou não sabe as datas (escritas em
+    lote); nesse caso, considere todos os meses alterados.
+    """
+
+    def __init__(self, cities=(), room_ids=(), user_ids=(), months=()):
+        self.cities = set(cities)
+        self.room_ids = set(room_ids)
+        self.user_ids = set(user_ids)
+        self.months = set(months)
+
+    def __bool__(self):
+        return bool(self.cities or self.room_ids or self.user_ids)
+
+    def add_room(self, room):
+        if room.id is not None:
+            self.room_ids.add(room.id)
+        if room.city:
+            self.cities.add(room.city)
+        if room.date:
+            self.months.add(month_of(room.date))
+
+        # Se a cidade ou a data foram alteradas, as antigas também precisam ser invalidadas
+        state = inspect(room)
+        self.cities.update(city for city in state.attrs.city.history.deleted if city)
+        self.months.update(month_of(date) for date in state.attrs.date.history.deleted if date)
+
+
+def on_change(handler):
+    """Registra uma função chamada com um objeto Changes após cada commit"""
+    _handlers.append(handler)
+    return handler
+
+
+def track(room):
+    """Marca uma sala como alterada na transação atual (para escritas via Core)"""
+    db.session.info.setdefault('changes', Changes()).add_room(room)
+
+
+def notify(cities=(), room_ids=(), user_ids=(), months=()):
+    """Dispara os handlers manualmente (para escritas em lote fora do ORM)"""
+    _dispatch_changes(Changes(cities, room_ids, user_ids, months))
+
+
+def _dispatch_changes(changes):
+    if not changes:
+        return
+    for handler in _handlers:
+        try:
+            handler(changes)
+        except Exception:
+            logger.exception('Erro ao processar invalidação de cache')
+
+
+def _collect(session, flush_context):
+    from app.models.models import Room, Participant, User
+
+    changes = session.info.setdefault('changes', Changes())
+    for obj in chain(session.new, session.dirty, session.deleted):
+        if isinstance(obj, Room):
+            changes.add_room(obj)
+        elif isinstance(obj, Participant):
+            changes.room_ids.add(obj.room_id)
+            room = obj.room
+            if room is not None:
+                changes.cities.add(room.city)
+                if room.date:
+                    changes.months.add(month_of(room.date))
+        elif isinstance(obj, User) and obj.id is not None:
+            changes.user_ids.add(obj.id)
+
+
+def _dispatch(session):
+    _dispatch_changes(session.info.pop('changes', None))
+
+
+def _discard(session):
+    session.info.pop('changes', None)
+
+
+def init_app(app):
+    """Registra os listeners na sessão do Flask-SQLAlchemy (apenas uma vez)"""
+    if event.contains(db.session, 'after_flush', _collect):
+        return
+    event.listen(db.session, 'after_flush', _collect)
+    event.listen(db.session, 'after_commit', _dispatch)
+    event.listen(db.session, 'after_rollback', _discard)
@@ -0,0 +1,381 @@
+"""
+Tarefas em segundo plano
+
+Trabalho lento (atualização de cidades, estatísticas, notificações) é colocado
+em uma fila persistente em um arquivo SQLite próprio, separado do banco da
+aplicação para não disputar o lock de escrita com as requisições. Um pool de
+threads consome a fila, com novas tentativas e espera exponencial em caso de
+erro. O pool pode rodar dentro do servidor (JOBS_INLINE_WORKER) ou em um
+processo separado com `flask jobs worker`.
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import traceback
+
+logger = logging.getLogger(__name__)
+
+# Espera (segundos) antes da primeira nova tentativa; dobra a cada falha
+RETRY_DELAY = 5
+
+# Quantidade de execuções recentes usadas no cálculo das durações
+STATS_WINDOW = 200
+
+# Dias que execuções terminadas ficam guardadas (a última bem-sucedida de cada tarefa nunca sai)
+DEFAULT_RETENTION_DAYS = 7
+
+# Intervalo mínimo (segundos) entre duas limpezas de execuções antigas
+PRUNE_INTERVAL = 3600
+
+_tasks = {}
+
+
+def task(name, max_attempts=3):
+    """Registra uma função como tarefa executável pela fila"""
+    def decorator(func):
+        _tasks[name] = (func, max_attempts)
+        return func
+    return decorator
+
+
+class JobQueue:
+    """Fila persistente de tarefas em SQLite"""
+
+    SCHEMA = '''
+        CREATE TABLE IF NOT EXISTS jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            payload TEXT,
+            status TEXT NOT NULL DEFAULT 'queued',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            max_attempts INTEGER NOT NULL DEFAULT 3,
+            run_at REAL NOT NULL,
+            created_at REAL NOT NULL,
+            started_at REAL,
+            finished_at REAL,
+            error TEXT,
+            result TEXT
+        );
+        CREATE INDEX IF NOT EXISTS ix_jobs_status_run_at ON jobs (status, run_at);
+        CREATE INDEX IF NOT EXISTS ix_jobs_name_finished ON jobs (name, finished_at);
+    '''
+
+    def __init__(self, path, retention_days=DEFAULT_RETENTION_DAYS):
+        self.path = path
+        self.retention_days = retention_days
+        self._local = threading.local()
+        self._schema_ready = False
+        self._schema_lock = threading.Lock()
+        self._pruned_at = 0.0
+
+    def _connect(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            connection.row_factory = sqlite3.Row
+            connection.execute('PRAGMA journal_mode=WAL')
+            self._local.connection = connection
+
+        if not self._schema_ready:
+            with self._schema_lock:
+                if not self._schema_ready:
+                    connection.executescript(self.SCHEMA)
+                    self._schema_ready = True
+        return connection
+
+    def enqueue(self, name, payload=None, unique=False, delay=0):
+        """Coloca uma tarefa na fila e retorna seu id
+
+        Com unique=True, não cria outra se já houver uma igual aguardando.
+        """
+        if name not in _tasks:
+            raise ValueError(f'Tarefa desconhecida: {name}')
+
+        max_attempts = _tasks[name][1]
+        payload_json = json.dumps(payload) if payload is not None else None
+        now = time.time()
+        connection = self._connect()
+
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            if unique:
+                existing = connection.execute(
+                    "SELECT id FROM jobs WHERE name = ? AND payload IS ? AND status = 'queued'",
+                    (name, payload_json)
+                ).fetchone()
+                if existing:
+                    connection.execute('COMMIT')
+                    return existing['id']
+
+            cursor = connection.execute(
+                'INSERT INTO jobs (name, payload, max_attempts, run_at, created_at) VALUES (?, ?, ?, ?, ?)',
+                (name, payload_json, max_attempts, now + delay, now)
+            )
+            connection.execute('COMMIT')
+            return cursor.lastrowid
+        except Exception:
+            connection.execute('ROLLBACK')
+            raise
+
+    def claim(self):
+        """Reserva a próxima tarefa pronta para execução (ou None)"""
+        connection = self._connect()
+        now = time.time()
+
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            job = connection.execute(
+                "SELECT * FROM jobs WHERE status = 'queued' AND run_at <= ? ORDER BY run_at, id LIMIT 1",
+                (now,)
+            ).fetchone()
+            if job is not None:
+                connection.execute(
+                    "UPDATE jobs SET status = 'running', attempts = attempts + 1, started_at = ? WHERE id = ?",
+                    (now, job['id'])
+                )
+            connection.execute('COMMIT')
+            return job
+        except Exception:
+            connection.execute('ROLLBACK')
+            raise
+
+    def complete(self, job_id, result=None):
+        self._connect().execute(
+            "UPDATE jobs SET status = 'done', finished_at = ?, result = ?, error = NULL WHERE id = ?",
+            (time.time(), json.dumps(result) if result is not None else None, job_id)
+        )
+        self._maybe_prune()
+
+    def fail(self, job_id, error):
+        """Registra a falha e agenda nova tentativa, se ainda houver"""
+        connection = self._connect()
+        job = connection.execute('SELECT attempts, max_attempts FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        now = time.time()
+
+        if job['attempts'] < job['max_attempts']:
+            connection.execute(
+                "UPDATE jobs SET status = 'queued', run_at = ?, error = ? WHERE id = ?",
+                (now + RETRY_DELAY * 2 ** (job['attempts'] - 1), error, job_id)
+            )
+        else:
+            connection.execute(
+                "UPDATE jobs SET status = 'failed', finished_at = ?, error = ? WHERE id = ?",
+                (now, error, job_id)
+            )
+            self._maybe_prune()
+
+    def record(self, name, result, started_at):
+        """Registra uma execução feita diretamente na requisição (sem passar pela fila)"""
+        now = time.time()
+        self._connect().execute(
+            "INSERT INTO jobs (name, status, attempts, run_at, created_at, started_at, finished_at, result) "
+            "VALUES (?, 'done', 1, ?, ?, ?, ?, ?)",
+            (name, started_at, started_at, started_at, now, json.dumps(result))
+        )
+        self._maybe_prune()
+
+    def requeue_stale(self, timeout):
+        """Devolve para a fila tarefas 'running' abandonadas (worker encerrado no meio)
+
+        A tentativa abandonada conta: quem já esgotou max_attempts vai para
+        'failed' em vez de voltar para a fila (uma tarefa que derruba o worker
+        não é repetida para sempre).
+        """
+        connection = self._connect()
+        now = time.time()
+
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            connection.execute(
+                "UPDATE jobs SET status = 'failed', finished_at = ?, error = ? "
+                "WHERE status = 'running' AND started_at < ? AND attempts >= max_attempts",
+                (now, 'Abandonada por um worker encerrado, sem tentativas restantes', now - timeout)
+            )
+            connection.execute(
+                "UPDATE jobs SET status = 'queued' WHERE status = 'running' AND started_at < ?",
+                (now - timeout,)
+            )
+            connection.execute('COMMIT')
+        except Exception:
+            connection.execute('ROLLBACK')
+            raise
+
+    def prune(self, older_than_days=None):
+        """Apaga execuções terminadas há mais de N dias, mantendo a última bem-sucedida de cada tarefa
+
+        Sem a limpeza, cada execução (com o resultado em JSON) ficaria no
+        arquivo para sempre, e stats() e latest_result() varreriam tudo.
+        Retorna o número de execuções apagadas.
+        """
+        days = self.retention_days if older_than_days is None else older_than_days
+        cursor = self._connect().execute(
+            "DELETE FROM jobs WHERE status IN ('done', 'failed') AND finished_at < ? "
+            "AND NOT (status = 'done' AND finished_at = ("
+            "    SELECT MAX(latest.finished_at) FROM jobs AS latest "
+            "    WHERE latest.name = jobs.name AND latest.status = 'done'"
+            "))",
+            (time.time() - days * 86400,)
+        )
+        return cursor.rowcount
+
+    def _maybe_prune(self):
+        if not self.retention_days or time.time() - self._pruned_at < PRUNE_INTERVAL:
+            return
+        self._pruned_at = time.time()
+        try:
+            self.prune()
+        except sqlite3.OperationalError:
+            # Fica para a próxima: a limpeza nunca atrapalha o registro da execução
+            logger.exception('Erro ao limpar execuções antigas da fila')
+
+    def latest_result(self, name):
+        """Retorna (resultado, terminado_em) da última execução bem-sucedida da tarefa"""
+        row = self._connect().execute(
+            "SELECT result, finished_at FROM jobs WHERE name = ? AND status = 'done' "
+            "ORDER BY finished_at DESC LIMIT 1",
+            (name,)
+        ).fetchone()
+        if row is None or row['result'] is None:
+            return None, None
+        return json.loads(row['result']), row['finished_at']
+
+    def stats(self):
+        """Profundidade da fila e durações das execuções recentes por tarefa"""
+        connection = self._connect()
+        depth = {row['status']: row['total'] for row in connection.execute(
+            'SELECT status, COUNT(*) AS total FROM jobs GROUP BY status'
+        )}
+        ready = connection.execute(
+            "SELECT COUNT(*) FROM jobs WHERE status = 'queued' AND run_at <= ?", (time.time(),)
+        ).fetchone()[0]
+
+        durations = {}
+        for row in connection.execute(
+            "SELECT name, finished_at - started_at AS duration FROM jobs "
+            "WHERE status = 'done' AND started_at IS NOT NULL ORDER BY finished_at DESC LIMIT ?",
+            (STATS_WINDOW,)
+        ):
+            durations.setdefault(row['name'], []).append(row['duration'])
+
+        tasks = []
+        for name, values in sorted(durations.items()):
+            values.sort()
+            tasks.append({
+                'name': name,
+                'executions': len(values),
+                'avg_seconds': round(sum(values) / len(values), 3),
+                'p95_seconds': round(values[min(len(values) - 1, int(len(values) * 0.95))], 3),
+                'max_seconds': round(values[-1], 3)
+            })
+
+        recent = [{
+            'id': row['id'],
+            'name': row['name'],
+            'status': row['status'],
+            'attempts': row['attempts'],
+            'created_at': row['created_at'],
+            'duration_seconds': round(row['finished_at'] - row['started_at'], 3)
+            if row['finished_at'] and row['started_at'] else None,
+            'error': (row['error'] or '').splitlines()[-1] if row['error'] else None
+        } for row in connection.execute('SELECT * FROM jobs ORDER BY id DESC LIMIT 20')]
+
+        return {'depth': depth, 'ready': ready, 'tasks': tasks, 'recent': recent}
+
+
+class Worker:
+    """Pool de threads que consome a fila dentro do contexto da aplicação"""
+
+    def __init__(self, app, job_queue, concurrency=2, poll_interval=1.0):
+        self.app = app
+        self.queue = job_queue
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self._stop = threading.Event()
+        self._threads = []
+
+    def start(self):
+        for index in range(self.concurrency):
+            thread = threading.Thread(target=self._loop, name=f'jobs-worker-{index}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, wait=True):
+        self._stop.set()
+        if wait:
+            for thread in self._threads:
+                thread.join()
+
+    def run_forever(self):
+        """Executa até Ctrl+C (usado pelo comando `flask jobs worker`)"""
+        self.start()
+        try:
+            while not self._stop.is_set():
+                time.sleep(0.5)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop()
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                job = self.queue.claim()
+            except sqlite3.OperationalError:
+                logger.exception('Erro ao ler a fila de tarefas')
+                job = None
+
+            if job is None:
+                self._stop.wait(self.poll_interval)
+                continue
+
+            self.run_job(job)
+
+    def run_job(self, job):
+        func = _tasks.get(job['name'], (None,))[0]
+        if func is None:
+            self.queue.fail(job['id'], f'Tarefa desconhecida: {job["name"]}')
+            return
+
+        payload = json.loads(job['payload']) if job['payload'] else {}
+        try:
+            with self.app.app_context():
+                result = func(**payload)
+            self.queue.complete(job['id'], result)
+        except Exception:
+            logger.exception('Erro ao executar a tarefa %s (id %s)', job['name'], job['id'])
+            self.queue.fail(job['id'], traceback.format_exc())
+
+
+_queue = None
+
+
+def get_queue():
+    return _queue
+
+
+def enqueue(name, payload=None, unique=False, delay=0):
+    return _queue.enqueue(name, payload, unique=unique, delay=delay)
+
+
+def init_app(app):
+    """Configura a fila e, se habilitado, inicia o pool de threads no próprio processo"""
+    global _queue
+    path = app.config.get('JOBS_DB_PATH') or os.path.join(app.root_path, 'jobs.db')
+    _queue = JobQueue(path, app.config.get('JOBS_RETENTION_DAYS', DEFAULT_RETENTION_DAYS))
+    app.extensions['jobs'] = _queue
+
+    # Registra as tarefas da aplicação
+    from app.utils import tasks  # noqa: F401
+
+    if app.config.get('JOBS_INLINE_WORKER'):
+        # Só inicia ao atender a primeira requisição, para não consumir a fila em comandos CLI
+        @app.before_first_request
+        def start_inline_worker():
+            _queue.requeue_stale(app.config.get('JOBS_STALE_TIMEOUT', 600))
+            worker = Worker(app, _queue, concurrency=app.config.get('JOBS_CONCURRENCY', 2))
+            worker.start()
+            app.extensions['jobs_worker'] = worker
@@ -0,0 +1,311 @@
+"""
+Simulação de carga de inscrições e saídas concorrentes
+
+Monta um banco SQLite temporário com usuários e salas, dispara uma mistura de
+inscrições (join_room), saídas (leave_room), remoções pelo organizador
+(remove_participant) e atualizações de pagamento em lote (batch_update) a
+partir de várias threads e, opcionalmente, de vários processos, todos pelas
+rotas da aplicação. Mede vazão, latência por operação e a taxa de erros de
+banco bloqueado ("database is locked") e, no fim, verifica as invariantes das
+listas:
+  - nenhum usuário com mais de uma participação ativa na mesma sala;
+  - confirmados = os max_participants primeiros ativos por (registered_at, id),
+    calculados à parte e comparados com os de Room.get_confirmed_participants(),
+    com o is_in_waiting_list() que as rotas exibem e com o total do resumo de
+    valores;
+  - ordem de chegada: registered_at nunca diminui na ordem de inserção (id),
+    então a lista de espera é promovida na ordem em que as pessoas entraram.
+
+Uso: flask perf loadsim (veja --help)
+"""
+
+import contextlib
+import io
+import logging
+import multiprocessing
+import os
+import random
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from sqlalchemy.exc import OperationalError
+
+from app import create_app, db
+
+# Peso padrão de cada operação na mistura
+DEFAULT_MIX = {'join': 60, 'leave': 20, 'remove': 10, 'batch': 10}
+
+OPERATIONS = tuple(DEFAULT_MIX)
+
+
+def _app(database_uri, jobs_path, busy_timeout):
+    # O log de cada comando SQL dominaria o tempo medido
+    logging.getLogger('sqlalchemy').setLevel(logging.WARNING)
+    logging.getLogger('sqlalchemy.engine').setLevel(logging.WARNING)
+    return create_app({
+        'SQLALCHEMY_DATABASE_URI': database_uri,
+        'SQLALCHEMY_ENGINE_OPTIONS': {'connect_args': {'timeout': busy_timeout}},
+        'JOBS_DB_PATH': jobs_path,
+        'JOBS_INLINE_WORKER': False,
+        'ARCHIVE_INTERVAL': 0,
+        'WTF_CSRF_ENABLED': False,
+        # Exceções chegam ao simulador em vez de virarem páginas 500
+        'PROPAGATE_EXCEPTIONS': True,
+    })
+
+
+def seed(app, users, rooms, capacity):
+    """Cria os jogadores, um organizador por sala e as salas; retorna [(room_id, link_code, creator_id)]"""
+    from app.models.models import Room, User
+
+    with app.app_context():
+        # Usuários criados direto na tabela para não pagar o hash de senha
+        db.session.execute(User.__table__.insert(), [
+            {'username': f'jogador{i}', 'email': f'jogador{i}@example.com', 'name': f'Jogador {i}',
+             'password_hash': '!', 'created_at': datetime.utcnow(), 'is_active': True}
+            for i in range(1, users + rooms + 1)
+        ])
+        created = []
+        for index in range(rooms):
+            room = Room(f'Sala {index + 1}', 'Futebol', datetime.utcnow() + timedelta(days=1, hours=index),
+                        capacity, creator_id=users + index + 1, city='São Paulo - SP')
+            db.session.add(room)
+            created.append(room)
+        db.session.commit()
+        return [(room.id, room.link_code, room.creator_id) for room in created]
+
+
+class _Runner:
+    """Executa operações aleatórias com um cliente de teste por thread"""
+
+    def __init__(self, app, rooms, users, mix, seed_value):
+        self.app = app
+        self.rooms = rooms
+        self.users = users
+        self.operations = list(mix)
+        self.weights = [mix[name] for name in self.operations]
+        self.random = random.Random(seed_value)
+        self.samples = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.locks = defaultdict(int)
+
+    def _client(self, user_id):
+        client = self.app.test_client()
+        with client.session_transaction() as session:
+            session['_user_id'] = str(user_id)
+            session['_fresh'] = True
+        return client
+
+    def _active_participants(self, room_id, creator_id):
+        from app.models.models import Participant
+
+        with self.app.app_context():
+            return [row[0] for row in db.session.query(Participant.id).filter(
+                Participant.room_id == room_id,
+                Participant.is_active == True,
+                Participant.user_id != creator_id
+            )]
+
+    def _request(self, operation):
+        room_id, link_code, creator_id = self.random.choice(self.rooms)
+        if operation in ('join', 'leave'):
+            client = self._client(self.random.randint(1, self.users))
+            path = f'/sala/{link_code}/participar' if operation == 'join' else f'/sala/{link_code}/sair'
+            return lambda: client.get(path)
+
+        # Participantes escolhidos fora da medição de tempo
+        candidates = self._active_participants(room_id, creator_id)
+        if not candidates:
+            return None
+        client = self._client(creator_id)
+        if operation == 'remove':
+            path = f'/sala/{link_code}/remover/{self.random.choice(candidates)}'
+            return lambda: client.get(path)
+        chosen = self.random.sample(candidates, min(len(candidates), self.random.randint(1, 5)))
+        return lambda: client.post(
+            f'/admin/api/rooms/{room_id}/participants/batch_update',
+            json={'participant_ids': chosen, 'pagamento_status': self.random.choice(['pago', 'pendente'])}
+        )
+
+    def run_one(self):
+        operation = self.random.choices(self.operations, self.weights)[0]
+        send = self._request(operation)
+        if send is None:
+            return
+        started = time.perf_counter()
+        try:
+            response = send()
+            if response.status_code >= 400:
+                self.errors[operation] += 1
+        except OperationalError as error:
+            if 'locked' in str(error):
+                self.locks[operation] += 1
+            else:
+                self.errors[operation] += 1
+        except Exception:
+            self.errors[operation] += 1
+        self.samples[operation].append(time.perf_counter() - started)
+
+    def result(self):
+        return {'samples': dict(self.samples), 'errors': dict(self.errors), 'locks': dict(self.locks)}
+
+
+def _merge(results):
+    merged = {'samples': defaultdict(list), 'errors': defaultdict(int), 'locks': defaultdict(int)}
+    for result in results:
+        for operation, values in result['samples'].items():
+            merged['samples'][operation].extend(values)
+        for field in ('errors', 'locks'):
+            for operation, count in result[field].items():
+                merged[field][operation] += count
+    return merged
+
+
+def _run_threads(app, rooms, users, mix, operations, threads, seed_value):
+    remaining = iter(range(operations))
+    lock = threading.Lock()
+    runners = [_Runner(app, rooms, users, mix, f'{seed_value}-{index}') for index in range(threads)]
+
+    def work(runner):
+        while True:
+            with lock:
+                if next(remaining, None) is None:
+                    return
+            runner.run_one()
+
+    workers = [threading.Thread(target=work, args=(runner,)) for runner in runners]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return _merge(runner.result() for runner in runners)
+
+
+def _process_main(database_uri, jobs_path, busy_timeout, rooms, users, mix, operations, threads, seed_value, queue):
+    """Ponto de entrada de cada processo: uma aplicação própria sobre o mesmo banco"""
+    app = _app(database_uri, jobs_path, busy_timeout)
+    queue.put(_run_threads(app, rooms, users, mix, operations, threads, seed_value))
+
+
+def check_invariants(app):
+    """Verifica as listas de todas as salas; retorna a lista de violações encontradas"""
+    from app.models.models import Participant, Room
+    from app.utils import pricing
+
+    problems = []
+    with app.app_context():
+        duplicated = db.session.query(
+            Participant.room_id, Participant.user_id, db.func.count(Participant.id)
+        ).filter(Participant.is_active == True).group_by(
+            Participant.room_id, Participant.user_id
+        ).having(db.func.count(Participant.id) > 1).all()
+        for room_id, user_id, count in duplicated:
+            problems.append(f'sala {room_id}: usuário {user_id} com {count} participações ativas')
+
+        rooms = Room.query.all()
+        breakdowns = pricing.for_rooms([room.id for room in rooms])
+        for room in rooms:
+            # Lista esperada calculada direto no banco, sem passar pelo modelo nem pelo resumo de valores
+            active = [participant_id for participant_id, in db.session.query(Participant.id).filter(
+                Participant.room_id == room.id, Participant.is_active == True
+            ).order_by(Participant.registered_at, Participant.id)]
+            expected = active[:room.max_participants]
+
+            # Os métodos do modelo imprimem mensagens de depuração; o relatório (--json) vai para a saída padrão
+            with contextlib.redirect_stdout(io.StringIO()):
+                confirmed = [participant.id for participant in room.get_confirmed_participants()]
+                waiting = {participant.id for participant in room.participants
+                           if participant.is_active and participant.is_in_waiting_list()}
+            if confirmed != expected:
+                problems.append(f'sala {room.id}: confirmados {confirmed}, esperados {expected}')
+            if waiting != set(active[room.max_participants:]):
+                problems.append(f'sala {room.id}: lista de espera exibida {sorted(waiting)}, '
+                                f'esperada {active[room.max_participants:]}')
+            if breakdowns[room.id].confirmed != len(expected):
+                problems.append(f'sala {room.id}: resumo de valores com {breakdowns[room.id].confirmed} '
+                                f'confirmados, esperados {len(expected)}')
+
+            previous = None
+            for participant_id, registered_at in db.session.query(
+                Participant.id, Participant.registered_at
+            ).filter(Participant.room_id == room.id).order_by(Participant.id):
+                if previous is not None and registered_at < previous:
+                    problems.append(f'sala {room.id}: participação {participant_id} registrada antes da anterior')
+                previous = registered_at
+    return problems
+
+
+def _percentile(values, fraction):
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def report(merged, elapsed):
+    """Resumo por operação: quantidade, latências (ms), erros e bloqueios"""
+    rows = []
+    for operation in OPERATIONS:
+        values = sorted(merged['samples'].get(operation, []))
+        if not values:
+            continue
+        locks = merged['locks'].get(operation, 0)
+        rows.append({
+            'operation': operation,
+            'count': len(values),
+            'p50_ms': round(_percentile(values, 0.50) * 1000, 1),
+            'p95_ms': round(_percentile(values, 0.95) * 1000, 1),
+            'p99_ms': round(_percentile(values, 0.99) * 1000, 1),
+            'max_ms': round(values[-1] * 1000, 1),
+            'errors': merged['errors'].get(operation, 0),
+            'locks': locks,
+            'lock_rate': round(locks / len(values), 4),
+        })
+    total = sum(row['count'] for row in rows)
+    locks = sum(row['locks'] for row in rows)
+    return {
+        'operations': total,
+        'elapsed': round(elapsed, 3),
+        'throughput': round(total / elapsed, 1) if elapsed else None,
+        'locks': locks,
+        'lock_rate': round(locks / total, 4) if total else 0,
+        'errors': sum(row['errors'] for row in rows),
+        'by_operation': rows,
+    }
+
+
+def run(users=200, rooms=5, capacity=20, operations=2000, threads=16, processes=1,
+        mix=None, busy_timeout=5.0, seed_value=None, directory=None):
+    """Semeia um banco temporário, executa a carga e retorna (relatório, violações)"""
+    mix = mix or DEFAULT_MIX
+    seed_value = seed_value if seed_value is not None else int(time.time())
+    directory = directory or tempfile.mkdtemp(prefix='loadsim-')
+    database_uri = f"sqlite:///{os.path.join(directory, 'loadsim.db')}"
+    jobs_path = os.path.join(directory, 'jobs.db')
+
+    app = _app(database_uri, jobs_path, busy_timeout)
+    seeded = seed(app, users, rooms, capacity)
+
+    started = time.perf_counter()
+    if processes <= 1:
+        merged = _run_threads(app, seeded, users, mix, operations, threads, seed_value)
+    else:
+        context = multiprocessing.get_context('spawn')
+        queue = context.Queue()
+        share, extra = divmod(operations, processes)
+        children = [
+            context.Process(target=_process_main, args=(
+                database_uri, jobs_path, busy_timeout, seeded, users, mix,
+                share + (1 if index < extra else 0), threads, f'{seed_value}-{index}', queue
+            ))
+            for index in range(processes)
+        ]
+        for child in children:
+            child.start()
+        results = [queue.get() for _ in children]
+        for child in children:
+            child.join()
+        merged = _merge(results)
+    elapsed = time.perf_counter() - started
+
+    return report(merged, elapsed), check_invariants(app)
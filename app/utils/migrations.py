@@ -0,0 +1,227 @@
+"""
+Migrações versionadas do banco de dados
+
+Cada arquivo em migrations/ chamado NNNN_descricao.py é um passo, aplicado em
+ordem pelo número. O passo define upgrade() e, se possível, downgrade(). Os
+passos aplicados ficam registrados na tabela schema_migrations, então
+`flask schema upgrade` aplica apenas os que faltam.
+
+Para migrar um banco grande em uso, sem parada:
+  - alterações de esquema devem ser baratas (ADD COLUMN, CREATE INDEX), nunca
+    reescrever a tabela inteira em uma transação;
+  - atualizações de dados usam backfill(), que percorre a tabela em faixas de
+    id com uma transação curta por faixa e grava um checkpoint a cada uma. Se
+    o processo for interrompido, a próxima execução continua do checkpoint.
+    Linhas gravadas durante o backfill devem já sair corretas do código da
+    aplicação (o backfill cobre os ids existentes quando ele começou).
+"""
+
+import importlib.util
+import logging
+import os
+import re
+import time
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy import inspect
+
+from app import db
+
+logger = logging.getLogger(__name__)
+
+# Linhas por transação nos backfills
+DEFAULT_BATCH_SIZE = 1000
+
+_FILENAME = re.compile(r'^(\d{4})_(\w+)\.py$')
+
+_SCHEMA = [
+    '''CREATE TABLE IF NOT EXISTS schema_migrations (
+        version VARCHAR(4) PRIMARY KEY,
+        name VARCHAR(200) NOT NULL,
+        applied_at DATETIME NOT NULL,
+        duration FLOAT NOT NULL
+    )''',
+    '''CREATE TABLE IF NOT EXISTS schema_backfills (
+        name VARCHAR(200) PRIMARY KEY,
+        last_id INTEGER NOT NULL,
+        done BOOLEAN NOT NULL DEFAULT 0,
+        updated_at DATETIME NOT NULL
+    )''',
+]
+
+
+class Migration:
+    """Um passo de migração carregado de migrations/NNNN_descricao.py"""
+
+    def __init__(self, version, name, path):
+        self.version = version
+        self.name = name
+        self.path = path
+        self._module = None
+
+    @property
+    def module(self):
+        if self._module is None:
+            spec = importlib.util.spec_from_file_location(f'migrations_{self.version}_{self.name}', self.path)
+            self._module = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(self._module)
+        return self._module
+
+    @property
+    def description(self):
+        doc = (self.module.__doc__ or '').strip()
+        return doc.splitlines()[0] if doc else self.name.replace('_', ' ')
+
+    def __repr__(self):
+        return f'<Migration {self.version}_{self.name}>'
+
+
+def migrations_dir():
+    return current_app.config.get('MIGRATIONS_DIR') or os.path.join(os.path.dirname(current_app.root_path), 'migrations')
+
+
+def discover():
+    """Lista os passos de migração em ordem de versão"""
+    path = migrations_dir()
+    found = []
+    for filename in sorted(os.listdir(path)):
+        match = _FILENAME.match(filename)
+        if match:
+            found.append(Migration(match.group(1), match.group(2), os.path.join(path, filename)))
+    versions = [migration.version for migration in found]
+    duplicated = {version for version in versions if versions.count(version) > 1}
+    if duplicated:
+        raise RuntimeError(f'Versões de migração repetidas: {", ".join(sorted(duplicated))}')
+    return found
+
+
+def _ensure_tables():
+    with db.engine.begin() as connection:
+        for statement in _SCHEMA:
+            connection.execute(db.text(statement))
+
+
+def applied():
+    """Retorna {versão: data de aplicação} dos passos já aplicados"""
+    _ensure_tables()
+    return dict(db.session.execute(db.text('SELECT version, applied_at FROM schema_migrations')).fetchall())
+
+
+def status():
+    """Lista (migração, data de aplicação ou None) para todos os passos"""
+    done = applied()
+    return [(migration, done.get(migration.version)) for migration in discover()]
+
+
+def upgrade(target=None):
+    """Aplica, em ordem, os passos pendentes até a versão target (inclusive); retorna os aplicados"""
+    done = applied()
+    result = []
+    for migration in discover():
+        if target is not None and migration.version > target:
+            break
+        if migration.version in done:
+            continue
+
+        logger.info('Aplicando migração %s_%s', migration.version, migration.name)
+        started = time.perf_counter()
+        migration.module.upgrade()
+        db.session.commit()
+        db.session.execute(db.text(
+            'INSERT INTO schema_migrations (version, name, applied_at, duration) '
+            'VALUES (:version, :name, :applied_at, :duration)'
+        ), {
+            'version': migration.version,
+            'name': migration.name,
+            'applied_at': datetime.utcnow(),
+            'duration': time.perf_counter() - started
+        })
+        db.session.commit()
+        result.append(migration)
+    return result
+
+
+def downgrade():
+    """Desfaz o último passo aplicado; retorna a migração desfeita ou None"""
+    done = applied()
+    for migration in reversed(discover()):
+        if migration.version not in done:
+            continue
+        if not hasattr(migration.module, 'downgrade'):
+            raise RuntimeError(f'A migração {migration.version}_{migration.name} não pode ser desfeita')
+        migration.module.downgrade()
+        db.session.commit()
+        db.session.execute(db.text('DELETE FROM schema_migrations WHERE version = :version'),
+                           {'version': migration.version})
+        db.session.execute(db.text('DELETE FROM schema_backfills WHERE name LIKE :prefix'),
+                           {'prefix': f'{migration.version}:%'})
+        db.session.commit()
+        return migration
+    return None
+
+
+# ===============================
+# Primitivas para os passos
+# ===============================
+
+def has_table(table):
+    return inspect(db.engine).has_table(table)
+
+
+def has_column(table, column):
+    return column in [info['name'] for info in inspect(db.engine).get_columns(table)]
+
+
+def add_column(table, column, definition):
+    """ALTER TABLE ... ADD COLUMN, se a coluna ainda não existir (não reescreve a tabela no SQLite)"""
+    if not has_column(table, column):
+        db.engine.execute(f'ALTER TABLE {table} ADD COLUMN {column} {definition}')
+        return True
+    return False
+
+
+def backfill(name, table, assignments, where=None, batch_size=None, pause=0.0, params=None):
+    """Executa UPDATE table SET assignments [WHERE where] em faixas de id, com checkpoint
+
+    Cada faixa de batch_size ids é uma transação própria, e o último id
+    processado é gravado em schema_backfills na mesma transação. Chamado de
+    novo (ex.: após uma interrupção), continua da faixa seguinte ao checkpoint;
+    depois de concluído, não faz nada. `pause` (segundos) entre as faixas deixa
+    o banco livre para as escritas da aplicação. Retorna o número de linhas
+    alteradas nesta execução.
+    """
+    _ensure_tables()
+    batch_size = batch_size or current_app.config.get('MIGRATIONS_BATCH_SIZE', DEFAULT_BATCH_SIZE)
+
+    checkpoint = db.session.execute(db.text(
+        'SELECT last_id, done FROM schema_backfills WHERE name = :name'
+    ), {'name': name}).fetchone()
+    if checkpoint and checkpoint[1]:
+        return 0
+    last_id = checkpoint[0] if checkpoint else 0
+
+    max_id = db.session.execute(db.text(f'SELECT MAX(id) FROM {table}')).scalar() or 0
+    condition = f' AND ({where})' if where else ''
+    statement = db.text(f'UPDATE {table} SET {assignments} WHERE id > :low AND id <= :high{condition}')
+    save = db.text(
+        'INSERT INTO schema_backfills (name, last_id, done, updated_at) VALUES (:name, :last_id, :done, :now) '
+        'ON CONFLICT (name) DO UPDATE SET last_id = excluded.last_id, done = excluded.done, updated_at = excluded.updated_at'
+    )
+
+    changed = 0
+    while True:
+        high = min(last_id + batch_size, max_id)
+        if high > last_id:
+            changed += db.session.execute(statement, dict(params or {}, low=last_id, high=high)).rowcount
+        done = high >= max_id
+        db.session.execute(save, {'name': name, 'last_id': high, 'done': done, 'now': datetime.utcnow()})
+        db.session.commit()
+        last_id = high
+        if done:
+            break
+        logger.info('Backfill %s: até o id %s de %s', name, last_id, max_id)
+        if pause:
+            time.sleep(pause)
+
+    return changed
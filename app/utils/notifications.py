@@ -0,0 +1,235 @@
+"""
+Avisos de promoção da lista de espera
+
+Quando um confirmado sai da sala (ou é removido pelo organizador), o primeiro
+da lista de espera passa a confirmado. A saída grava o aviso na tabela
+notifications, na mesma transação, e depois do commit agenda uma única
+tarefa na fila (app/utils/jobs.py) com alguns segundos de atraso
+(NOTIFY_BATCH_DELAY). Novas promoções nesse intervalo entram na mesma tarefa,
+que envia uma mensagem por usuário, reunindo todas as salas em que ele foi
+confirmado.
+
+O envio acontece no worker da fila, nunca na requisição, e respeita um limite
+de mensagens por segundo (NOTIFY_RATE) e por execução (NOTIFY_MAX_PER_RUN);
+o que sobrar fica para a próxima execução, agendada em seguida. Sem
+MAIL_SERVER configurado, as mensagens são apenas registradas no log.
+"""
+
+import logging
+import smtplib
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime
+from email.message import EmailMessage
+
+from flask import current_app
+from sqlalchemy import event
+
+from app import db
+from app.utils import jobs, partitions
+
+logger = logging.getLogger(__name__)
+
+TASK_NAME = 'notificacoes.enviar'
+
+PROMOTION = 'promocao'
+
+# Espera (segundos) antes de enviar, para juntar várias mudanças em uma mensagem
+DEFAULT_BATCH_DELAY = 30
+
+# Usuários (mensagens) por execução da tarefa
+DEFAULT_MAX_PER_RUN = 50
+
+# Mensagens por segundo entregues ao servidor SMTP
+DEFAULT_RATE = 2.0
+
+
+def promoted_by_leaving(room, participant):
+    """user_id de quem deixa a lista de espera se o participante sair (None se ninguém)
+
+    Chame antes de desativar ou excluir a participação, na mesma transação.
+    """
+    from app.models.models import Participant
+
+    if not participant.is_active:
+        return None
+    rows = db.session.query(Participant.id, Participant.user_id).filter(
+        Participant.room_id == room.id,
+        Participant.is_active == True
+    ).order_by(Participant.registered_at, Participant.id).limit(room.max_participants + 1).all()
+
+    # Sem lista de espera, ou quem sai já estava nela
+    if len(rows) <= room.max_participants:
+        return None
+    if participant.id not in {row[0] for row in rows[:room.max_participants]}:
+        return None
+    return rows[room.max_participants][1]
+
+
+def participant_leaving(room, participant):
+    """Grava na caixa de saída a promoção causada pela saída do participante; não faz commit"""
+    from app.models.models import Notification
+
+    user_id = promoted_by_leaving(room, participant)
+    if user_id is not None:
+        db.session.add(Notification(user_id, room.id, PROMOTION))
+        db.session.info['notificacoes'] = True
+    return user_id
+
+
+def schedule(delay=None):
+    """Agenda o envio (uma tarefa aguardando basta para todos os avisos pendentes)"""
+    if delay is None:
+        delay = current_app.config.get('NOTIFY_BATCH_DELAY', DEFAULT_BATCH_DELAY)
+    try:
+        jobs.enqueue(TASK_NAME, unique=True, delay=delay)
+    except Exception:
+        # Os avisos continuam gravados e saem com a próxima tarefa agendada
+        logger.exception('Erro ao agendar o envio de notificações')
+
+
+def _after_commit(session):
+    if session.info.pop('notificacoes', False):
+        schedule()
+
+
+def _discard(session):
+    session.info.pop('notificacoes', None)
+
+
+def init_app(app):
+    """Registra os listeners na sessão do Flask-SQLAlchemy (apenas uma vez)"""
+    if event.contains(db.session, 'after_commit', _after_commit):
+        return
+    event.listen(db.session, 'after_commit', _after_commit)
+    event.listen(db.session, 'after_rollback', _discard)
+
+
+# ===============================
+# Envio
+# ===============================
+
+@contextmanager
+def _mailer():
+    """Função de envio sobre uma única conexão SMTP (ou o log, sem MAIL_SERVER)"""
+    config = current_app.config
+    server = config.get('MAIL_SERVER')
+    if not server:
+        yield lambda message: logger.info('Notificação para %s:\n%s', message['To'], message.get_content())
+        return
+
+    connection = smtplib.SMTP(server, config.get('MAIL_PORT', 25), timeout=config.get('MAIL_TIMEOUT', 10))
+    try:
+        if config.get('MAIL_USE_TLS'):
+            connection.starttls()
+        if config.get('MAIL_USERNAME'):
+            connection.login(config['MAIL_USERNAME'], config.get('MAIL_PASSWORD', ''))
+        yield connection.send_message
+    finally:
+        try:
+            connection.quit()
+        except smtplib.SMTPException:
+            connection.close()
+
+
+def _message(name, email, rooms):
+    public_url = current_app.config.get('PUBLIC_URL', '').rstrip('/')
+    message = EmailMessage()
+    message['From'] = current_app.config.get('MAIL_FROM', 'Esportes em Grupo <nao-responda@localhost>')
+    message['To'] = email
+    if len(rooms) == 1:
+        message['Subject'] = f'Você está confirmado em {rooms[0]["name"]}'
+    else:
+        message['Subject'] = f'Você está confirmado em {len(rooms)} jogos'
+
+    lines = [f'Olá, {name}!', '', 'Abriu vaga e você saiu da lista de espera:', '']
+    for room in rooms:
+        place = ', '.join(part for part in (room['location'], room['city']) if part)
+        lines.append(f"- {room['name']}: {room['date']:%d/%m/%Y %H:%M} ({place})")
+        lines.append(f"  {public_url}/sala/{room['link_code']}")
+    lines += ['', 'Se não puder ir, saia da sala para liberar a vaga para o próximo da fila.']
+    message.set_content('\n'.join(lines))
+    return message
+
+
+def _pending(max_users):
+    """Avisos pendentes dos usuários mais antigos na fila: {user_id: [linhas]} e se sobrou alguém"""
+    from app.models.models import Notification, Participant, Room, User
+
+    first_ids = db.session.query(Notification.user_id, db.func.min(Notification.id)).filter(
+        Notification.sent_at == None
+    ).group_by(Notification.user_id).order_by(db.func.min(Notification.id)).limit(max_users + 1).all()
+    # Com partições, o mesmo usuário pode vir de mais de uma
+    user_ids = list(dict.fromkeys(row[0] for row in partitions.ordered(first_ids, key=lambda row: row[1])))
+    remaining = len(user_ids) > max_users
+    user_ids = user_ids[:max_users]
+    if not user_ids:
+        return {}, False
+
+    rows = db.session.query(
+        Notification.id, Notification.user_id, User.name, User.email,
+        Room.id, Room.name, Room.date, Room.location, Room.city, Room.link_code, Participant.id
+    ).join(
+        User, User.id == Notification.user_id
+    ).outerjoin(
+        Room, Room.id == Notification.room_id
+    ).outerjoin(
+        Participant, db.and_(
+            Participant.room_id == Notification.room_id,
+            Participant.user_id == Notification.user_id,
+            Participant.is_active == True
+        )
+    ).filter(
+        Notification.sent_at == None,
+        Notification.user_id.in_(user_ids)
+    ).order_by(Notification.id).all()
+    rows = partitions.ordered(rows, key=lambda row: row[0])
+
+    grouped = OrderedDict((user_id, []) for user_id in user_ids)
+    for row in rows:
+        grouped[row[1]].append(row)
+    return grouped, remaining
+
+
+def _mark_sent(notification_ids):
+    from app.models.models import Notification
+
+    db.session.execute(
+        Notification.__table__.update().where(
+            Notification.id.in_(notification_ids)
+        ).values(sent_at=datetime.utcnow())
+    )
+    db.session.commit()
+
+
+def deliver():
+    """Envia os avisos pendentes, uma mensagem por usuário, respeitando o limite de envio"""
+    config = current_app.config
+    interval = 1.0 / config.get('NOTIFY_RATE', DEFAULT_RATE)
+    grouped, remaining = _pending(config.get('NOTIFY_MAX_PER_RUN', DEFAULT_MAX_PER_RUN))
+
+    sent = discarded = 0
+    last_sent_at = None
+    with _mailer() as send:
+        for rows in grouped.values():
+            # Salas excluídas ou que o usuário já deixou não entram; cada sala aparece uma vez
+            rooms = OrderedDict()
+            for row in rows:
+                if row[4] is not None and row[10] is not None:
+                    rooms[row[4]] = {'name': row[5], 'date': row[6], 'location': row[7],
+                                     'city': row[8], 'link_code': row[9]}
+            if rooms:
+                if last_sent_at is not None:
+                    time.sleep(max(0.0, last_sent_at + interval - time.monotonic()))
+                send(_message(rows[0][2], rows[0][3], list(rooms.values())))
+                last_sent_at = time.monotonic()
+                sent += 1
+            else:
+                discarded += len(rows)
+            # Marcados um usuário por vez: uma falha no meio não reenvia os anteriores
+            _mark_sent([row[0] for row in rows])
+
+    if remaining:
+        schedule(delay=0)
+    return {'sent': sent, 'discarded': discarded, 'remaining': remaining}
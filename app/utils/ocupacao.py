@@ -0,0 +1,244 @@
+"""
+Ocupação das quadras por dia da semana e hora
+
+Cada reserva de quadra (sala com court_id, de date até end_time) é distribuída
+nas horas do período com um vetor de diferenças: as horas cheias entram com
++60 no início e -60 no fim do trecho e só as horas das pontas recebem os
+minutos parciais, de forma que o custo por reserva é constante e a soma
+acumulada final percorre o período uma única vez. As horas absolutas são
+então dobradas nas 168 horas da semana (segunda 00h = 0).
+
+A ocupação é medida contra o horário de funcionamento (COURT_OPENING_HOURS
+ou `abertura=` na requisição, 'HH:MM-HH:MM'), e a receita por hora
+disponível usa o preço por hora da quadra. Inclui as salas arquivadas (ver
+app/utils/archive.py).
+O resultado de cada período fica em cache até uma escrita alterar um dos
+meses cobertos.
+"""
+
+from datetime import datetime, timedelta
+
+from flask import current_app
+
+from app import db
+from app.models.models import Court
+from app.utils import archive, partitions
+from app.utils import cache as caches
+from app.utils.invalidation import on_change
+
+DIAS = ['seg', 'ter', 'qua', 'qui', 'sex', 'sab', 'dom']
+
+HORAS_SEMANA = 7 * 24
+
+MINUTOS_POR_DIA = 24 * 60
+
+DEFAULT_ABERTURA = '06:00-23:00'
+
+# Períodos mais longos que isso não são calculados na requisição
+MAX_DIAS = 366
+
+DEFAULT_TTL = 3600
+
+# Namespace incrementado quando a escrita não informa os meses alterados
+ALL_MONTHS = '*'
+
+cache = caches.register('ocupacao', max_entries=256)
+
+
+def abertura_padrao():
+    return current_app.config.get('COURT_OPENING_HOURS', DEFAULT_ABERTURA)
+
+
+def minutos_abertos(abertura):
+    """Minutos de funcionamento em cada hora do dia (24 valores); 'HH:MM-HH:MM', pode passar da meia-noite"""
+    inicio, fim = (
+        datetime.strptime(hora.strip(), '%H:%M') for hora in abertura.split('-')
+    )
+    inicio, fim = inicio.hour * 60 + inicio.minute, fim.hour * 60 + fim.minute
+    if fim <= inicio:
+        fim += MINUTOS_POR_DIA
+    abertos = [0] * 24
+    for hora in range(24):
+        # A janela pode continuar no dia seguinte (fim > 1440)
+        for deslocamento in (0, MINUTOS_POR_DIA):
+            comeco = hora * 60 + deslocamento
+            abertos[hora] += max(0, min(fim, comeco + 60) - max(inicio, comeco))
+    return [min(60, minutos) for minutos in abertos]
+
+
+def expandir(intervalos, inicio, horas):
+    """Minutos ocupados em cada hora absoluta a partir de `inicio` (vetor de diferenças)
+
+    `intervalos` são pares (início, fim) em datetime; trechos fora do período
+    são descartados e sobreposições na mesma quadra contam no máximo 60 minutos.
+    """
+    diferencas = [0] * (horas + 1)
+    parciais = [0] * horas
+    limite = horas * 60
+    for comeco, fim in intervalos:
+        s = max(0, int((comeco - inicio).total_seconds() // 60))
+        e = min(limite, int((fim - inicio).total_seconds() // 60))
+        if e <= s:
+            continue
+        hora_s, minuto_s = divmod(s, 60)
+        hora_e, minuto_e = divmod(e, 60)
+        if hora_s == hora_e:
+            parciais[hora_s] += e - s
+            continue
+        parciais[hora_s] += 60 - minuto_s
+        diferencas[hora_s + 1] += 60
+        diferencas[hora_e] -= 60
+        if minuto_e:
+            parciais[hora_e] += minuto_e
+
+    ocupados = []
+    acumulado = 0
+    for hora in range(horas):
+        acumulado += diferencas[hora]
+        ocupados.append(min(60, acumulado + parciais[hora]))
+    return ocupados
+
+
+def _intervalos(court_ids, inicio, fim):
+    """{court_id: [(início, fim), ...]} das reservas ativas que tocam o período, incluindo as arquivadas"""
+    RoomHistory = archive.room_history()
+    rows = db.session.query(RoomHistory.court_id, RoomHistory.date, RoomHistory.end_time).filter(
+        RoomHistory.court_id.in_(court_ids),
+        RoomHistory.is_active == True,
+        RoomHistory.date < fim,
+        RoomHistory.end_time > inicio
+    )
+    intervalos = {court_id: [] for court_id in court_ids}
+    for court_id, comeco, termino in rows:
+        intervalos[court_id].append((comeco, termino))
+    return intervalos
+
+
+def _resumo(ocupado, disponivel, fora, receita):
+    horas_disponiveis = disponivel / 60
+    receita = round(receita, 2)
+    return {
+        'horas_disponiveis': round(horas_disponiveis, 2),
+        'horas_ocupadas': round(ocupado / 60, 2),
+        'horas_fora_do_horario': round(fora / 60, 2),
+        'ocupacao': round(100 * ocupado / disponivel, 1) if disponivel else None,
+        'receita': receita,
+        'receita_por_hora_disponivel': round(receita / horas_disponiveis, 2) if horas_disponiveis else None,
+    }
+
+
+def _mapa(ocupados, disponiveis):
+    """Matriz 7 x 24 (dia da semana x hora) com a ocupação em %; None nas horas fechadas"""
+    return [[
+        round(100 * ocupados[dia * 24 + hora] / disponiveis[dia * 24 + hora], 1)
+        if disponiveis[dia * 24 + hora] else None
+        for hora in range(24)
+    ] for dia in range(7)]
+
+
+def calcular(inicio, fim, court_ids=None, city=None, abertura=None):
+    """Ocupação por quadra e no total entre as datas `inicio` (inclusive) e `fim` (exclusive)"""
+    abertura = abertura or abertura_padrao()
+    abertos = minutos_abertos(abertura)
+
+    query = db.session.query(Court.id, Court.name, Court.hourly_price).filter(Court.is_active == True)
+    if court_ids:
+        query = query.filter(Court.id.in_(court_ids))
+    if city:
+        query = query.filter(Court.city == city)
+    quadras = partitions.ordered(query.order_by(Court.name).all(), key=lambda quadra: quadra.name)
+
+    dias = (fim - inicio).days
+    horas = dias * 24
+    dia_inicial = inicio.weekday()
+
+    # Minutos disponíveis em cada hora da semana no período (iguais para todas as quadras)
+    disponiveis = [0] * HORAS_SEMANA
+    for dia in range(dias):
+        base = (dia_inicial + dia) % 7 * 24
+        for hora in range(24):
+            disponiveis[base + hora] += abertos[hora]
+
+    intervalos = _intervalos([quadra.id for quadra in quadras], inicio, fim)
+    total_ocupados = [0] * HORAS_SEMANA
+    total = {'ocupado': 0, 'fora': 0, 'receita': 0.0}
+    resultado = []
+    for quadra in quadras:
+        ocupados = [0] * HORAS_SEMANA
+        fora = 0
+        for hora, minutos in enumerate(expandir(intervalos[quadra.id], inicio, horas)):
+            if not minutos:
+                continue
+            # Minutos fora do funcionamento não entram na ocupação, mas geram receita
+            dentro = min(minutos, abertos[hora % 24])
+            ocupados[(dia_inicial + hora // 24) % 7 * 24 + hora % 24] += dentro
+            fora += minutos - dentro
+        ocupado = sum(ocupados)
+        receita = (ocupado + fora) / 60 * (quadra.hourly_price or 0.0)
+        resumo = _resumo(ocupado, sum(disponiveis), fora, receita)
+        resultado.append(dict(
+            court_id=quadra.id, court_name=quadra.name, hourly_price=quadra.hourly_price,
+            mapa=_mapa(ocupados, disponiveis), **resumo
+        ))
+        for indice, minutos in enumerate(ocupados):
+            total_ocupados[indice] += minutos
+        total['ocupado'] += ocupado
+        total['fora'] += fora
+        total['receita'] += receita
+
+    disponivel_total = [minutos * len(quadras) for minutos in disponiveis]
+    resumo_total = _resumo(total['ocupado'], sum(disponivel_total), total['fora'], total['receita'])
+    return {
+        'inicio': inicio.date().isoformat(),
+        'fim': (fim - timedelta(days=1)).date().isoformat(),
+        'abertura': abertura,
+        'dias': DIAS,
+        'total': dict(mapa=_mapa(total_ocupados, disponivel_total), **resumo_total),
+        'quadras': resultado,
+    }
+
+
+def _meses(inicio, fim):
+    """Meses (ano, mês) cobertos pelo período"""
+    ultimo = fim - timedelta(days=1)
+    return [
+        (valor // 12, valor % 12 + 1)
+        for valor in range(inicio.year * 12 + inicio.month - 1, ultimo.year * 12 + ultimo.month)
+    ]
+
+
+def ocupacao(inicio, fim, court_ids=None, city=None, abertura=None):
+    """calcular() com cache por período, invalidado pelos meses alterados"""
+    abertura = abertura or abertura_padrao()
+    geracoes = tuple(cache.generation(f'{ano}-{mes:02d}') for ano, mes in _meses(inicio, fim))
+    key = (inicio, fim, tuple(sorted(court_ids or ())), city or '', abertura,
+           geracoes, cache.generation(ALL_MONTHS))
+    resultado = cache.get(key)
+    if resultado is None:
+        resultado = calcular(inicio, fim, court_ids, city, abertura)
+        cache.set(key, resultado, ttl=current_app.config.get('COURT_OCCUPANCY_TTL', DEFAULT_TTL))
+    return resultado
+
+
+def periodo(inicio_texto=None, fim_texto=None):
+    """(início, fim exclusivo) a partir de datas YYYY-MM-DD (fim inclusive); padrão: as últimas 4 semanas"""
+    hoje = datetime.combine(datetime.now().date(), datetime.min.time())
+    fim = datetime.strptime(fim_texto, '%Y-%m-%d') + timedelta(days=1) if fim_texto else hoje
+    inicio = datetime.strptime(inicio_texto, '%Y-%m-%d') if inicio_texto else fim - timedelta(days=28)
+    if fim <= inicio:
+        raise ValueError('A data final deve ser igual ou posterior à inicial')
+    if (fim - inicio).days > MAX_DIAS:
+        raise ValueError(f'O período deve ter no máximo {MAX_DIAS} dias')
+    return inicio, fim
+
+
+@on_change
+def invalidate(changes):
+    """Descarta apenas os períodos que cobrem meses com salas alteradas"""
+    if not changes.cities and not changes.room_ids:
+        return
+    if not changes.months:
+        cache.bump(ALL_MONTHS)
+        return
+    for year, month in changes.months:
+        cache.bump(f'{year}-{month:02d}')
@@ -0,0 +1,175 @@
+"""
+Cache da página inicial
+
+A listagem de salas é a mesma para todos os visitantes de um mesmo filtro
+(esporte/cidade/busca). Guardamos os dados da listagem para qualquer visitante e a
+página já renderizada para visitantes anônimos, com ETag e Last-Modified para
+que navegadores e proxies possam responder com 304.
+"""
+
+import hashlib
+from collections import namedtuple
+from datetime import datetime
+
+from flask import current_app, request, make_response
+
+from app import db
+from app.models.models import Room, User, Participant
+from app.utils import sports, search, participations, partitions
+from app.utils import cache
+from app.utils.invalidation import on_change
+
+# Tempo de vida padrão (segundos): a separação entre próximas e passadas depende do horário
+DEFAULT_TTL = 60
+
+# Namespace usado para buscas sem filtro de cidade (afetadas por qualquer cidade)
+ALL_CITIES = '*'
+
+RoomSummary = namedtuple('RoomSummary', [
+    'id', 'name', 'sport', 'date', 'max_participants', 'city', 'link_code',
+    'created_at', 'creator_id', 'creator_name', 'active_count'
+])
+
+CachedPage = namedtuple('CachedPage', ['body', 'etag', 'last_modified'])
+
+listing_cache = cache.register('listagens', max_entries=512)
+page_cache = cache.register('paginas', max_entries=512)
+participation_cache = cache.register('inscricoes', max_entries=4096)
+
+# Momento da última alteração por cidade, usado no cabeçalho Last-Modified
+# (no mesmo backend das listagens, para que todos os workers enviem a mesma data)
+modified_cache = cache.register('modificacoes', max_entries=4096)
+_started_at = datetime.utcnow().replace(microsecond=0)
+
+
+def _ttl():
+    return current_app.config.get('PAGE_CACHE_TTL', DEFAULT_TTL)
+
+
+def _namespace(city_filter):
+    return city_filter or ALL_CITIES
+
+
+def _key(sport_filter, city_filter, search_text=None):
+    return (sports.normalize(sport_filter), city_filter or '', search.normalize_query(search_text),
+            listing_generation(city_filter))
+
+
+def listing_generation(city_filter):
+    """Geração das listagens do filtro de cidade; muda a cada alteração que as afeta"""
+    return listing_cache.generation(_namespace(city_filter))
+
+
+def last_modified(city_filter):
+    return modified_cache.get(_namespace(city_filter)) or _started_at
+
+
+def _query_listing(sport_filter, city_filter, search_text=None):
+    """Busca as salas públicas ativas com o nome do organizador e o total de inscritos"""
+    active_count = db.func.count(Participant.id)
+    query = db.session.query(
+        Room.id, Room.name, Room.sport, Room.date, Room.max_participants, Room.city,
+        Room.link_code, Room.created_at, Room.creator_id, User.name, active_count
+    ).join(
+        User, User.id == Room.creator_id
+    ).outerjoin(
+        Participant, db.and_(Participant.room_id == Room.id, Participant.is_active == True)
+    ).filter(
+        Room.is_active == True,
+        Room.is_private == False
+    )
+
+    sport_ids = None
+    if sport_filter:
+        # Busca parcial feita no catálogo em memória; no banco vira um filtro indexado por id
+        sport_ids = sports.matching_ids(sport_filter)
+        query = query.filter(Room.sport_id.in_(sport_ids))
+
+    if city_filter:
+        query = query.filter(Room.city == city_filter)
+
+    ranking = None
+    if search_text:
+        # A busca já aplica os mesmos filtros antes de limitar os resultados
+        ranked_ids = search.search_room_ids(search_text, city=city_filter, sport_ids=sport_ids)
+        ranking = {room_id: position for position, room_id in enumerate(ranked_ids)}
+        query = query.filter(Room.id.in_(ranked_ids))
+
+    rows = partitions.ordered(query.group_by(Room.id).order_by(Room.date).all(), key=lambda row: row[3])
+    if ranking is not None:
+        # Resultados de busca na ordem de relevância
+        rows.sort(key=lambda row: ranking[row[0]])
+    return [RoomSummary(*row) for row in rows]
+
+
+def get_listing(sport_filter, city_filter, search_text=None):
+    """Retorna a listagem de salas do filtro, consultando o banco apenas se necessário"""
+    key = _key(sport_filter, city_filter, search_text)
+    listing = listing_cache.get(key)
+    if listing is None:
+        listing = _query_listing(sport_filter, city_filter, search_text)
+        listing_cache.set(key, listing, ttl=_ttl())
+    return listing
+
+
+def get_user_participations(user_id, sport_filter, city_filter, rooms, search_text=None):
+    """Retorna os ids das salas exibidas em que o usuário está inscrito (fragmento por usuário)"""
+    key = (user_id,) + _key(sport_filter, city_filter, search_text)
+    room_ids = participation_cache.get(key)
+    if room_ids is None:
+        room_ids = participations.active_room_ids(user_id, [room.id for room in rooms])
+        participation_cache.set(key, room_ids, ttl=_ttl())
+    return room_ids
+
+
+def get_page(sport_filter, city_filter, search_text=None):
+    """Retorna a página anônima já renderizada, se existir"""
+    return page_cache.get(_key(sport_filter, city_filter, search_text))
+
+
+def make_page(body, last_modified):
+    """Monta uma página em cache com ETag calculado a partir do conteúdo"""
+    return CachedPage(
+        body=body,
+        etag=hashlib.sha1(body.encode('utf-8')).hexdigest(),
+        last_modified=last_modified
+    )
+
+
+def store_page(sport_filter, city_filter, body, generation_before, modified_before, search_text=None):
+    """Armazena a página anônima renderizada e retorna a entrada criada
+
+    generation_before e modified_before são lidos (nessa ordem) antes de
+    consultar a listagem: se um commit mudou a geração durante a
+    renderização, a página já nasce velha e não é guardada.
+    """
+    page = make_page(body, modified_before)
+    if listing_generation(city_filter) == generation_before:
+        page_cache.set(_key(sport_filter, city_filter, search_text), page, ttl=_ttl())
+    return page
+
+
+def page_response(page):
+    """Monta a resposta com cabeçalhos de validação, retornando 304 quando possível"""
+    response = make_response(page.body)
+    response.set_etag(page.etag)
+    response.last_modified = page.last_modified
+    response.cache_control.public = True
+    response.cache_control.max_age = 0
+    response.cache_control.must_revalidate = True
+    # A página muda para usuários logados (cookie de sessão)
+    response.vary.add('Cookie')
+    return response.make_conditional(request)
+
+
+@on_change
+def invalidate(changes):
+    """Invalida as listagens das cidades afetadas e as buscas sem filtro de cidade"""
+    if not changes.cities and not changes.room_ids:
+        return
+
+    now = datetime.utcnow().replace(microsecond=0)
+    for namespace in changes.cities | {ALL_CITIES}:
+        # A data antes da geração: quem leu a geração nova já lê a data nova (ver store_page)
+        modified_cache.set(namespace, now)
+        listing_cache.bump(namespace)
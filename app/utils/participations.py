@@ -0,0 +1,64 @@
+"""
+Participações ativas do usuário logado
+
+Em vez de carregar todo o histórico de participações do usuário (que pode ter
+milhares de linhas) e percorrê-lo, consultamos apenas as salas exibidas com uma
+consulta indexada por (user_id, room_id) e memorizamos o resultado durante a
+requisição.
+"""
+
+from flask import g, has_request_context
+
+from app import db
+from app.utils.invalidation import on_change
+
+
+def _memo(user_id):
+    """Salas já verificadas e salas com participação ativa, por usuário, na requisição atual"""
+    if not has_request_context():
+        return {'checked': set(), 'active': set()}
+    memo = g.setdefault('_participacoes', {})
+    return memo.setdefault(user_id, {'checked': set(), 'active': set()})
+
+
+def active_room_ids(user_id, room_ids):
+    """Retorna o subconjunto de room_ids em que o usuário tem participação ativa"""
+    from app.models.models import Participant
+
+    memo = _memo(user_id)
+    room_ids = set(room_ids)
+    missing = room_ids - memo['checked']
+    if missing:
+        memo['active'].update(row[0] for row in db.session.query(Participant.room_id).filter(
+            Participant.user_id == user_id,
+            Participant.is_active == True,
+            Participant.room_id.in_(missing)
+        ))
+        memo['checked'].update(missing)
+    return memo['active'] & room_ids
+
+
+def get_active(user_id, room_id):
+    """Retorna a participação ativa do usuário na sala (ou None) com uma consulta indexada"""
+    from app.models.models import Participant
+
+    memo = _memo(user_id)
+    if room_id in memo['checked'] and room_id not in memo['active']:
+        return None
+
+    participation = Participant.query.filter_by(
+        user_id=user_id, room_id=room_id, is_active=True
+    ).first()
+    memo['checked'].add(room_id)
+    if participation is not None:
+        memo['active'].add(room_id)
+    else:
+        memo['active'].discard(room_id)
+    return participation
+
+
+@on_change
+def reset(changes):
+    """Descarta o que foi memorizado na requisição depois de um commit que altera salas"""
+    if changes.room_ids and has_request_context():
+        g.pop('_participacoes', None)
@@ -0,0 +1,453 @@
+"""
+Partições do banco por cidade (ou UF), com roteamento na sessão
+
+Opcional: sem CITY_PARTITIONS tudo fica em um único banco e a sessão se
+comporta exatamente como a do Flask-SQLAlchemy. Com partições, as tabelas de
+uma cidade (quadras, salas, participantes, notificações, lápides, contador de
+alterações e arquivo) ficam em um banco próprio, com lock de escrita próprio:
+inscrições em Recife não esperam pelo commit de São Paulo, e uma cidade
+movimentada pode ir para outro servidor. Usuários e esportes continuam no
+banco principal; em SQLite cada partição anexa o arquivo principal (ATTACH),
+então joins com usuários funcionam dentro da partição.
+
+A sessão escolhe o banco a cada instrução:
+
+- objetos carregados guardam a partição de origem (identity token) e voltam
+  para ela no flush; objetos novos vão pela cidade (quadras e salas) ou pelo
+  id da sala (participantes, notificações, lápides);
+- consultas com id, room_id, court_id, row_id ou city nas condições (AND de
+  nível superior) vão direto para as partições desses valores; as demais
+  consultam todas e concatenam as linhas, de forma que ORDER BY, LIMIT e
+  agregações valem dentro de cada partição (use ordered() e each() para
+  ordenar e totalizar);
+- escritas via Core sem condição roteável exigem scope(nome).
+
+Os ids de cada partição começam em número * ID_STRIDE, então o próprio id diz
+onde a linha está.
+
+CITY_PARTITIONS (JSON): {"sp": {"uri": "sqlite:////dados/sp.db", "numero": 1,
+"locais": ["SP"]}, "recife": {"uri": "...", "numero": 2, "locais":
+["Recife - PE"]}}; cada local é uma cidade ("Nome - UF") ou uma UF inteira.
+
+Limitações: mudar a cidade de uma sala não a move de partição, e salas e
+quadras ligadas devem ficar na mesma partição; dados existentes de uma cidade
+precisam ser copiados antes de ela ganhar partição; as migrações rodam só no
+banco principal (setup() cria nas partições as tabelas, colunas e índices que
+faltarem); uma transação que escreve em mais de uma partição é confirmada em
+cada banco separadamente; partições fora do SQLite precisam enxergar as
+tabelas globais por conta própria (ex.: postgres_fdw).
+"""
+
+import logging
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from flask import current_app
+from flask_sqlalchemy import SignallingSession, SQLAlchemy
+from sqlalchemy import MetaData, Table, and_, event, inspect, or_, orm, text
+from sqlalchemy.ext.horizontal_shard import ShardedSession, execute_and_instances
+from sqlalchemy.schema import CreateColumn
+from sqlalchemy.sql import operators, visitors
+from sqlalchemy.sql.elements import BinaryExpression, BindParameter, BooleanClauseList
+
+logger = logging.getLogger(__name__)
+
+PRINCIPAL = 'principal'
+
+# Ids por partição: a partição n usa [n * ID_STRIDE, (n + 1) * ID_STRIDE); cabe em INTEGER de 32 bits até n = 20
+ID_STRIDE = 10 ** 8
+
+PARTITIONED = frozenset([
+    'courts', 'rooms', 'participants', 'notifications', 'tombstones',
+    'change_sequence', 'rooms_archive', 'participants_archive',
+])
+
+# Tabelas com id autoincremental, iniciado na faixa da partição
+SEQUENCED = ('courts', 'rooms', 'participants', 'notifications', 'tombstones')
+
+# Colunas que guardam o id de uma linha particionada (a partição sai do valor)
+ID_COLUMNS = frozenset(['id', 'room_id', 'court_id', 'row_id'])
+
+_scope = ContextVar('particao', default=None)
+
+
+def _bind_key(name):
+    return f'particao:{name}'
+
+
+def _tables(statement):
+    """Nomes das tabelas usadas pela instrução (inclusive em subconsultas)"""
+    return {element.name for element in visitors.iterate(statement) if isinstance(element, Table)}
+
+
+class Router:
+    """Escolha da partição de objetos, ids, cidades e instruções"""
+
+    def __init__(self, app, config):
+        self.app = app
+        self.numbers = {PRINCIPAL: 0}
+        self.places = {}
+        for name, options in config.items():
+            numero = int(options['numero'])
+            if name == PRINCIPAL or numero < 1 or numero in self.numbers.values():
+                raise ValueError(f'Partição inválida em CITY_PARTITIONS: {name} (número {numero})')
+            self.numbers[name] = numero
+            for place in options.get('locais', ()):
+                self.places[self._place(place)] = name
+        self.names = sorted(self.numbers, key=self.numbers.get)
+        self.by_number = {numero: name for name, numero in self.numbers.items()}
+
+    @staticmethod
+    def _place(place):
+        place = place.strip()
+        return place.upper() if len(place) == 2 else place
+
+    def engines(self):
+        from app import db
+
+        engines = {PRINCIPAL: db.get_engine(self.app)}
+        for name in self.names[1:]:
+            engine = db.get_engine(self.app, bind=_bind_key(name))
+            if engine.dialect.name == 'sqlite' and not event.contains(engine, 'connect', self._attach):
+                event.listen(engine, 'connect', self._attach)
+            engines[name] = engine
+        return engines
+
+    def _attach(self, dbapi_connection, connection_record):
+        from app import db
+
+        path = db.get_engine(self.app).url.database
+        if db.get_engine(self.app).dialect.name != 'sqlite' or not path or path == ':memory:':
+            logger.warning('Banco principal não é um arquivo SQLite: tabelas globais indisponíveis nas partições')
+            return
+        cursor = dbapi_connection.cursor()
+        cursor.execute('ATTACH DATABASE ? AS principal', (path,))
+        cursor.close()
+
+    def for_city(self, city):
+        if not city:
+            return PRINCIPAL
+        name = self.places.get(city.strip())
+        if name is None and ' - ' in city:
+            name = self.places.get(city.rsplit(' - ', 1)[1].strip().upper())
+        return name or PRINCIPAL
+
+    def for_id(self, value):
+        return self.by_number.get(int(value) // ID_STRIDE, PRINCIPAL)
+
+    def for_instance(self, obj):
+        state = inspect(obj)
+        if state.key is not None and state.key[2] is not None:
+            return state.key[2]
+        if state.identity_token is not None:
+            return state.identity_token
+        if state.mapper.local_table.name not in PARTITIONED:
+            return PRINCIPAL
+        if 'city' in state.mapper.columns:
+            return self.for_city(obj.city)
+        for attribute in ('room_id', 'row_id'):
+            value = getattr(obj, attribute, None)
+            if value is not None:
+                return self.for_id(value)
+        # Participante criado só com a relação (room=...)
+        room = getattr(obj, 'room', None)
+        if room is not None:
+            return self.for_instance(room)
+        return _scope.get() or PRINCIPAL
+
+    # Interface do ShardedSession
+
+    def shard_chooser(self, mapper, instance, clause=None):
+        if instance is not None:
+            return self.for_instance(instance)
+        if mapper is not None and mapper.local_table.name not in PARTITIONED:
+            return PRINCIPAL
+        return _scope.get() or PRINCIPAL
+
+    def id_chooser(self, query, ident):
+        mapper = query._only_full_mapper_zero('id_chooser')
+        if mapper.local_table.name not in PARTITIONED:
+            return [PRINCIPAL]
+        return [self.for_id(ident[0])]
+
+    def execute_chooser(self, orm_context):
+        statement = orm_context.statement
+        tables = _tables(statement)
+        scoped = _scope.get()
+        if not tables & PARTITIONED:
+            # SQL textual (sem tabelas conhecidas) segue o scope(); tabelas globais ficam na principal
+            return [scoped] if scoped and not tables else [PRINCIPAL]
+        if scoped:
+            return [scoped]
+        names = None
+        if not orm_context.is_insert:
+            names = self._narrow(getattr(statement, 'whereclause', None), orm_context.parameters)
+        if names is not None:
+            return [name for name in self.names if name in names] or [PRINCIPAL]
+        if not orm_context.is_select:
+            raise RuntimeError('Escrita em tabela particionada sem partição definida: use partitions.scope()')
+        return list(self.names)
+
+    def _narrow(self, clause, parameters):
+        """Partições possíveis segundo as condições (AND) da cláusula; None se podem ser todas"""
+        if isinstance(clause, BooleanClauseList):
+            if clause.operator is not operators.and_:
+                return None
+            found = None
+            for condition in clause.clauses:
+                names = self._narrow(condition, parameters)
+                if names is not None:
+                    found = names if found is None else found & names
+            return found
+        if not isinstance(clause, BinaryExpression) or not isinstance(clause.right, BindParameter):
+            return None
+        column, parameter = clause.left, clause.right
+        table = getattr(column, 'table', None)
+        if not isinstance(table, Table) or table.name not in PARTITIONED:
+            return None
+        if isinstance(parameters, dict) and parameter.key in parameters:
+            value = parameters[parameter.key]
+        else:
+            value = parameter.effective_value
+        if clause.operator is operators.eq:
+            values = [value]
+        elif clause.operator is operators.in_op and isinstance(value, (list, tuple, set, frozenset)):
+            values = value
+        else:
+            return None
+        if any(value is None for value in values):
+            return None
+        if column.name == 'city':
+            return {self.for_city(value) for value in values}
+        if column.name in ID_COLUMNS:
+            try:
+                return {self.for_id(value) for value in values}
+            except (TypeError, ValueError):
+                return None
+        return None
+
+
+def _execute(orm_context):
+    """execute_and_instances do ShardedSession; com uma única partição escolhida, o resultado
+    volta sem ser combinado (rowcount e inserted_primary_key continuam disponíveis)"""
+    if orm_context.is_select:
+        options = orm_context.load_options
+    elif orm_context.is_update or orm_context.is_delete:
+        options = orm_context.update_delete_options
+    else:
+        options = None
+    if (options is None or options._refresh_identity_token is None) and \
+            'shard_id' not in orm_context.bind_arguments and \
+            '_sa_shard_id' not in orm_context.execution_options:
+        names = orm_context.session.execute_chooser(orm_context)
+        if len(names) == 1:
+            orm_context.bind_arguments['shard_id'] = names[0]
+    return execute_and_instances(orm_context)
+
+
+class RoutingSession(ShardedSession, SignallingSession):
+    """Sessão do Flask-SQLAlchemy que, com partições configuradas, escolhe o banco de cada instrução"""
+
+    def __init__(self, db, autocommit=False, autoflush=True, **options):
+        self.router = router = db.get_app().extensions.get('partitions')
+        if router is None:
+            SignallingSession.__init__(self, db, autocommit=autocommit, autoflush=autoflush, **options)
+            # Flush pela conexão da sessão, como no Session padrão
+            self.connection_callable = None
+            return
+        ShardedSession.__init__(
+            self, router.shard_chooser, router.id_chooser, execute_chooser=router.execute_chooser,
+            shards=router.engines(), db=db, autocommit=autocommit, autoflush=autoflush, **options
+        )
+        event.remove(self, 'do_orm_execute', execute_and_instances)
+        event.listen(self, 'do_orm_execute', _execute, retval=True)
+
+    def get_bind(self, mapper=None, shard_id=None, instance=None, clause=None, **kw):
+        if self.router is None:
+            return SignallingSession.get_bind(self, mapper, clause=clause)
+        return ShardedSession.get_bind(self, mapper, shard_id=shard_id, instance=instance, clause=clause, **kw)
+
+    def _identity_lookup(self, mapper, primary_key_identity, identity_token=None, **kw):
+        if self.router is None:
+            return orm.Session._identity_lookup(self, mapper, primary_key_identity, identity_token=identity_token, **kw)
+        return ShardedSession._identity_lookup(self, mapper, primary_key_identity, identity_token=identity_token, **kw)
+
+
+class RoutingSQLAlchemy(SQLAlchemy):
+    """SQLAlchemy do Flask com a sessão roteada por partição"""
+
+    def create_session(self, options):
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
+
+# ===============================
+# API
+# ===============================
+
+def _router():
+    return current_app.extensions.get('partitions')
+
+
+def enabled():
+    return _router() is not None
+
+
+def names():
+    """Partições configuradas, a principal primeiro"""
+    router = _router()
+    return list(router.names) if router else [PRINCIPAL]
+
+
+def number(name):
+    router = _router()
+    return router.numbers[name] if router else 0
+
+
+def current():
+    """Partição do scope() ativo (principal fora de um)"""
+    return _scope.get() or PRINCIPAL
+
+
+@contextmanager
+def scope(name):
+    """Instruções dentro do bloco vão para a partição `name`"""
+    token = _scope.set(name)
+    try:
+        yield name
+    finally:
+        _scope.reset(token)
+
+
+def each():
+    """Itera pelas partições com scope() ativo em cada uma (só a principal sem partições)"""
+    for name in names():
+        with scope(name):
+            yield name
+
+
+def for_city(city):
+    router = _router()
+    return router.for_city(city) if router else PRINCIPAL
+
+
+def for_id(value):
+    router = _router()
+    return router.for_id(value) if router and value is not None else PRINCIPAL
+
+
+def for_instance(obj):
+    router = _router()
+    return router.for_instance(obj) if router else PRINCIPAL
+
+
+def engine(name=None):
+    from app import db
+
+    router = _router()
+    return router.engines()[name or current()] if router else db.engine
+
+
+def connection(session=None, name=None):
+    """Conexão da transação da sessão com a partição (a do scope() ativo por padrão)"""
+    from app import db
+
+    session = session or db.session
+    if not enabled():
+        return session.connection()
+    return session.connection(bind_arguments={'shard_id': name or current()})
+
+
+def split(column, condition):
+    """Condição que depende da partição: OR de `condition(número)` restrito à faixa de ids de cada uma"""
+    router = _router()
+    if router is None:
+        return condition(0)
+    return or_(*[
+        and_(column >= numero * ID_STRIDE, column < (numero + 1) * ID_STRIDE, condition(numero))
+        for numero in (router.numbers[name] for name in router.names)
+    ])
+
+
+def ordered(rows, key, reverse=False, limit=None):
+    """Linhas de uma consulta espalhada pelas partições na ordem de `key` (o ORDER BY vale em cada uma)"""
+    if not enabled():
+        return rows
+    rows = sorted(rows, key=key, reverse=reverse)
+    return rows if limit is None else rows[:limit]
+
+
+# ===============================
+# Criação das tabelas
+# ===============================
+
+def _partition_metadata():
+    """Cópia das tabelas particionadas, com id autoincremental e sem chaves estrangeiras para as globais"""
+    from app import db
+
+    metadata = MetaData()
+    for table in db.metadata.sorted_tables:
+        if table.name not in PARTITIONED:
+            continue
+        copy = table.to_metadata(metadata)
+        for constraint in list(copy.foreign_key_constraints):
+            if constraint.elements[0].target_fullname.split('.')[0] not in PARTITIONED:
+                copy.constraints.discard(constraint)
+                for key in constraint.elements:
+                    copy.foreign_keys.discard(key)
+                    key.parent.foreign_keys.discard(key)
+        if table.name in SEQUENCED:
+            # Sem AUTOINCREMENT o SQLite ignora o início da faixa gravado em sqlite_sequence
+            copy.dialect_options['sqlite']['autoincrement'] = True
+    return metadata
+
+
+def _seed_ids(connection, table, base):
+    """Faz o id da tabela começar na faixa da partição (só avança, nunca reinicia)"""
+    dialect = connection.dialect.name
+    if dialect == 'sqlite':
+        connection.execute(text(
+            'INSERT INTO sqlite_sequence (name, seq) SELECT :name, :base '
+            'WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = :name)'
+        ), {'name': table.name, 'base': base})
+    elif dialect == 'postgresql':
+        sequence = connection.execute(text("SELECT pg_get_serial_sequence(:name, 'id')"), {'name': table.name}).scalar()
+        if sequence and connection.execute(text(f'SELECT last_value FROM {sequence}')).scalar() < base:
+            connection.execute(text('SELECT setval(:sequence, :base)'), {'sequence': sequence, 'base': base})
+    else:
+        logger.warning('Faixa de ids não configurada para %s em %s', table.name, dialect)
+
+
+def setup():
+    """Cria nas partições as tabelas, colunas e índices que faltarem (idempotente); chamada na criação da aplicação"""
+    router = _router()
+    if router is None:
+        return
+    metadata = _partition_metadata()
+    engines = router.engines()
+    for name in router.names[1:]:
+        with engines[name].begin() as connection:
+            metadata.create_all(connection)
+            inspector = inspect(connection)
+            for table in metadata.sorted_tables:
+                existing = {column['name'] for column in inspector.get_columns(table.name)}
+                for column in table.columns:
+                    if column.name not in existing:
+                        ddl = CreateColumn(column).compile(dialect=connection.dialect)
+                        connection.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {ddl}'))
+                for index in table.indexes:
+                    index.create(connection, checkfirst=True)
+                if table.name in SEQUENCED:
+                    _seed_ids(connection, table, router.numbers[name] * ID_STRIDE)
+
+
+def init_app(app):
+    """Lê CITY_PARTITIONS e instala o roteador (nada muda sem partições configuradas)"""
+    config = app.config.get('CITY_PARTITIONS') or {}
+    if not config:
+        app.extensions.pop('partitions', None)
+        return
+    binds = dict(app.config.get('SQLALCHEMY_BINDS') or {})
+    for name, options in config.items():
+        binds[_bind_key(name)] = options['uri']
+    app.config['SQLALCHEMY_BINDS'] = binds
+    app.extensions['partitions'] = Router(app, config)
@@ -0,0 +1,174 @@
+"""
+Hash de senhas configurável e verificação com concorrência limitada
+
+O método e o custo do hash vêm da configuração (PASSWORD_METHOD):
+  - 'pbkdf2:sha256:<iterações>' (padrão do Werkzeug);
+  - 'scrypt:<n>:<r>:<p>' (mesmo formato usado pelo Werkzeug 3).
+Quando a configuração muda, hashes antigos continuam válidos e são refeitos no
+próximo login bem-sucedido (needs_rehash).
+
+A verificação é intencionalmente lenta e ocupa CPU. Ela roda em um pool de
+threads de tamanho fixo (o hashlib libera o GIL), com um limite de
+verificações simultâneas por cliente e um limite de verificações pendentes no
+total: o excesso é recusado na hora durante uma rajada de logins ou um ataque
+de força bruta.
+
+O pool limita apenas o uso de CPU: a requisição continua esperando o
+resultado (submit(...).result()), então cada verificação aceita ocupa um
+worker da aplicação até terminar. Quem protege os workers é a recusa do
+excesso; mantenha PASSWORD_MAX_PENDING abaixo do número de workers do
+servidor para que sempre sobrem workers para as demais páginas.
+
+O cliente é identificado conforme PASSWORD_LIMIT_KEY: 'ip' (padrão) usa
+request.remote_addr, que atrás de um proxy reverso só é o IP real com
+TRUSTED_PROXIES configurado (ProxyFix lê o X-Forwarded-For); 'username' limita
+por conta alvo do login, o que funciona mesmo sem informação de IP.
+"""
+
+import hashlib
+import hmac
+import os
+import secrets
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import current_app, has_app_context, request
+from werkzeug.security import DEFAULT_PBKDF2_ITERATIONS, check_password_hash, generate_password_hash
+
+DEFAULT_METHOD = f'pbkdf2:sha256:{DEFAULT_PBKDF2_ITERATIONS}'
+DEFAULT_SALT_LENGTH = 16
+
+
+class TooManyAttempts(Exception):
+    """Limite de verificações simultâneas atingido (por cliente ou no total)"""
+
+
+def _config(name, default):
+    if has_app_context():
+        return current_app.config.get(name, default)
+    return default
+
+
+def _method():
+    return _normalize_method(_config('PASSWORD_METHOD', DEFAULT_METHOD))
+
+
+def _normalize_method(method):
+    """Completa os parâmetros omitidos para que hashes e configuração sejam comparáveis"""
+    parts = method.split(':')
+    if parts[0] == 'pbkdf2':
+        digest = parts[1] if len(parts) > 1 else 'sha256'
+        iterations = parts[2] if len(parts) > 2 else DEFAULT_PBKDF2_ITERATIONS
+        return f'pbkdf2:{digest}:{iterations}'
+    if parts[0] == 'scrypt':
+        n, r, p = (parts[1:] + ['32768', '8', '1'][len(parts) - 1:])[:3]
+        return f'scrypt:{n}:{r}:{p}'
+    return method
+
+
+def _scrypt(password, salt, n, r, p):
+    return hashlib.scrypt(
+        password.encode('utf-8'), salt=salt.encode('utf-8'),
+        n=n, r=r, p=p, maxmem=132 * n * r * p
+    ).hex()
+
+
+def hash_password(password):
+    """Gera o hash da senha com o método configurado"""
+    method = _method()
+    salt_length = _config('PASSWORD_SALT_LENGTH', DEFAULT_SALT_LENGTH)
+
+    if method.startswith('scrypt:'):
+        n, r, p = (int(value) for value in method.split(':')[1:])
+        salt = secrets.token_urlsafe(salt_length)[:salt_length]
+        return f'{method}${salt}${_scrypt(password, salt, n, r, p)}'
+
+    return generate_password_hash(password, method=method, salt_length=salt_length)
+
+
+def check_password(pwhash, password):
+    """Verifica a senha no próprio thread (sem limites); prefira verify() em requisições"""
+    if pwhash.startswith('scrypt:'):
+        try:
+            method, salt, expected = pwhash.split('$', 2)
+            n, r, p = (int(value) for value in method.split(':')[1:])
+        except ValueError:
+            return False
+        return hmac.compare_digest(_scrypt(password, salt, n, r, p), expected)
+    return check_password_hash(pwhash, password)
+
+
+def needs_rehash(pwhash):
+    """Indica se o hash foi gerado com um método ou custo diferente do configurado"""
+    method, _, rest = pwhash.partition('$')
+    salt = rest.partition('$')[0]
+    return (_normalize_method(method) != _method()
+            or len(salt) != _config('PASSWORD_SALT_LENGTH', DEFAULT_SALT_LENGTH))
+
+
+class Verifier:
+    """Pool de verificação com limite por chave (cliente) e limite global de pendências"""
+
+    def __init__(self, workers=None, per_key=2, max_pending=None):
+        self.workers = workers or os.cpu_count() or 1
+        self.per_key = per_key
+        self.max_pending = max_pending or self.workers * 4
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='passwords')
+        self._active = {}
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    def _acquire(self, key):
+        with self._lock:
+            if self._pending >= self.max_pending or self._active.get(key, 0) >= self.per_key:
+                raise TooManyAttempts()
+            self._pending += 1
+            self._active[key] = self._active.get(key, 0) + 1
+
+    def _release(self, key):
+        with self._lock:
+            self._pending -= 1
+            self._active[key] -= 1
+            if not self._active[key]:
+                del self._active[key]
+
+    def verify(self, pwhash, password, key=None):
+        """Verifica a senha no pool; levanta TooManyAttempts se os limites forem atingidos"""
+        self._acquire(key)
+        try:
+            return self._executor.submit(check_password, pwhash, password).result()
+        finally:
+            self._release(key)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True)
+
+
+_verifier = None
+_verifier_lock = threading.Lock()
+
+
+def get_verifier():
+    global _verifier
+    if _verifier is None:
+        with _verifier_lock:
+            if _verifier is None:
+                _verifier = Verifier(
+                    workers=_config('PASSWORD_HASH_WORKERS', None),
+                    per_key=_config('PASSWORD_MAX_PER_IP', 2),
+                    max_pending=_config('PASSWORD_MAX_PENDING', None)
+                )
+    return _verifier
+
+
+def verify(pwhash, password, key=None):
+    """Verifica a senha no pool compartilhado, limitando as verificações simultâneas por chave"""
+    return get_verifier().verify(pwhash, password, key)
+
+
+def client_key(username):
+    """Chave do limite por cliente para o login atual, conforme PASSWORD_LIMIT_KEY ('ip' ou 'username')"""
+    if _config('PASSWORD_LIMIT_KEY', 'ip') == 'username':
+        return f'usuario:{username}'
+    return f'ip:{request.remote_addr}'
+
@@ -0,0 +1,135 @@
+"""
+Divisão do valor das salas
+
+O valor de uma sala depende da quadra (preço por hora x duração) e de quantos
+participantes estão confirmados, e os valores pagos e pendentes dependem do
+status de pagamento de cada confirmado. Em vez de recarregar a lista de
+participantes a cada cálculo, montamos o resumo de várias salas em uma única
+consulta agregada e o memorizamos durante a requisição. Commits que alteram
+a sala ou seus participantes descartam o resumo memorizado.
+
+Confirmados são os primeiros max_participants participantes ativos, pela
+ordem de inscrição; os demais estão na lista de espera e não pagam.
+"""
+
+from collections import namedtuple
+
+from flask import g, has_app_context
+
+from app import db
+from app.utils.invalidation import on_change
+
+PriceBreakdown = namedtuple('PriceBreakdown', [
+    'room_id',
+    'court_cost',        # Preço da quadra pela duração da sala (None sem quadra)
+    'total_price',       # Valor total da sala: quadra ou valor fixo x confirmados
+    'price_per_person',  # Valor devido por confirmado
+    'active',            # Participantes ativos (confirmados + lista de espera)
+    'confirmed',
+    'waiting',
+    'paid_count',
+    'pending_count',
+    'paid_amount',
+    'pending_amount',
+])
+
+
+def _breakdown(room_id, max_participants, valor, duration_hours, hourly_price,
+               active, paid, pending):
+    confirmed = min(active, max_participants)
+    if hourly_price is not None:
+        court_cost = hourly_price * (duration_hours or 0)
+        total_price = court_cost
+        price_per_person = court_cost / confirmed if confirmed else 0.0
+    else:
+        court_cost = None
+        price_per_person = valor or 0.0
+        total_price = price_per_person * confirmed
+    return PriceBreakdown(
+        room_id=room_id,
+        court_cost=court_cost,
+        total_price=total_price,
+        price_per_person=price_per_person,
+        active=active,
+        confirmed=confirmed,
+        waiting=active - confirmed,
+        paid_count=paid,
+        pending_count=pending,
+        paid_amount=round(price_per_person * paid, 2),
+        pending_amount=round(price_per_person * pending, 2),
+    )
+
+
+def _query(room_ids):
+    """Resumo de várias salas em uma consulta: posição de cada ativo na fila e status de pagamento"""
+    from app.models.models import Court, Participant, Room
+
+    position = db.func.row_number().over(
+        partition_by=Participant.room_id,
+        order_by=(Participant.registered_at, Participant.id)
+    )
+    roster = db.select([
+        Participant.room_id.label('room_id'),
+        Participant.pagamento_status.label('status'),
+        position.label('position'),
+    ]).where(
+        Participant.room_id.in_(room_ids),
+        Participant.is_active == True
+    ).subquery()
+
+    confirmed = roster.c.position <= Room.max_participants
+
+    def confirmed_with(status):
+        return db.func.sum(db.case([(db.and_(confirmed, roster.c.status == status), 1)], else_=0))
+
+    rows = db.session.execute(db.select([
+        Room.id, Room.max_participants, Room.valor, Room.duration_hours, Court.hourly_price,
+        db.func.count(roster.c.room_id), confirmed_with('pago'), confirmed_with('pendente'),
+    ]).select_from(
+        Room.__table__
+        .outerjoin(Court.__table__, Court.id == Room.court_id)
+        .outerjoin(roster, roster.c.room_id == Room.id)
+    ).where(
+        Room.id.in_(room_ids)
+    ).group_by(Room.id, Court.hourly_price)).fetchall()
+
+    return {
+        row[0]: _breakdown(*row[:5], active=row[5], paid=row[6] or 0, pending=row[7] or 0)
+        for row in rows
+    }
+
+
+def _memo():
+    if not has_app_context():
+        return {}
+    return g.setdefault('_precos', {})
+
+
+def for_rooms(rooms):
+    """Retorna {room_id: PriceBreakdown} das salas (objetos ou ids), consultando só as ainda não calculadas"""
+    memo = _memo()
+    room_ids = [getattr(room, 'id', room) for room in rooms]
+    missing = [room_id for room_id in room_ids if room_id is not None and room_id not in memo]
+    if missing:
+        memo.update(_query(missing))
+    return {room_id: memo[room_id] for room_id in room_ids if room_id in memo}
+
+
+def for_room(room):
+    """Resumo de uma sala, calculado no máximo uma vez por requisição"""
+    if room.id is None:
+        # Sala ainda não gravada: sem participantes
+        court = room.court if room.court_id else None
+        return _breakdown(None, room.max_participants, room.valor, room.duration_hours,
+                          court.hourly_price if court else None, 0, 0, 0)
+    return for_rooms([room.id])[room.id]
+
+
+@on_change
+def invalidate(changes):
+    """Descarta os resumos memorizados das salas alteradas no commit"""
+    if changes.room_ids and has_app_context():
+        memo = g.get('_precos')
+        if memo:
+            for room_id in changes.room_ids:
+                memo.pop(room_id, None)
@@ -0,0 +1,417 @@
+"""
+Auditoria dos planos de consulta das rotas
+
+Semeia um banco descartável, percorre as rotas de main_routes, room_routes,
+auth_routes e admin_controller com o cliente de teste e registra cada comando
+SQL distinto executado (com o tempo gasto e as rotas que o dispararam). Depois
+roda EXPLAIN QUERY PLAN (SQLite) ou EXPLAIN ANALYZE (PostgreSQL, apenas em
+SELECT) em cada um e aponta:
+  - varreduras completas de tabela (SCAN / Seq Scan);
+  - árvores B temporárias para ORDER BY, GROUP BY ou DISTINCT;
+  - índices ausentes: índices automáticos criados pelo SQLite e colunas
+    filtradas em tabelas varridas que não começam nenhum índice existente.
+O relatório é ordenado pelo tempo observado de cada comando.
+
+Uso: flask perf audit (veja --help)
+"""
+
+import contextlib
+import io
+import logging
+import os
+import re
+import tempfile
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from sqlalchemy import Boolean, event, inspect
+
+from app import create_app, db
+
+# Blueprints auditados
+BLUEPRINTS = ('main', 'room', 'auth', 'admin', 'api')
+
+# Rotas que não terminam (SSE) ou dependem de serviços externos
+SKIP = {'room.room_events', 'main.update_cities_cache', 'main.search_cities_api'}
+
+# Rotas que encerram, apagam ou deslogam: exercitadas por último
+DESTRUCTIVE = {
+    'room.close_room', 'room.delete_room', 'room.leave_room', 'room.remove_participant',
+    'admin.delete_court', 'admin.excluir_room', 'admin.remover_participant', 'auth.logout',
+}
+
+# Comandos que não são consultas da aplicação
+_IGNORED = re.compile(r'^\s*(EXPLAIN|PRAGMA|BEGIN|COMMIT|ROLLBACK|SAVEPOINT|RELEASE|CREATE|DROP|ALTER)\b', re.I)
+_PLACEHOLDERS = re.compile(r'\((?:\?|%\(\w+\)s)(?:, (?:\?|%\(\w+\)s))+\)')
+_SQLITE_SCAN = re.compile(r'^SCAN (?:TABLE )?(\w+)(?: AS \w+)?$')
+_SQLITE_AUTOMATIC = re.compile(r'AUTOMATIC (?:PARTIAL )?(?:COVERING )?INDEX ON (\w+)\s*\(([^)]*)\)')
+_SQLITE_TEMP = re.compile(r'USE TEMP B-TREE FOR (.+)$')
+_PG_SEQ_SCAN = re.compile(r'Seq Scan on (\w+)')
+_PG_SORT = re.compile(r'Sort Method: (external \w+|quicksort|top-N heapsort)')
+
+PASSWORD = 'auditoria'
+
+
+def normalize(statement):
+    """Agrupa comandos que só diferem no tamanho das listas de IN"""
+    return ' '.join(_PLACEHOLDERS.sub('(?, ...)', statement).split())
+
+
+class Recorder:
+    """Registra os comandos executados no engine, com tempo e rota de origem"""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.label = None
+        self.statements = OrderedDict()
+
+    def __enter__(self):
+        event.listen(self.engine, 'before_cursor_execute', self._before)
+        event.listen(self.engine, 'after_cursor_execute', self._after)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.engine, 'before_cursor_execute', self._before)
+        event.remove(self.engine, 'after_cursor_execute', self._after)
+
+    def _before(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('audit_started', []).append(time.perf_counter())
+
+    def _after(self, conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info['audit_started'].pop()
+        if self.label is None or _IGNORED.match(statement):
+            return
+        key = normalize(statement)
+        entry = self.statements.get(key)
+        if entry is None:
+            entry = self.statements[key] = {
+                'statement': statement,
+                'parameters': parameters[0] if executemany and parameters else parameters,
+                'calls': 0, 'total': 0.0, 'max': 0.0, 'routes': OrderedDict(),
+            }
+        entry['calls'] += 1
+        entry['total'] += elapsed
+        entry['max'] = max(entry['max'], elapsed)
+        entry['routes'][self.label] = None
+
+
+# ===============================
+# Dados e rotas
+# ===============================
+
+def seed(app, scale=1):
+    """Cria usuários, quadras, salas passadas e futuras e participações; retorna os ids usados nas rotas"""
+    from app.models.models import Court, Participant, Room, User
+    from app.utils import passwords
+
+    users, rooms_total = 200 * scale, 100 * scale
+    cities = ['São Paulo - SP', 'Recife - PE', 'Curitiba - PR']
+    now = datetime.utcnow().replace(second=0, microsecond=0)
+
+    with app.app_context():
+        owner = User('auditoria', 'auditoria@example.com', 'Auditoria', PASSWORD)
+        db.session.add(owner)
+        db.session.commit()
+        # Demais usuários direto na tabela para não pagar o hash de senha
+        db.session.execute(User.__table__.insert(), [
+            {'username': f'jogador{i}', 'email': f'jogador{i}@example.com', 'name': f'Jogador {i}',
+             'password_hash': passwords.hash_password(PASSWORD) if i == 1 else '!',
+             'created_at': now, 'is_active': True}
+            for i in range(1, users + 1)
+        ])
+        courts = [Court(f'Quadra {i}', 'Futebol', 100.0 + i * 10, location=f'Rua {i}', city=cities[i % 3])
+                  for i in range(6)]
+        db.session.add_all(courts)
+        db.session.commit()
+
+        rooms = []
+        for i in range(rooms_total):
+            date = now + timedelta(days=i % 40 - 10, hours=i % 12)
+            rooms.append(Room(
+                f'Racha {i}', ['Futebol', 'Vôlei', 'Basquete'][i % 3], date, 10 + i % 10, owner.id,
+                city=cities[i % 3], is_private=i % 7 == 0, valor=15.0,
+                court_id=courts[i % len(courts)].id if i % 2 == 0 else None, duration_hours=1.5
+            ))
+        db.session.add_all(rooms)
+        db.session.commit()
+
+        db.session.execute(Participant.__table__.insert(), [
+            {'user_id': owner.id + 1 + (room.id * 7 + k) % users, 'room_id': room.id,
+             'registered_at': now - timedelta(days=1) + timedelta(seconds=k), 'is_active': k % 9 != 8,
+             'checked_in': False, 'pagamento_status': 'pago' if k % 3 == 0 else 'pendente'}
+            for room in rooms for k in range(12)
+        ])
+        db.session.commit()
+
+        room = next(room for room in rooms if room.court_id and room.date > now)
+        participants = [row[0] for row in db.session.query(Participant.id).filter(
+            Participant.room_id == room.id, Participant.is_active == True
+        ).order_by(Participant.id)]
+        spare = rooms[-1]
+        from app.utils import ical
+        with app.test_request_context():
+            token = ical.user_token(owner.id)
+        return {
+            'user_id': owner.id, 'room_id': room.id, 'link_code': room.link_code,
+            'participant_ids': participants, 'court_id': room.court_id, 'spare_court_id': courts[-1].id,
+            'spare_room_id': spare.id, 'spare_link_code': spare.link_code, 'city': room.city,
+            'token': token, 'date': room.date,
+        }
+
+
+def scenarios(data):
+    """Requisições por rota: (método, valores da URL, opções do cliente de teste, anônimo)"""
+    day = (datetime.utcnow() + timedelta(days=60)).replace(hour=18, minute=0)
+    room_json = {
+        'name': 'Racha da auditoria', 'sport': 'Futebol', 'date': day.strftime('%Y-%m-%dT%H:%M'),
+        'max_participants': 12, 'duration_hours': 1.0, 'court_id': data['court_id'],
+        'calcular_automatico': True,
+    }
+    room_form = {
+        'name': 'Racha da auditoria', 'sport': 'Futebol', 'date': day.strftime('%Y-%m-%dT%H:%M'),
+        'max_participants': '12', 'city': data['city'], 'location': 'Rua 1',
+    }
+    court_json = {'name': 'Quadra auditada', 'sport_type': 'Futebol', 'hourly_price': 90, 'city': data['city']}
+    first, second = data['participant_ids'][:2]
+    room_values = {'link_code': data['link_code'], 'room_id': data['room_id']}
+
+    return {
+        'main.index': [
+            ('GET', {}, {}, True),
+            ('GET', {}, {'query_string': {'sport': 'futebol', 'city': data['city']}}, True),
+            ('GET', {}, {'query_string': {'q': 'racha'}}, False),
+        ],
+        'main.search_rooms_api': [('GET', {}, {'query_string': {'q': 'racha', 'city': data['city']}}, False)],
+        'api.list_rooms': [('GET', {}, {'query_string': {'city': data['city'], 'limit': 50}}, True),
+                           ('GET', {}, {'query_string': {'fields': 'id,name,creator_name', 'upcoming': 1}}, True)],
+        'api.room_detail': [('GET', room_values, {}, True)],
+        'main.court_calendar': [('GET', {'court_id': data['court_id']}, {}, True)],
+        'main.city_calendar': [('GET', {'city': data['city']}, {}, True)],
+        'main.user_calendar': [('GET', {'token': data['token']}, {}, True)],
+        'room.view_room': [('GET', room_values, {}, True), ('GET', room_values, {}, False)],
+        'room.create_room': [('GET', {}, {}, False), ('POST', {}, {'data': room_form}, False)],
+        'room.edit_room': [('GET', room_values, {}, False), ('POST', room_values, {'data': room_form}, False)],
+        'room.remove_participant': [('GET', dict(room_values, participant_id=second), {}, False)],
+        'room.close_room': [('GET', {'link_code': data['spare_link_code']}, {}, False)],
+        'room.delete_room': [('GET', {'link_code': data['spare_link_code']}, {}, False)],
+        'auth.login': [
+            ('GET', {}, {}, True),
+            ('POST', {}, {'data': {'username': 'auditoria', 'password': PASSWORD}}, True),
+        ],
+        'auth.register': [
+            ('GET', {}, {}, True),
+            ('POST', {}, {'data': {'username': 'novo_jogador', 'name': 'Novo Jogador', 'email': 'novo@example.com',
+                                   'password': 'senha-segura-123', 'confirm_password': 'senha-segura-123'}}, True),
+        ],
+        'admin.get_rooms': [
+            ('GET', {}, {}, False),
+            ('GET', {}, {'query_string': {'sport': 'futebol', 'date': data['date'].strftime('%Y-%m-%d')}}, False),
+        ],
+        'admin.check_court_availability': [
+            ('GET', {'court_id': data['court_id']}, {'query_string': {'date': data['date'].strftime('%Y-%m-%d')}}, False),
+        ],
+        'admin.buscar_horarios': [
+            ('GET', {}, {'query_string': {'date': day.strftime('%Y-%m-%d'), 'city': data['city']}}, False),
+        ],
+        'admin.create_court': [('POST', {}, {'json': court_json}, False)],
+        'admin.update_court': [('PUT', {'court_id': data['court_id']}, {'json': court_json}, False)],
+        'admin.delete_court': [('DELETE', {'court_id': data['spare_court_id']}, {}, False)],
+        'admin.criar_room': [('POST', {}, {'json': room_json}, False)],
+        'admin.criar_serie': [('POST', {}, {'json': dict(room_json, ocorrencias=8,
+                                                           date=(day + timedelta(hours=2)).strftime('%Y-%m-%dT%H:%M'))}, False)],
+        'admin.atualizar_room': [('PUT', {}, {'json': dict(room_json, id=data['room_id'],
+                                                          date=data['date'].strftime('%Y-%m-%dT%H:%M'))}, False)],
+        'admin.atualizar_participant': [
+            ('PUT', {'room_id': data['room_id'], 'participant_id': first}, {'json': {'pagamento_status': 'pago'}}, False),
+        ],
+        'admin.atualizar_participantes_lote': [
+            ('POST', {'room_id': data['room_id']}, {'json': {'participant_ids': data['participant_ids'][:5],
+                                                             'pagamento_status': 'pago'}}, False),
+        ],
+        'admin.remover_participant': [
+            ('DELETE', {'room_id': data['room_id'], 'participant_id': data['participant_ids'][-1]}, {}, False),
+        ],
+        'admin.excluir_room': [('DELETE', {'id': data['spare_room_id']}, {}, False)],
+        'admin.importar': [
+            ('POST', {'kind': 'courts'}, {'data': 'name;sport_type;hourly_price;city\nQuadra importada;Futebol;80;Recife - PE\n',
+                                          'content_type': 'text/csv'}, False),
+        ],
+    }
+
+
+def _generic_values(rule, data):
+    """Valores para os argumentos da URL a partir dos dados semeados"""
+    known = {
+        'link_code': data['link_code'], 'room_id': data['room_id'], 'id': data['room_id'],
+        'court_id': data['court_id'], 'participant_id': data['participant_ids'][0],
+        'city': data['city'], 'token': data['token'], 'kind': 'courts',
+    }
+    return {argument: known[argument] for argument in rule.arguments if argument in known}
+
+
+def plan_requests(app, data):
+    """Lista (rota, método, url, opções, anônimo) de todas as rotas auditadas, destrutivas por último"""
+    table = scenarios(data)
+    requests = []
+    with app.test_request_context():
+        from flask import url_for
+        for rule in sorted(app.url_map.iter_rules(), key=lambda rule: rule.endpoint):
+            endpoint = rule.endpoint
+            if endpoint.split('.')[0] not in BLUEPRINTS or endpoint in SKIP:
+                continue
+            entries = table.get(endpoint)
+            if entries is None:
+                if 'GET' not in rule.methods:
+                    continue
+                entries = [('GET', _generic_values(rule, data), {}, False)]
+            for method, values, options, anonymous in entries:
+                requests.append((endpoint, method, url_for(endpoint, **values), options, anonymous))
+    requests.sort(key=lambda request: request[0] in DESTRUCTIVE)
+    return requests
+
+
+# ===============================
+# Planos
+# ===============================
+
+def _schema(engine):
+    """Por tabela: primeira coluna de cada índice (e da chave primária) e colunas booleanas"""
+    inspector = inspect(engine)
+    leading, booleans = {}, {}
+    for table in inspector.get_table_names():
+        booleans[table] = {column['name'] for column in inspector.get_columns(table)
+                           if isinstance(column['type'], Boolean)}
+        columns = set(inspector.get_pk_constraint(table).get('constrained_columns') or [])
+        for index in inspector.get_indexes(table):
+            if index.get('column_names'):
+                columns.add(index['column_names'][0])
+        for constraint in inspector.get_unique_constraints(table):
+            if constraint.get('column_names'):
+                columns.add(constraint['column_names'][0])
+        leading[table] = columns
+    return leading, booleans
+
+
+def _filtered_columns(statement, table):
+    """Colunas da tabela usadas em comparações (WHERE/ON) no comando"""
+    operator = r'(?:=|<|>|<=|>=|!=|\bIN\b|\bBETWEEN\b|\bIS\b)'
+    left = re.compile(rf'\b{table}\.(\w+)\b\s*{operator}', re.I)
+    right = re.compile(rf'(?:=|<|>)\s*{table}\.(\w+)\b', re.I)
+    return list(OrderedDict.fromkeys(left.findall(statement) + right.findall(statement)))
+
+
+def _explain(connection, entry, postgresql):
+    statement, parameters = entry['statement'], entry['parameters']
+    if postgresql:
+        analyze = statement.lstrip().upper().startswith('SELECT')
+        prefix = 'EXPLAIN (ANALYZE, BUFFERS) ' if analyze else 'EXPLAIN '
+        rows = connection.exec_driver_sql(prefix + statement, parameters).fetchall()
+        return [row[0] for row in rows]
+    rows = connection.exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, parameters).fetchall()
+    return [row[-1] for row in rows]
+
+
+def analyze(plan, statement, indexed, booleans):
+    """Classifica as linhas do plano; retorna (achados, sugestões de índice)
+
+    Colunas booleanas filtradas não viram sugestão: um índice só nelas
+    raramente é seletivo.
+    """
+    findings, suggestions = [], []
+
+    def suggest(table, column):
+        sql = f'CREATE INDEX ix_{table}_{column} ON {table} ({column})'
+        if sql not in suggestions:
+            suggestions.append(sql)
+
+    for line in plan:
+        text = line.strip()
+        scan = _SQLITE_SCAN.match(text) or _PG_SEQ_SCAN.search(text)
+        if scan and scan.group(1) in indexed:
+            table = scan.group(1)
+            findings.append(('scan', f'varredura completa de {table}'))
+            for column in _filtered_columns(statement, table):
+                if column not in indexed[table] and column not in booleans[table]:
+                    findings.append(('missing_index', f'{table}.{column} filtrada sem índice'))
+                    suggest(table, column)
+            continue
+        automatic = _SQLITE_AUTOMATIC.search(text)
+        if automatic:
+            table = automatic.group(1)
+            columns = [part.split('=')[0].strip() for part in automatic.group(2).split(' AND ')]
+            findings.append(('missing_index', f'índice automático em {table}({", ".join(columns)})'))
+            if columns and columns[0]:
+                suggest(table, columns[0])
+            continue
+        temp = _SQLITE_TEMP.search(text)
+        if temp:
+            findings.append(('temp_btree', f'árvore B temporária para {temp.group(1)}'))
+            continue
+        sort = _PG_SORT.search(text)
+        if sort and sort.group(1).startswith('external'):
+            findings.append(('temp_btree', f'ordenação em disco ({sort.group(1)})'))
+    return findings, suggestions
+
+
+# ===============================
+# Execução
+# ===============================
+
+def run(scale=1, database_uri=None, directory=None):
+    """Semeia o banco, exercita as rotas e retorna o relatório ordenado pelo tempo observado"""
+    logging.getLogger('sqlalchemy').setLevel(logging.WARNING)
+    logging.getLogger('sqlalchemy.engine').setLevel(logging.WARNING)
+
+    directory = directory or tempfile.mkdtemp(prefix='auditoria-')
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': database_uri or f"sqlite:///{os.path.join(directory, 'auditoria.db')}",
+        'JOBS_DB_PATH': os.path.join(directory, 'jobs.db'),
+        'JOBS_INLINE_WORKER': False,
+        'ARCHIVE_INTERVAL': 0,
+        'WTF_CSRF_ENABLED': False,
+    })
+    # Os modelos e as rotas imprimem mensagens de depuração; a saída padrão fica para o relatório (--json)
+    with contextlib.redirect_stdout(io.StringIO()):
+        data = seed(app, scale)
+
+        with app.app_context():
+            engine = db.engine
+        user_client, anonymous_client = app.test_client(), app.test_client()
+        with user_client.session_transaction() as session:
+            session['_user_id'] = str(data['user_id'])
+            session['_fresh'] = True
+
+        statuses = {}
+        with Recorder(engine) as recorder:
+            for endpoint, method, url, options, anonymous in plan_requests(app, data):
+                client = anonymous_client if anonymous else user_client
+                recorder.label = f'{method} {endpoint}'
+                response = client.open(url, method=method, **options)
+                statuses[recorder.label] = response.status_code
+                recorder.label = None
+
+    postgresql = engine.dialect.name == 'postgresql'
+    with app.app_context():
+        indexed, booleans = _schema(engine)
+        report = []
+        with engine.connect() as connection:
+            for entry in recorder.statements.values():
+                try:
+                    plan = _explain(connection, entry, postgresql)
+                except Exception as error:
+                    plan = [f'plano indisponível: {error.__class__.__name__}']
+                findings, suggestions = analyze(plan, entry['statement'], indexed, booleans)
+                report.append({
+                    'statement': entry['statement'],
+                    'calls': entry['calls'],
+                    'total_ms': round(entry['total'] * 1000, 3),
+                    'max_ms': round(entry['max'] * 1000, 3),
+                    'routes': list(entry['routes']),
+                    'plan': plan,
+                    'findings': findings,
+                    'suggestions': suggestions,
+                })
+
+    report.sort(key=lambda item: item['total_ms'], reverse=True)
+    return {'statuses': statuses, 'statements': report}
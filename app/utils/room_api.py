@@ -0,0 +1,336 @@
+"""
+API JSON pública das salas (/api/v1/salas)
+
+Listagem e detalhe de salas para clientes que hoje extraem os dados do HTML.
+As respostas são montadas a partir de projeções de colunas (sem carregar
+objetos do ORM), apenas com os campos pedidos em `fields=`; a listagem é
+paginada por cursor na ordem (date, id), estável mesmo com salas novas entre
+uma página e outra.
+
+O corpo JSON de cada combinação de parâmetros fica em cache com o seu ETag,
+indexado pela geração das listagens da cidade (listagem) ou da sala
+(detalhe). Assim uma revalidação (If-None-Match) responde 304 sem consultar o
+banco, e as versões comprimidas (gzip e, com o pacote brotli instalado, br)
+são calculadas uma vez por versão do corpo.
+"""
+
+import base64
+import binascii
+import gzip
+import hashlib
+import json
+from datetime import datetime
+
+from flask import current_app, make_response, request, url_for
+
+from app import db
+from app.models.models import Court, Participant, Room, User
+from app.utils import cache as caches
+from app.utils import page_cache, partitions, pricing, sports
+from app.utils.invalidation import on_change
+
+try:
+    import brotli
+except ImportError:  # Compressão br opcional
+    brotli = None
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+
+# Corpos menores que isso não compensam a compressão
+MIN_COMPRESS_SIZE = 512
+
+# Tempo de vida padrão (segundos): o filtro de próximas salas depende do horário
+DEFAULT_TTL = 60
+
+cache = caches.register('api_salas', max_entries=2048)
+
+# Campo -> coluna projetada ('url' é derivado do link_code)
+LIST_FIELDS = {
+    'id': Room.id,
+    'name': Room.name,
+    'sport': Room.sport,
+    'date': Room.date,
+    'end_time': Room.end_time,
+    'duration_hours': Room.duration_hours,
+    'city': Room.city,
+    'location': Room.location,
+    'link_code': Room.link_code,
+    'url': Room.link_code,
+    'max_participants': Room.max_participants,
+    'valor': Room.valor,
+    'court_id': Room.court_id,
+    'creator_name': User.name,
+    'active_count': db.func.count(Participant.id),
+}
+
+DEFAULT_LIST_FIELDS = ('id', 'name', 'sport', 'date', 'city', 'link_code', 'max_participants', 'active_count')
+
+DETAIL_FIELDS = dict(LIST_FIELDS, **{
+    'description': Room.description,
+    'is_private': Room.is_private,
+    'court_name': Court.name,
+})
+del DETAIL_FIELDS['active_count']
+
+# Campos do detalhe vindos do resumo de valores (app/utils/pricing.py)
+PRICING_FIELDS = {
+    'active_count': 'active',
+    'confirmed_count': 'confirmed',
+    'waiting_count': 'waiting',
+    'price_per_person': 'price_per_person',
+    'total_price': 'total_price',
+}
+
+DEFAULT_DETAIL_FIELDS = tuple(DETAIL_FIELDS) + tuple(PRICING_FIELDS) + ('participants',)
+
+
+def _ttl():
+    return current_app.config.get('PAGE_CACHE_TTL', DEFAULT_TTL)
+
+
+def parse_fields(raw, available, default):
+    """Lista de campos pedidos em `fields=` (separados por vírgula); ValueError se houver desconhecidos"""
+    if not raw:
+        return list(default)
+    fields = list(dict.fromkeys(field.strip() for field in raw.split(',') if field.strip()))
+    unknown = [field for field in fields if field not in available]
+    if unknown:
+        raise ValueError(f"Campos desconhecidos: {', '.join(unknown)}")
+    return fields
+
+
+def parse_limit(raw):
+    if raw in (None, ''):
+        return DEFAULT_LIMIT
+    try:
+        limit = int(raw)
+    except ValueError:
+        raise ValueError('limit deve ser um número inteiro')
+    if not 1 <= limit <= MAX_LIMIT:
+        raise ValueError(f'limit deve estar entre 1 e {MAX_LIMIT}')
+    return limit
+
+
+def encode_cursor(date, room_id):
+    raw = json.dumps([date.isoformat(), room_id], separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Retorna (date, room_id) do cursor; ValueError se for inválido"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        date, room_id = json.loads(raw)
+        return datetime.fromisoformat(date), int(room_id)
+    except (binascii.Error, TypeError, ValueError):
+        raise ValueError('Cursor inválido')
+
+
+def _value(field, value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if field == 'url':
+        return url_for('room.view_room', link_code=value)
+    return value
+
+
+# ===============================
+# Consultas
+# ===============================
+
+def _list_payload(fields, sport_filter, city_filter, upcoming, cursor, limit):
+    """Página da listagem: {'data': [...], 'next_cursor': ...}"""
+    columns = [LIST_FIELDS[field] for field in fields]
+    query = db.session.query(Room.id, Room.date, *columns).filter(
+        Room.is_active == True,
+        Room.is_private == False
+    )
+    if 'creator_name' in fields:
+        query = query.join(User, User.id == Room.creator_id)
+    if 'active_count' in fields:
+        query = query.outerjoin(
+            Participant, db.and_(Participant.room_id == Room.id, Participant.is_active == True)
+        ).group_by(Room.id)
+
+    if sport_filter:
+        query = query.filter(Room.sport_id.in_(sports.matching_ids(sport_filter)))
+    if city_filter:
+        query = query.filter(Room.city == city_filter)
+    if upcoming:
+        query = query.filter(Room.date > datetime.utcnow())
+    if cursor:
+        after_date, after_id = decode_cursor(cursor)
+        query = query.filter(db.or_(
+            Room.date > after_date,
+            db.and_(Room.date == after_date, Room.id > after_id)
+        ))
+
+    # Uma linha a mais indica se existe próxima página
+    rows = partitions.ordered(
+        query.order_by(Room.date, Room.id).limit(limit + 1).all(), key=lambda row: (row[1], row[0]), limit=limit + 1
+    )
+    next_cursor = encode_cursor(rows[limit - 1][1], rows[limit - 1][0]) if len(rows) > limit else None
+    return {
+        'data': [
+            {field: _value(field, value) for field, value in zip(fields, row[2:])}
+            for row in rows[:limit]
+        ],
+        'next_cursor': next_cursor,
+    }
+
+
+def _participants(room_id, max_participants):
+    """Participantes ativos na ordem de inscrição, marcando a lista de espera"""
+    rows = db.session.query(Participant.id, User.name, Participant.registered_at).join(
+        User, User.id == Participant.user_id
+    ).filter(
+        Participant.room_id == room_id,
+        Participant.is_active == True
+    ).order_by(Participant.registered_at, Participant.id).all()
+    return [{
+        'id': participant_id,
+        'name': name,
+        'registered_at': registered_at.isoformat(),
+        'waiting': position > max_participants,
+    } for position, (participant_id, name, registered_at) in enumerate(rows, 1)]
+
+
+def _detail_payload(room_id, fields):
+    columns = [DETAIL_FIELDS[field] for field in fields if field in DETAIL_FIELDS]
+    query = db.session.query(Room.max_participants, *columns).filter(Room.id == room_id)
+    if 'creator_name' in fields:
+        query = query.join(User, User.id == Room.creator_id)
+    if 'court_name' in fields:
+        query = query.outerjoin(Court, Court.id == Room.court_id)
+    row = query.first()
+    if row is None:
+        return None
+
+    projected = [field for field in fields if field in DETAIL_FIELDS]
+    payload = {field: _value(field, value) for field, value in zip(projected, row[1:])}
+    if any(field in PRICING_FIELDS for field in fields):
+        breakdown = pricing.for_rooms([room_id])[room_id]
+        for field in fields:
+            if field in PRICING_FIELDS:
+                payload[field] = getattr(breakdown, PRICING_FIELDS[field])
+    if 'participants' in fields:
+        payload['participants'] = _participants(room_id, row[0])
+    # Mantém a ordem pedida em fields=
+    return {field: payload[field] for field in fields}
+
+
+def _room_id(link_code):
+    """Id da sala pelo link_code (o mapeamento nunca muda e fica em cache)"""
+    key = f'codigo:{link_code}'
+    room_id = cache.get(key)
+    if room_id is None:
+        room_id = db.session.query(Room.id).filter(Room.link_code == link_code).scalar()
+        if room_id is not None:
+            cache.set(key, room_id)
+    return room_id
+
+
+# ===============================
+# Respostas
+# ===============================
+
+def _cached_body(key, build):
+    """Entrada {'body', 'etag', 'encoded'} da chave, montando o JSON compacto se necessário"""
+    entry = cache.get(key)
+    if entry is None:
+        payload = build()
+        if payload is None:
+            return None
+        body = json.dumps(payload, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        entry = {'body': body, 'etag': hashlib.sha1(body).hexdigest(), 'encoded': {}}
+        cache.set(key, entry, ttl=_ttl())
+    return entry
+
+
+def _encoding(body):
+    """Codificação aceita pelo cliente (br > gzip) ou None"""
+    if len(body) < MIN_COMPRESS_SIZE:
+        return None
+    accepted = request.accept_encodings
+    if brotli is not None and accepted['br']:
+        return 'br'
+    if accepted['gzip']:
+        return 'gzip'
+    return None
+
+
+def _compress(key, entry, encoding):
+    encoded = entry['encoded'].get(encoding)
+    if encoded is None:
+        if encoding == 'br':
+            encoded = brotli.compress(entry['body'], quality=5)
+        else:
+            encoded = gzip.compress(entry['body'], compresslevel=6, mtime=0)
+        # Guarda a versão comprimida junto do corpo para os próximos clientes
+        entry['encoded'][encoding] = encoded
+        cache.set(key, entry, ttl=_ttl())
+    return encoded
+
+
+def json_response(key, build):
+    """Resposta JSON com ETag (fraco, vale para todas as codificações), 304 e compressão; None sem dados"""
+    entry = _cached_body(key, build)
+    if entry is None:
+        return None
+
+    if request.if_none_match.contains_weak(entry['etag']):
+        response = make_response('', 304)
+    else:
+        encoding = _encoding(entry['body'])
+        if encoding:
+            response = make_response(_compress(key, entry, encoding))
+            response.content_encoding = encoding
+        else:
+            response = make_response(entry['body'])
+        response.mimetype = 'application/json'
+
+    response.set_etag(entry['etag'], weak=True)
+    response.vary.add('Accept-Encoding')
+    response.cache_control.public = True
+    response.cache_control.max_age = 0
+    response.cache_control.must_revalidate = True
+    return response
+
+
+def list_response(args):
+    """Listagem paginada; ValueError para parâmetros inválidos"""
+    fields = parse_fields(args.get('fields'), LIST_FIELDS, DEFAULT_LIST_FIELDS)
+    limit = parse_limit(args.get('limit'))
+    cursor = args.get('cursor') or None
+    if cursor:
+        decode_cursor(cursor)
+    sport_filter = args.get('sport') or None
+    city_filter = args.get('city') or None
+    upcoming = args.get('upcoming') in ('1', 'true')
+
+    # Geração capturada antes da consulta: um resultado montado durante um commit fica na geração antiga
+    key = ('lista', tuple(fields), sports.normalize(sport_filter), city_filter or '', upcoming,
+           cursor, limit, page_cache.listing_generation(city_filter))
+    return json_response(key, lambda: _list_payload(fields, sport_filter, city_filter, upcoming, cursor, limit))
+
+
+def detail_response(link_code, args):
+    """Detalhe da sala pelo link_code (qualquer pessoa com o link, como na página); None se não existir"""
+    fields = parse_fields(args.get('fields'), set(DEFAULT_DETAIL_FIELDS), DEFAULT_DETAIL_FIELDS)
+    room_id = _room_id(link_code)
+    if room_id is None:
+        return None
+    key = ('sala', room_id, tuple(fields), cache.generation(f'sala:{room_id}'))
+    response = json_response(key, lambda: _detail_payload(room_id, fields))
+    if response is None:
+        # Sala excluída depois de o link_code entrar em cache
+        cache.delete(f'codigo:{link_code}')
+    return response
+
+
+@on_change
+def invalidate(changes):
+    """Novas gerações para os detalhes das salas alteradas (a listagem segue as gerações de page_cache)"""
+    for room_id in changes.room_ids:
+        cache.bump(f'sala:{room_id}')
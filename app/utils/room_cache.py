@@ -0,0 +1,96 @@
+"""
+Cache das páginas de sala acessadas pelo link compartilhado
+
+Um mesmo link_code costuma ser aberto milhares de vezes em poucos minutos
+quando cai em um grupo de WhatsApp. Guardamos, por link_code, a página já
+renderizada para visitantes anônimos e o retrato da lista de participantes
+usado pelo stream SSE, de forma que essas visitas não consultem o banco.
+
+As entradas são removidas com precisão após cada commit que altera a sala ou
+seus participantes. Alterações indiretas (nome da quadra ou do organizador)
+aparecem ao expirar o ROOM_CACHE_TTL.
+
+Com vários workers, configure um CACHE_BACKEND compartilhado (veja
+app/utils/cache.py) para que a remoção valha para todos eles.
+"""
+
+from datetime import datetime
+
+from flask import current_app
+
+from app.utils import cache as caches
+from app.utils.invalidation import on_change
+from app.utils.page_cache import CachedPage
+
+# Tempo de vida padrão (segundos) das entradas
+DEFAULT_TTL = 300
+
+# Namespace incrementado a cada alteração em salas (evita guardar uma página renderizada durante um commit)
+GENERATION = 'salas'
+
+cache = caches.register('salas', max_entries=2048)
+
+
+def _ttl():
+    return current_app.config.get('ROOM_CACHE_TTL', DEFAULT_TTL)
+
+
+def generation():
+    """Geração atual; capture antes de consultar o banco e passe para store_page"""
+    return cache.generation(GENERATION)
+
+
+def _room_id(link_code):
+    return cache.get(f'codigo:{link_code}')
+
+
+def get_page(link_code):
+    """Retorna a página anônima da sala já renderizada, se existir"""
+    room_id = _room_id(link_code)
+    entry = cache.get(f'pagina:{room_id}') if room_id is not None else None
+    if entry is None:
+        return None
+    return CachedPage(
+        body=entry['body'],
+        etag=entry['etag'],
+        last_modified=datetime.fromisoformat(entry['last_modified'])
+    )
+
+
+def store_page(room, page, generation_before):
+    """Guarda a página renderizada, a menos que a sala tenha mudado durante a renderização"""
+    if cache.generation(GENERATION) != generation_before:
+        return
+    cache.set(f'codigo:{room.link_code}', room.id, ttl=_ttl())
+    cache.set(f'pagina:{room.id}', {
+        'body': page.body,
+        'etag': page.etag,
+        'last_modified': page.last_modified.isoformat()
+    }, ttl=_ttl())
+
+
+def get_snapshot(link_code):
+    """Retorna o retrato da lista de participantes da sala, se estiver em cache"""
+    room_id = _room_id(link_code)
+    return cache.get(f'retrato:{room_id}') if room_id is not None else None
+
+
+def store_snapshot(room_id, link_code, snapshot, generation_before):
+    if snapshot is None or cache.generation(GENERATION) != generation_before:
+        return
+    cache.set(f'codigo:{link_code}', room_id, ttl=_ttl())
+    cache.set(f'retrato:{room_id}', snapshot, ttl=_ttl())
+
+
+@on_change
+def invalidate(changes):
+    """Remove as páginas e retratos das salas alteradas no commit"""
+    if not changes.room_ids:
+        return
+
+    # As entradas são indexadas pelo id da sala, que é o que os listeners conhecem;
+    # o mapeamento link_code -> id pode continuar, pois não muda
+    cache.bump(GENERATION)
+    for room_id in changes.room_ids:
+        cache.delete(f'pagina:{room_id}')
+        cache.delete(f'retrato:{room_id}')
@@ -0,0 +1,138 @@
+"""
+Agenda das quadras: séries recorrentes e busca de horários livres
+
+Gera as ocorrências de uma regra de recorrência e verifica todas contra as
+reservas existentes da quadra de uma só vez: uma única consulta busca as
+reservas do período inteiro da série e a sobreposição é verificada em memória
+sobre a lista ordenada por horário de início (busca binária), em vez de uma
+consulta de disponibilidade por ocorrência.
+
+A busca de horários segue a mesma ideia: as reservas de todas as quadras
+candidatas vêm de uma consulta só, os intervalos livres de cada quadra são
+calculados em memória e os candidatos de todas as quadras são intercalados já
+em ordem, parando assim que houver resultados suficientes.
+"""
+
+import heapq
+from bisect import bisect_left
+from datetime import datetime, timedelta
+from itertools import islice
+
+# Limite de ocorrências por série (dois anos de jogos semanais)
+MAX_OCCURRENCES = 104
+
+
+def weekly_occurrences(start, count=None, until=None, interval_weeks=1):
+    """Lista os horários de início de uma série semanal
+
+    A série termina após `count` ocorrências ou na data `until` (inclusive),
+    o que vier primeiro, e nunca passa de MAX_OCCURRENCES.
+    """
+    if count is None and until is None:
+        raise ValueError('Informe o número de ocorrências ou a data final da série')
+    if interval_weeks < 1:
+        raise ValueError('O intervalo da série deve ser de pelo menos uma semana')
+
+    limit = min(count or MAX_OCCURRENCES, MAX_OCCURRENCES)
+    if isinstance(until, datetime):
+        until = until.date()
+
+    step = timedelta(weeks=interval_weeks)
+    occurrences = []
+    current = start
+    while len(occurrences) < limit and (until is None or current.date() <= until):
+        occurrences.append(current)
+        current += step
+    return occurrences
+
+
+def find_overlaps(intervals, reservations):
+    """Associa a cada intervalo as reservas que se sobrepõem a ele
+
+    `intervals` é uma lista de (início, fim); `reservations` é uma lista de
+    tuplas (início, fim, ...). Retorna uma lista paralela a `intervals` com as
+    reservas conflitantes de cada intervalo (lista vazia quando está livre).
+    """
+    reservations = sorted(reservations, key=lambda reservation: reservation[0])
+    starts = [reservation[0] for reservation in reservations]
+    # Nenhuma reserva começa mais cedo que (início do intervalo - maior duração) e ainda o alcança
+    longest = max((reservation[1] - reservation[0] for reservation in reservations), default=timedelta(0))
+
+    overlaps = []
+    for start, end in intervals:
+        first = bisect_left(starts, start - longest)
+        last = bisect_left(starts, end)
+        overlaps.append([
+            reservation for reservation in reservations[first:last]
+            if reservation[1] > start
+        ])
+    return overlaps
+
+
+class BusySchedule:
+    """Reservas (início, fim) de uma quadra, ordenadas, que aceitam novas reservas uma a uma
+
+    Usada quando muitas reservas são verificadas e adicionadas em sequência (ex.:
+    importação em lote): cada verificação é uma busca binária, como em
+    find_overlaps, sem reordenar a lista a cada nova reserva.
+    """
+
+    def __init__(self, reservations=()):
+        self._reservations = sorted((start, end) for start, end, *_ in reservations)
+        self._starts = [start for start, _ in self._reservations]
+        self._longest = max((end - start for start, end in self._reservations), default=timedelta(0))
+
+    def conflicts(self, start, end):
+        first = bisect_left(self._starts, start - self._longest)
+        last = bisect_left(self._starts, end)
+        return [reservation for reservation in self._reservations[first:last] if reservation[1] > start]
+
+    def add(self, start, end):
+        index = bisect_left(self._starts, start)
+        self._starts.insert(index, start)
+        self._reservations.insert(index, (start, end))
+        self._longest = max(self._longest, end - start)
+
+
+def free_intervals(window_start, window_end, busy):
+    """Retorna os intervalos livres da janela, dadas as reservas (início, fim) da quadra"""
+    free = []
+    cursor = window_start
+    for start, end in sorted(busy):
+        if start > cursor:
+            free.append((cursor, min(start, window_end)))
+        cursor = max(cursor, end)
+        if cursor >= window_end:
+            break
+    if cursor < window_end:
+        free.append((cursor, window_end))
+    return [(start, end) for start, end in free if start < end]
+
+
+def candidate_starts(window_start, free, duration, step):
+    """Gera, em ordem, os horários de início (alinhados a `step` desde o início da janela) que cabem nos intervalos livres"""
+    for start, end in free:
+        # Primeiro horário alinhado dentro do intervalo livre
+        offset = (start - window_start) % step
+        candidate = start if not offset else start + (step - offset)
+        while candidate + duration <= end:
+            yield candidate
+            candidate += step
+
+
+def best_slots(courts, busy_by_court, window_start, window_end, duration, step=timedelta(minutes=30), limit=10):
+    """Ordena os horários livres de todas as quadras pelo horário de início e depois pelo preço
+
+    `courts` é uma lista de (id, preço total, dados da quadra) e `busy_by_court`
+    mapeia o id da quadra para suas reservas (início, fim) na janela. Como cada
+    quadra gera seus candidatos já em ordem, heapq.merge intercala os geradores
+    sob demanda e a busca termina ao atingir `limit`.
+    """
+    def court_candidates(court_id, price, court):
+        free = free_intervals(window_start, window_end, busy_by_court.get(court_id, ()))
+        for start in candidate_starts(window_start, free, duration, step):
+            yield start, price, court_id, court
+
+    streams = [court_candidates(court_id, price, court) for court_id, price, court in courts]
+    merged = heapq.merge(*streams, key=lambda candidate: candidate[:3])
+    return list(islice(merged, limit))
@@ -0,0 +1,181 @@
+"""
+Busca textual de salas
+
+No SQLite usamos uma tabela virtual FTS5 (rooms_fts) sobre nome, descrição,
+local, cidade e esporte, com tokenização que ignora acentos e ordenação por
+BM25. A tabela aponta para `rooms` (external content) e é mantida em dia por
+triggers, então qualquer escrita (ORM, Core ou SQL direto) já é indexada.
+
+Com PostgreSQL a busca usa to_tsvector/ts_rank sobre as mesmas colunas. Para
+ignorar acentos, crie uma configuração de busca com o dicionário unaccent e
+informe-a em SEARCH_PG_CONFIG.
+
+Se o SQLite não tiver FTS5, a busca cai para LIKE em todas as colunas.
+
+Com partições por cidade (app/utils/partitions.py) cada partição tem o seu
+índice; a busca consulta todas e junta os resultados pela relevância.
+"""
+
+import logging
+import re
+
+from flask import current_app
+
+from app import db
+from app.utils import partitions
+
+logger = logging.getLogger(__name__)
+
+# Máximo de salas retornadas por busca
+MAX_RESULTS = 200
+
+# Pesos do BM25 por coluna: nome, descrição, local, cidade, esporte
+BM25_WEIGHTS = (10.0, 1.0, 4.0, 4.0, 6.0)
+
+FTS_COLUMNS = ('name', 'description', 'location', 'city', 'sport')
+
+_FTS_SCHEMA = [
+    '''CREATE VIRTUAL TABLE IF NOT EXISTS rooms_fts USING fts5(
+        name, description, location, city, sport,
+        content='rooms', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )''',
+    '''CREATE TRIGGER IF NOT EXISTS rooms_fts_ai AFTER INSERT ON rooms BEGIN
+        INSERT INTO rooms_fts(rowid, name, description, location, city, sport)
+        VALUES (new.id, new.name, new.description, new.location, new.city, new.sport);
+    END''',
+    '''CREATE TRIGGER IF NOT EXISTS rooms_fts_ad AFTER DELETE ON rooms BEGIN
+        INSERT INTO rooms_fts(rooms_fts, rowid, name, description, location, city, sport)
+        VALUES ('delete', old.id, old.name, old.description, old.location, old.city, old.sport);
+    END''',
+    '''CREATE TRIGGER IF NOT EXISTS rooms_fts_au AFTER UPDATE OF name, description, location, city, sport ON rooms BEGIN
+        INSERT INTO rooms_fts(rooms_fts, rowid, name, description, location, city, sport)
+        VALUES ('delete', old.id, old.name, old.description, old.location, old.city, old.sport);
+        INSERT INTO rooms_fts(rowid, name, description, location, city, sport)
+        VALUES (new.id, new.name, new.description, new.location, new.city, new.sport);
+    END''',
+]
+
+# Backend escolhido por banco: 'fts5', 'postgresql' ou 'like'
+_backends = {}
+
+
+def normalize_query(text):
+    """Normaliza o texto da busca (usado também na chave dos caches)"""
+    return ' '.join((text or '').lower().split())
+
+
+def _terms(text):
+    return re.findall(r'\w+', normalize_query(text))
+
+
+def setup():
+    """Cria a tabela FTS5 e os triggers em cada banco (idempotente); chamada na criação da aplicação"""
+    for name in partitions.names():
+        _setup(partitions.engine(name))
+
+
+def _setup(engine):
+    if engine.dialect.name == 'postgresql':
+        _backends[engine.url] = 'postgresql'
+        return
+    if engine.dialect.name != 'sqlite':
+        _backends[engine.url] = 'like'
+        return
+
+    try:
+        with engine.begin() as connection:
+            exists = connection.execute(db.text(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'rooms_fts'"
+            )).scalar()
+            for statement in _FTS_SCHEMA:
+                connection.execute(db.text(statement))
+            if not exists:
+                # Indexa as salas que já existiam
+                connection.execute(db.text("INSERT INTO rooms_fts(rooms_fts) VALUES ('rebuild')"))
+        _backends[engine.url] = 'fts5'
+    except Exception:
+        logger.warning('FTS5 indisponível neste SQLite; a busca usará LIKE', exc_info=True)
+        _backends[engine.url] = 'like'
+
+
+def rebuild():
+    """Reconstrói o índice FTS5 a partir da tabela rooms"""
+    for _ in partitions.each():
+        if backend() == 'fts5':
+            db.session.execute(db.text("INSERT INTO rooms_fts(rooms_fts) VALUES ('rebuild')"))
+    db.session.commit()
+
+
+def backend():
+    """Backend do banco da partição atual (a principal fora de partitions.scope())"""
+    return _backends.get(partitions.engine().url, 'like')
+
+
+def search_room_ids(text, city=None, sport_ids=None, limit=MAX_RESULTS):
+    """Retorna os ids das salas públicas ativas que correspondem ao texto, da mais para a menos relevante
+
+    Os filtros da listagem (cidade e ids de esporte) são aplicados antes do
+    limite, para que salas encerradas, privadas ou de outra cidade não ocupem
+    as vagas dos resultados.
+    """
+    terms = _terms(text)
+    if not terms:
+        return []
+
+    ranked = []
+    for _ in partitions.each():
+        ranked += _ranked_ids(terms, city, sport_ids, limit)
+    return [row[0] for row in partitions.ordered(ranked, key=lambda row: row[1], limit=limit)]
+
+
+def _listing_filters(city, sport_ids):
+    """Condições SQL (sobre rooms) e parâmetros equivalentes aos filtros da listagem"""
+    conditions = ['rooms.is_active = :active', 'rooms.is_private = :private']
+    params = {'active': True, 'private': False}
+    if city:
+        conditions.append('rooms.city = :city')
+        params['city'] = city
+    if sport_ids is not None:
+        conditions.append('rooms.sport_id IN :sport_ids')
+        params['sport_ids'] = list(sport_ids)
+    return ' AND '.join(conditions), params
+
+
+def _ranked_ids(terms, city, sport_ids, limit):
+    """(id, ordem) das salas encontradas no banco atual; ordem crescente = mais relevante"""
+    kind = backend()
+    conditions, params = _listing_filters(city, sport_ids)
+    expanding = [db.bindparam('sport_ids', expanding=True)] if 'sport_ids' in params else []
+    if kind == 'fts5':
+        # Cada termo entre aspas (sem operadores do usuário) e como prefixo: "copa" encontra "copacabana"
+        match = ' '.join(f'"{term}"*' for term in terms)
+        weights = ', '.join(str(weight) for weight in BM25_WEIGHTS)
+        return db.session.execute(db.text(
+            f'SELECT rooms_fts.rowid, bm25(rooms_fts, {weights}) AS relevancia '
+            f'FROM rooms_fts JOIN rooms ON rooms.id = rooms_fts.rowid '
+            f'WHERE rooms_fts MATCH :match AND {conditions} '
+            f'ORDER BY relevancia LIMIT :limit'
+        ).bindparams(*expanding), {'match': match, 'limit': limit, **params}).fetchall()
+
+    if kind == 'postgresql':
+        config = current_app.config.get('SEARCH_PG_CONFIG', 'portuguese')
+        document = " || ' ' || ".join(f"coalesce({column}, '')" for column in FTS_COLUMNS)
+        return db.session.execute(db.text(
+            f'SELECT id, -ts_rank(to_tsvector(CAST(:config AS regconfig), {document}), query) AS relevancia '
+            f'FROM rooms, plainto_tsquery(CAST(:config AS regconfig), :query) AS query '
+            f'WHERE to_tsvector(CAST(:config AS regconfig), {document}) @@ query AND {conditions} '
+            f'ORDER BY relevancia LIMIT :limit'
+        ).bindparams(*expanding), {'config': config, 'query': ' '.join(terms), 'limit': limit, **params}).fetchall()
+
+    from app.models.models import Room
+    query = db.session.query(Room.id).filter(Room.is_active == True, Room.is_private == False)
+    if city:
+        query = query.filter(Room.city == city)
+    if sport_ids is not None:
+        query = query.filter(Room.sport_id.in_(sport_ids))
+    for term in terms:
+        query = query.filter(db.or_(*[
+            getattr(Room, column).ilike(f'%{term}%') for column in FTS_COLUMNS
+        ]))
+    return query.add_columns(Room.date).order_by(Room.date).limit(limit).all()
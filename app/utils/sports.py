@@ -0,0 +1,185 @@
+"""
+Catálogo de esportes
+
+Os esportes são digitados livremente ("Vôlei", "volei", "Voleibol"...). Aqui
+normalizamos o texto (sem acentos, minúsculo) e o associamos a um registro da
+tabela sports, diretamente ou por um apelido. O sport_id de salas e quadras é
+preenchido no flush, então filtros viram comparações de inteiros indexadas e as
+estatísticas agrupam por id.
+
+O catálogo é pequeno e muda pouco: fica em memória, e a busca por parte do nome
+(que antes era um ILIKE '%x%' sobre todas as salas) é feita sobre ele.
+"""
+
+import re
+import unicodedata
+
+from sqlalchemy import event, inspect
+
+from app import db
+from app.utils import cache
+
+# Tempo (segundos) até recarregar o catálogo, para enxergar esportes criados por outros processos
+CATALOGUE_TTL = 300
+
+# Esportes e apelidos cadastrados na migração e em bancos novos
+DEFAULT_SPORTS = [
+    ('Futebol', ['futebol de campo', 'soccer']),
+    ('Futsal', ['futebol de salao']),
+    ('Society', ['futebol society', 'fut7', 'futebol 7']),
+    ('Vôlei', ['volei', 'voleibol', 'volleyball']),
+    ('Vôlei de Praia', ['volei de praia', 'beach volley']),
+    ('Futevôlei', ['futevolei']),
+    ('Basquete', ['basquetebol', 'basketball', 'basquete 3x3']),
+    ('Handebol', ['handball']),
+    ('Tênis', ['tenis', 'tennis']),
+    ('Beach Tennis', ['beach tenis']),
+    ('Padel', ['padle']),
+]
+
+_catalogue_cache = cache.register('esportes', max_entries=1, ttl=CATALOGUE_TTL)
+
+
+def normalize(text):
+    """Normaliza o nome de um esporte: sem acentos, minúsculo, espaços simples"""
+    if not text:
+        return ''
+    text = unicodedata.normalize('NFKD', text)
+    text = ''.join(char for char in text if not unicodedata.combining(char))
+    return re.sub(r'[^a-z0-9]+', ' ', text.lower()).strip()
+
+
+def catalogue():
+    """Retorna {slug ou apelido: sport_id} com todo o catálogo"""
+    from app.models.models import Sport, SportAlias
+
+    entries = _catalogue_cache.get('catalogue')
+    if entries is None:
+        with db.session.no_autoflush:
+            entries = dict(db.session.query(Sport.slug, Sport.id).all())
+            entries.update(db.session.query(SportAlias.slug, SportAlias.sport_id).all())
+        _catalogue_cache.set('catalogue', entries)
+    return entries
+
+
+def lookup(text):
+    """Retorna o id do esporte com esse nome ou apelido, ou None"""
+    return catalogue().get(normalize(text))
+
+
+def display_name(text):
+    """Nome do catálogo do esporte com esse nome ou apelido; sem correspondência exata, o texto normalizado"""
+    from app.models.models import Sport
+
+    sport_id = lookup(text)
+    sport = db.session.get(Sport, sport_id) if sport_id is not None else None
+    return sport.name if sport is not None else normalize(text)
+
+
+def matching_ids(text):
+    """Ids dos esportes cujo nome ou apelido contém o texto (ignorando acentos e maiúsculas)"""
+    term = normalize(text)
+    if not term:
+        return []
+    return sorted({sport_id for slug, sport_id in catalogue().items() if term in slug})
+
+
+def _resolve(session, text, created):
+    """Retorna o id ou o objeto Sport correspondente ao texto, criando o esporte se necessário"""
+    from app.models.models import Sport, SportAlias
+
+    slug = normalize(text)
+    if not slug:
+        return None
+
+    sport_id = catalogue().get(slug)
+    if sport_id is not None:
+        return sport_id
+
+    if slug in created:
+        return created[slug]
+
+    # O catálogo em memória pode estar desatualizado (esporte criado por outro processo)
+    with session.no_autoflush:
+        sport_id = session.query(Sport.id).filter(Sport.slug == slug).scalar() or \
+            session.query(SportAlias.sport_id).filter(SportAlias.slug == slug).scalar()
+    if sport_id is not None:
+        return sport_id
+
+    sport = Sport(name=text.strip()[:50], slug=slug[:50])
+    session.add(sport)
+    created[slug] = sport
+    return sport
+
+
+def resolve(text):
+    """Retorna o id do esporte correspondente ao texto, cadastrando-o se ainda não existir"""
+    resolved = _resolve(db.session, text, {})
+    if resolved is None or isinstance(resolved, int):
+        return resolved
+    db.session.flush()
+    session_created = db.session.info.setdefault('sports_created', {})
+    session_created[resolved.slug] = resolved
+    return resolved.id
+
+
+def _assign(obj, text_attr, session, created):
+    state = inspect(obj)
+    if obj.sport_id is not None and not state.attrs[text_attr].history.has_changes():
+        return
+
+    resolved = _resolve(session, getattr(obj, text_attr), created)
+    if resolved is None or isinstance(resolved, int):
+        obj.sport_id = resolved
+    else:
+        obj.sport_ref = resolved
+
+
+def _assign_sport_ids(session, flush_context, instances):
+    """Preenche o sport_id de salas e quadras novas ou com o esporte alterado"""
+    from app.models.models import Room, Court
+
+    created = session.info.setdefault('sports_created', {})
+    for obj in list(session.new) + list(session.dirty):
+        if isinstance(obj, Room):
+            _assign(obj, 'sport', session, created)
+        elif isinstance(obj, Court):
+            _assign(obj, 'sport_type', session, created)
+
+
+def _refresh_catalogue(session):
+    if session.info.pop('sports_created', None):
+        _catalogue_cache.clear()
+
+
+def _discard(session):
+    session.info.pop('sports_created', None)
+
+
+def seed_defaults():
+    """Cadastra os esportes e apelidos padrão que ainda não existem (idempotente)"""
+    from app.models.models import Sport, SportAlias
+
+    existing = set(catalogue())
+    for name, aliases in DEFAULT_SPORTS:
+        slug = normalize(name)
+        sport = Sport.query.filter_by(slug=slug).first()
+        if sport is None:
+            sport = Sport(name=name, slug=slug)
+            db.session.add(sport)
+        for alias in aliases:
+            alias_slug = normalize(alias)
+            if alias_slug != slug and alias_slug not in existing:
+                db.session.add(SportAlias(alias_slug, sport))
+                existing.add(alias_slug)
+    db.session.commit()
+    _catalogue_cache.clear()
+
+
+def init_app(app):
+    """Registra os listeners na sessão do Flask-SQLAlchemy (apenas uma vez)"""
+    if event.contains(db.session, 'before_flush', _assign_sport_ids):
+        return
+    event.listen(db.session, 'before_flush', _assign_sport_ids)
+    event.listen(db.session, 'after_commit', _refresh_catalogue)
+    event.listen(db.session, 'after_rollback', _discard)
@@ -0,0 +1,237 @@
+"""
+Sequência de alterações para sincronização incremental dos painéis
+
+Toda transação que grava quadras, salas ou participantes reserva o próximo
+número de um contador global (tabela change_sequence) e o grava na coluna
+change_seq das linhas alteradas; exclusões deixam uma lápide (tombstones)
+com o mesmo número. O contador fica travado pela transação até o commit, de
+forma que as sequências ficam visíveis na ordem em que foram reservadas: um
+painel que já leu até N recebe tudo o que mudou depois pedindo `since=N`.
+
+Escritas pelo ORM são marcadas automaticamente antes do flush. Caminhos que
+escrevem via Core devem incluir change_seq=next_value() nos valores e chamar
+record_deleted() antes de excluir linhas.
+
+As lápides mais antigas que TOMBSTONE_RETENTION_DAYS são descartadas pelo
+arquivamento; um `since` anterior ao descarte pede a carga completa (reset).
+
+Com partições por cidade (app/utils/partitions.py) cada partição tem o seu
+contador, e a sequência enviada aos painéis vira um token com o valor de
+cada uma ("0:12,1:40"); sem partições ela continua sendo um inteiro.
+"""
+
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import event
+
+from app import db
+from app.utils import partitions
+
+SEQUENCE = 'alteracoes'
+PRUNED = 'podadas'
+
+DEFAULT_RETENTION_DAYS = 7
+
+
+def _tracked():
+    from app.models.models import Court, Participant, Room
+    return Court, Room, Participant
+
+
+def setup():
+    """Cria as linhas dos contadores em cada partição (idempotente); chamada na criação da aplicação"""
+    from app.models.models import change_sequence
+
+    for _ in partitions.each():
+        existing = {row[0] for row in db.session.execute(db.select([change_sequence.c.name]))}
+        missing = [{'name': name, 'value': 0} for name in (SEQUENCE, PRUNED) if name not in existing]
+        if missing:
+            db.session.execute(change_sequence.insert(), missing)
+    db.session.commit()
+
+
+def _value(connection, name):
+    from app.models.models import change_sequence
+
+    return connection.execute(
+        db.select([change_sequence.c.value]).where(change_sequence.c.name == name)
+    ).scalar() or 0
+
+
+def _returning(dialect):
+    """True se o banco aceita UPDATE ... RETURNING (SQLite a partir da 3.35)"""
+    if dialect.name == 'sqlite':
+        return dialect.dbapi.sqlite_version_info >= (3, 35)
+    return dialect.name == 'postgresql'
+
+
+def next_value(session=None, partition=None):
+    """Sequência da transação atual na partição (a do scope() ativo por padrão), reservada na primeira
+    escrita (trava o contador até o commit)"""
+    from app.models.models import change_sequence
+
+    session = session or db.session
+    partition = partition or partitions.current()
+    values = session.info.setdefault('change_seq', {})
+    value = values.get(partition)
+    if value is None:
+        # Pela conexão, para não disparar um autoflush dentro do before_flush
+        connection = partitions.connection(session, partition)
+        if _returning(connection.dialect):
+            # Uma instrução só: o contador fica travado pelo menor tempo possível
+            value = connection.execute(db.text(
+                'UPDATE change_sequence SET value = value + 1 WHERE name = :name RETURNING value'
+            ), {'name': SEQUENCE}).scalar()
+        else:
+            connection.execute(
+                change_sequence.update().where(
+                    change_sequence.c.name == SEQUENCE
+                ).values(value=change_sequence.c.value + 1)
+            )
+            value = _value(connection, SEQUENCE)
+        values[partition] = value
+    return value
+
+
+def current():
+    """Última sequência confirmada em cada partição ({número: valor}); leia antes de consultar as linhas"""
+    return {partitions.number(name): _value(db.session, SEQUENCE) for name in partitions.each()}
+
+
+def pruned_until():
+    """Sequência até a qual as lápides já foram descartadas, por partição"""
+    return {partitions.number(name): _value(db.session, PRUNED) for name in partitions.each()}
+
+
+def token(seqs):
+    """Sequência enviada aos clientes: o inteiro, sem partições; senão 'número:valor' separados por vírgula"""
+    if list(seqs) == [0]:
+        return seqs[0]
+    return ','.join(f'{numero}:{value}' for numero, value in sorted(seqs.items()))
+
+
+def record_deleted(table, condition):
+    """Grava lápides para as linhas de `table` que satisfazem `condition` (chamar antes do DELETE via Core)"""
+    from app.models.models import Tombstone
+
+    seq = next_value()
+    room_id = table.c.room_id if 'room_id' in table.c else db.literal(None, db.Integer)
+    db.session.execute(Tombstone.__table__.insert().from_select(
+        ['table_name', 'row_id', 'room_id', 'change_seq', 'deleted_at'],
+        db.select([
+            db.literal(table.name), table.c.id, room_id, db.literal(seq),
+            db.literal(datetime.utcnow(), db.DateTime)
+        ]).where(condition)
+    ))
+
+
+def changed_since(model, since):
+    """Condição das linhas do modelo alteradas depois de `since`"""
+    return partitions.split(model.id, lambda numero: model.change_seq > since.get(numero, 0))
+
+
+def deleted_since(table_name, since, room_id=None):
+    """Ids excluídos da tabela depois de `since` (participantes: opcionalmente de uma sala)"""
+    from app.models.models import Tombstone
+
+    query = db.session.query(db.distinct(Tombstone.row_id)).filter(
+        Tombstone.table_name == table_name,
+        partitions.split(Tombstone.row_id, lambda numero: Tombstone.change_seq > since.get(numero, 0))
+    )
+    if room_id is not None:
+        query = query.filter(Tombstone.room_id == room_id)
+    return [row[0] for row in query]
+
+
+def rooms_touched_since(since):
+    """Consulta dos ids de salas alteradas depois de `since`, inclusive por mudanças nos participantes"""
+    from app.models.models import Participant, Room, Tombstone
+
+    return db.union(
+        db.select([Room.id]).where(changed_since(Room, since)),
+        db.select([Participant.room_id]).where(changed_since(Participant, since)),
+        db.select([Tombstone.room_id]).where(
+            Tombstone.table_name == 'participants',
+            partitions.split(Tombstone.row_id, lambda numero: Tombstone.change_seq > since.get(numero, 0))
+        )
+    )
+
+
+def parse_since(raw):
+    """Valor de `since=` como {número da partição: sequência} (None se ausente); ValueError se inválido
+
+    Aceita o inteiro (partição principal) ou o token de token().
+    """
+    if raw in (None, ''):
+        return None
+    if ':' in raw:
+        since = {}
+        for part in raw.split(','):
+            numero, value = part.split(':')
+            since[int(numero)] = int(value)
+    else:
+        since = {0: int(raw)}
+    if any(value < 0 for value in since.values()):
+        raise ValueError('since deve ser um número não negativo')
+    return since
+
+
+def needs_reset(since):
+    """True se falta alguma partição em `since` ou se as lápides posteriores já foram descartadas
+    (o cliente deve recarregar tudo)"""
+    return any(numero not in since or since[numero] < value for numero, value in pruned_until().items())
+
+
+def prune(retention_days=None):
+    """Descarta as lápides antigas e registra até qual sequência elas foram descartadas"""
+    from app.models.models import Tombstone, change_sequence
+
+    if retention_days is None:
+        retention_days = current_app.config.get('TOMBSTONE_RETENTION_DAYS', DEFAULT_RETENTION_DAYS)
+    cutoff = datetime.utcnow() - timedelta(days=retention_days)
+    removed = 0
+    for _ in partitions.each():
+        horizon = db.session.query(db.func.max(Tombstone.change_seq)).filter(Tombstone.deleted_at < cutoff).scalar()
+        if horizon is None:
+            continue
+        removed += db.session.query(Tombstone).filter(
+            Tombstone.change_seq <= horizon
+        ).delete(synchronize_session=False)
+        db.session.execute(
+            change_sequence.update().where(
+                change_sequence.c.name == PRUNED,
+                change_sequence.c.value < horizon
+            ).values(value=horizon)
+        )
+    db.session.commit()
+    return removed
+
+
+def _stamp(session, flush_context, instances):
+    from app.models.models import Tombstone
+
+    tracked = _tracked()
+    for obj in session.new:
+        if isinstance(obj, tracked):
+            obj.change_seq = next_value(session, partitions.for_instance(obj))
+    for obj in session.dirty:
+        if isinstance(obj, tracked) and session.is_modified(obj, include_collections=False):
+            obj.change_seq = next_value(session, partitions.for_instance(obj))
+    for obj in session.deleted:
+        if isinstance(obj, tracked) and obj.id is not None:
+            seq = next_value(session, partitions.for_instance(obj))
+            session.add(Tombstone(obj.__tablename__, obj.id, seq, getattr(obj, 'room_id', None)))
+
+
+def _reset(session):
+    session.info.pop('change_seq', None)
+
+
+def init_app(app):
+    """Registra os listeners na sessão do Flask-SQLAlchemy (apenas uma vez)"""
+    if event.contains(db.session, 'before_flush', _stamp):
+        return
+    event.listen(db.session, 'before_flush', _stamp)
+    event.listen(db.session, 'after_commit', _reset)
+    event.listen(db.session, 'after_rollback', _reset)
@@ -0,0 +1,51 @@
+"""
+Tarefas registradas na fila de segundo plano
+"""
+
+from app.utils.jobs import task
+from app.utils import archive, estatisticas, notifications, sync
+from app.utils.cities import get_cities_from_api
+
+
+@task('cidades.atualizar')
+def atualizar_cidades():
+    """Baixa a lista de cidades do IBGE e regrava o cache local"""
+    cities = get_cities_from_api()
+    return {'total': len(cities)}
+
+
+@task('estatisticas.resumo')
+def estatisticas_resumo():
+    return estatisticas.resumo()
+
+
+@task('estatisticas.esportes')
+def estatisticas_esportes():
+    return estatisticas.esportes()
+
+
+@task('estatisticas.jogadores')
+def estatisticas_jogadores():
+    return estatisticas.jogadores()
+
+
+@task('estatisticas.financeiro')
+def estatisticas_financeiro():
+    return estatisticas.financeiro()
+
+
+@task(archive.TASK_NAME)
+def arquivar_salas_antigas():
+    """Move salas antigas para o arquivo em lotes e agenda a próxima execução"""
+    result = archive.archive_old(max_batches=archive.MAX_BATCHES_PER_JOB)
+    # Lápides antigas da sincronização incremental saem junto
+    result['lapides'] = sync.prune()
+    # Continua logo em seguida se ainda houver atraso; senão, no próximo intervalo
+    archive.schedule(delay=0 if not result['done'] else None)
+    return result
+
+
+@task(notifications.TASK_NAME, max_attempts=5)
+def enviar_notificacoes():
+    """Envia os avisos de promoção pendentes, agrupados por usuário"""
+    return notifications.deliver()
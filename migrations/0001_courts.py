@@ -0,0 +1,40 @@
+"""Cria a tabela courts e liga as salas às quadras"""
+
+from app import db
+from app.utils.migrations import add_column, has_table
+
+# Colunas que bancos antigos de courts podem não ter
+COURT_COLUMNS = {
+    'sport_type': "VARCHAR(50) NOT NULL DEFAULT 'Outros'",
+    'hourly_price': 'FLOAT NOT NULL DEFAULT 0.0',
+    'valor_hora': 'FLOAT NOT NULL DEFAULT 0.0',
+    'type': "VARCHAR(50) NOT NULL DEFAULT 'default'",
+    'city': "VARCHAR(100) NOT NULL DEFAULT 'Cidade'",
+    'is_active': 'BOOLEAN DEFAULT 1',
+    'created_at': 'TIMESTAMP',
+    'capacity': 'INTEGER NOT NULL DEFAULT 10'
+}
+
+def upgrade():
+    # Cria a tabela de quadras, se ainda não existir
+    if not has_table('courts'):
+        db.engine.execute('''
+            CREATE TABLE courts (
+                id INTEGER PRIMARY KEY,
+                name VARCHAR(100) NOT NULL,
+                location VARCHAR(200),
+                description TEXT
+            )
+        ''')
+    for column, definition in COURT_COLUMNS.items():
+        add_column('courts', column, definition)
+    
+    # Campos de integração das salas com as quadras
+    add_column('rooms', 'court_id', 'INTEGER REFERENCES courts(id)')
+    add_column('rooms', 'duration_hours', 'FLOAT NOT NULL DEFAULT 1.0')
+    add_column('rooms', 'end_time', 'TIMESTAMP')
+
+def downgrade():
+    # Remove a ligação das salas com as quadras (a tabela courts é mantida)
+    for column in ('end_time', 'duration_hours', 'court_id'):
+        db.engine.execute(f'ALTER TABLE rooms DROP COLUMN {column}')
@@ -0,0 +1,13 @@
+"""Adiciona privacidade, local e cidade às salas"""
+
+from app import db
+from app.utils.migrations import add_column
+
+def upgrade():
+    add_column('rooms', 'is_private', 'BOOLEAN DEFAULT 0')
+    add_column('rooms', 'location', 'TEXT')
+    add_column('rooms', 'city', "TEXT DEFAULT 'Não informada'")
+
+def downgrade():
+    for column in ('city', 'location', 'is_private'):
+        db.engine.execute(f'ALTER TABLE rooms DROP COLUMN {column}')
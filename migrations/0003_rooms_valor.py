@@ -0,0 +1,12 @@
+"""Adiciona o valor por participante às salas"""
+
+from app import db
+from app.utils.migrations import add_column
+
+def upgrade():
+    # Adiciona a coluna valor à tabela rooms
+    add_column('rooms', 'valor', 'FLOAT DEFAULT 0.0')
+
+def downgrade():
+    # Remove a coluna valor da tabela rooms
+    db.engine.execute('ALTER TABLE rooms DROP COLUMN valor')
@@ -0,0 +1,21 @@
+"""Garante uma única participação ativa por usuário e sala"""
+
+from app import db
+
+def upgrade():
+    # Desativa participações ativas duplicadas, mantendo a inscrição mais antiga
+    db.engine.execute('''
+        UPDATE participants SET is_active = 0
+        WHERE is_active = 1 AND id NOT IN (
+            SELECT MIN(id) FROM participants WHERE is_active = 1 GROUP BY user_id, room_id
+        )
+    ''')
+    # Garante uma única participação ativa por usuário e sala
+    db.engine.execute(
+        'CREATE UNIQUE INDEX IF NOT EXISTS ix_participants_active_user_room '
+        'ON participants (user_id, room_id) WHERE is_active = 1'
+    )
+
+def downgrade():
+    # Remove o índice único parcial
+    db.engine.execute('DROP INDEX IF EXISTS ix_participants_active_user_room')
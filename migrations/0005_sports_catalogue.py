@@ -0,0 +1,49 @@
+"""Cria o catálogo de esportes e liga salas e quadras a ele"""
+
+from sqlalchemy import inspect
+
+from app import db
+from app.utils import sports
+from app.utils.migrations import backfill
+
+TABLES = (('rooms', 'sport'), ('courts', 'sport_type'))
+
+def upgrade():
+    # Cria as tabelas sports e sport_aliases
+    db.create_all()
+    
+    # Adiciona a referência ao catálogo em salas e quadras
+    for table, _ in TABLES:
+        columns = [column['name'] for column in inspect(db.engine).get_columns(table)]
+        if 'sport_id' not in columns:
+            db.engine.execute(f'ALTER TABLE {table} ADD COLUMN sport_id INTEGER REFERENCES sports(id)')
+        db.engine.execute(f'CREATE INDEX IF NOT EXISTS ix_{table}_sport_id ON {table} (sport_id)')
+    
+    # Cadastra o catálogo padrão e mapeia os textos livres já existentes
+    sports.seed_defaults()
+    for table, column in TABLES:
+        textos_por_esporte = {}
+        for (texto,) in db.session.execute(f'SELECT DISTINCT {column} FROM {table} WHERE sport_id IS NULL'):
+            sport_id = sports.resolve(texto)
+            if sport_id is not None:
+                textos_por_esporte.setdefault(sport_id, []).append(texto)
+            print(f'{table}: "{texto}" -> esporte {sport_id}')
+        db.session.commit()
+        
+        # Um backfill por esporte (faixas de id com checkpoint), com todos os textos que levam a ele
+        for sport_id, textos in sorted(textos_por_esporte.items()):
+            nomes = ', '.join(f':texto{index}' for index in range(len(textos)))
+            backfill(
+                f'0005:{table}_sport_id:{sport_id}', table,
+                'sport_id = :sport_id',
+                where=f'sport_id IS NULL AND {column} IN ({nomes})',
+                params=dict({f'texto{index}': texto for index, texto in enumerate(textos)}, sport_id=sport_id)
+            )
+
+def downgrade():
+    # Remove a referência ao catálogo e as tabelas do catálogo
+    for table, _ in TABLES:
+        db.engine.execute(f'DROP INDEX IF EXISTS ix_{table}_sport_id')
+        db.engine.execute(f'ALTER TABLE {table} DROP COLUMN sport_id')
+    db.engine.execute('DROP TABLE IF EXISTS sport_aliases')
+    db.engine.execute('DROP TABLE IF EXISTS sports')
@@ -0,0 +1,40 @@
+"""Guarda os horários das reservas como minutos inteiros indexados"""
+
+from sqlalchemy import inspect
+
+from app import db
+from app.utils.migrations import backfill
+
+# 'HH:MM' -> minutos desde 00:00
+def _minutos(coluna):
+    return f'(CAST(substr({coluna}, 1, 2) AS INTEGER) * 60 + CAST(substr({coluna}, 4, 2) AS INTEGER))'
+
+def upgrade():
+    # Bancos sem o módulo de reservas não têm a tabela
+    if not inspect(db.engine).has_table('reservas'):
+        return
+    
+    # Adiciona os horários das reservas como minutos inteiros
+    columns = [column['name'] for column in inspect(db.engine).get_columns('reservas')]
+    for column in ('inicio_min', 'fim_min'):
+        if column not in columns:
+            db.engine.execute(f'ALTER TABLE reservas ADD COLUMN {column} INTEGER NOT NULL DEFAULT 0')
+    
+    # Preenche a partir dos textos; reservas que atravessam a meia-noite terminam depois de 1440
+    backfill(
+        '0006:reservas_minutos', 'reservas',
+        f"inicio_min = {_minutos('hora_inicio')}, "
+        f"fim_min = {_minutos('hora_fim')} + CASE "
+        f"WHEN {_minutos('hora_fim')} <= {_minutos('hora_inicio')} THEN 1440 ELSE 0 END"
+    )
+    
+    # Índice usado na verificação de conflitos
+    db.engine.execute(
+        'CREATE INDEX IF NOT EXISTS ix_reservas_sala_data_inicio ON reservas (sala_id, data, inicio_min)'
+    )
+
+def downgrade():
+    # Remove o índice e as colunas de minutos
+    db.engine.execute('DROP INDEX IF EXISTS ix_reservas_sala_data_inicio')
+    db.engine.execute('ALTER TABLE reservas DROP COLUMN fim_min')
+    db.engine.execute('ALTER TABLE reservas DROP COLUMN inicio_min')
@@ -0,0 +1,15 @@
+"""Sincroniza hourly_price com o campo legado valor_hora nas quadras"""
+
+from app.utils.migrations import backfill
+
+def upgrade():
+    # Quadras antigas só tinham valor_hora; as novas gravam os dois campos (ver Court.__init__)
+    backfill(
+        '0007:courts_hourly_price', 'courts',
+        'hourly_price = valor_hora',
+        where='hourly_price = 0 AND valor_hora > 0'
+    )
+
+def downgrade():
+    # Os valores sincronizados continuam válidos; nada a desfazer
+    pass
@@ -0,0 +1,21 @@
+"""Adiciona a sequência de alterações a quadras, salas e participantes"""
+
+from app import db
+from app.utils.migrations import add_column, has_table
+
+TABLES = ('courts', 'rooms', 'participants')
+
+def upgrade():
+    # Linhas existentes ficam sem sequência: aparecem na carga completa, e as próximas escritas a preenchem
+    for table in TABLES:
+        add_column(table, 'change_seq', 'INTEGER')
+        db.engine.execute(f'CREATE INDEX IF NOT EXISTS ix_{table}_change_seq ON {table} (change_seq)')
+    # As tabelas de arquivo copiam todas as colunas em comum com as atuais
+    for table in ('rooms_archive', 'participants_archive'):
+        if has_table(table):
+            add_column(table, 'change_seq', 'INTEGER')
+
+def downgrade():
+    for table in TABLES:
+        db.engine.execute(f'DROP INDEX IF EXISTS ix_{table}_change_seq')
+        db.engine.execute(f'ALTER TABLE {table} DROP COLUMN change_seq')
@@ -0,0 +1,84 @@
+"""Recria salas e participantes com AUTOINCREMENT, para que ids arquivados não sejam reaproveitados
+
+Sem AUTOINCREMENT o SQLite entrega max(id) + 1 ao próximo INSERT: quando a
+sala de maior id é arquivada (e apagada), a próxima sala recebe o mesmo id, e
+o arquivamento seguinte falha com UNIQUE em rooms_archive.id. O SQLite não
+permite ligar AUTOINCREMENT com ALTER TABLE, então esta migração reescreve as
+duas tabelas uma única vez (cópia + troca de nome), preservando índices e
+triggers, e posiciona sqlite_sequence acima de todo id já usado.
+"""
+
+from sqlalchemy import MetaData
+from sqlalchemy.schema import CreateTable
+
+from app import db
+from app.utils.migrations import has_table
+
+TABLES = (
+    ('rooms', 'rooms_archive'),
+    ('participants', 'participants_archive'),
+)
+
+def upgrade():
+    # No PostgreSQL as sequências do SERIAL já nunca voltam atrás
+    if db.engine.dialect.name != 'sqlite':
+        return
+    for table, archive in TABLES:
+        _rebuild(table)
+        _seed_sequence(table, archive)
+
+def downgrade():
+    # Voltar a reaproveitar ids é justamente o que esta migração evita: nada a desfazer
+    pass
+
+
+def _rebuild(table):
+    with db.engine.begin() as connection:
+        ddl = connection.execute(db.text(
+            "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = :table"
+        ), {'table': table}).scalar()
+        if 'AUTOINCREMENT' in ddl.upper():
+            return
+
+        # Índices e triggers somem com a tabela antiga; guarda o SQL para recriá-los
+        dependents = [row[0] for row in connection.execute(db.text(
+            "SELECT sql FROM sqlite_master WHERE type IN ('index', 'trigger') AND tbl_name = :table "
+            "AND sql IS NOT NULL ORDER BY type"
+        ), {'table': table})]
+
+        # Cópia do modelo (já com sqlite_autoincrement) sob outro nome; as demais tabelas vão junto para resolver as FKs
+        metadata = MetaData()
+        for source in db.metadata.sorted_tables:
+            source.to_metadata(metadata)
+        new = db.metadata.tables[table].to_metadata(metadata, name=f'{table}_new')
+        connection.execute(CreateTable(new).compile(dialect=db.engine.dialect).string)
+
+        existing = {row[1] for row in connection.execute(db.text(f'PRAGMA table_info({table})'))}
+        columns = ', '.join(column.name for column in new.columns if column.name in existing)
+        connection.execute(f'INSERT INTO {table}_new ({columns}) SELECT {columns} FROM {table}')
+        connection.execute(f'DROP TABLE {table}')
+        connection.execute(f'ALTER TABLE {table}_new RENAME TO {table}')
+        for statement in dependents:
+            connection.execute(statement)
+
+
+def _seed_sequence(table, archive):
+    # O próximo id fica acima das linhas atuais, das arquivadas e das lápides de exclusão
+    sources = [f'SELECT MAX(id) AS id FROM {table}']
+    if has_table(archive):
+        sources.append(f'SELECT MAX(id) FROM {archive}')
+    if has_table('tombstones'):
+        sources.append(f"SELECT MAX(row_id) FROM tombstones WHERE table_name = '{table}'")
+    with db.engine.begin() as connection:
+        last = connection.execute(f'SELECT MAX(id) FROM ({" UNION ALL ".join(sources)})').scalar() or 0
+        current = connection.execute(db.text(
+            'SELECT seq FROM sqlite_sequence WHERE name = :table'
+        ), {'table': table}).scalar()
+        if current is None:
+            connection.execute(db.text(
+                'INSERT INTO sqlite_sequence (name, seq) VALUES (:table, :seq)'
+            ), {'table': table, 'seq': last})
+        elif current < last:
+            connection.execute(db.text(
+                'UPDATE sqlite_sequence SET seq = :seq WHERE name = :table'
+            ), {'table': table, 'seq': last})
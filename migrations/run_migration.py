@@ -4,10 +4,14 @@ import sys
 # Adiciona o diretório raiz ao PYTHONPATH
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from app import app
-from add_valor_column import upgrade
+from app import create_app
+from app.utils import migrations
+
+# Equivalente a `flask schema upgrade`
+app = create_app()
 
 with app.app_context():
-    print("Executando migração para adicionar coluna valor...")
-    upgrade()
-    print("Migração concluída com sucesso!") 
\ No newline at end of file
+    print("Aplicando migrações pendentes...")
+    for migration in migrations.upgrade():
+        print(f"  {migration.version} {migration.description}")
+    print("Migração concluída com sucesso!")
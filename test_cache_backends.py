@@ -0,0 +1,190 @@
+"""
+Exercita os backends de cache (memória, arquivos e Redis) com a mesma sequência de operações
+
+Uso: python test_cache_backends.py
+O backend Redis é testado contra um servidor local mínimo que fala o protocolo
+RESP (GET, SET com EX, DEL, INCR, SCAN), sem precisar de um Redis instalado.
+Os backends compartilhados também são verificados a partir de outro processo,
+como fariam dois workers do gunicorn.
+"""
+import fnmatch
+import logging
+import multiprocessing
+import socketserver
+import sys
+import tempfile
+import threading
+import time
+
+from app.utils.cache import FileCache, LRUCache, RedisCache, register
+
+
+class RespStandIn(socketserver.ThreadingTCPServer):
+    """Servidor em memória com o subconjunto de comandos usado pelo cache"""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), RespHandler)
+        self.data = {}
+        self.lock = threading.Lock()
+
+    @property
+    def url(self):
+        return f'redis://127.0.0.1:{self.server_address[1]}/0'
+
+    def run(self, command, args):
+        now = time.time()
+        with self.lock:
+            for key in [key for key, (_, expires_at) in self.data.items() if expires_at and expires_at < now]:
+                del self.data[key]
+            if command == b'GET':
+                item = self.data.get(args[0])
+                return item[0] if item else None
+            if command == b'SET':
+                expires_at = now + int(args[3]) if len(args) > 3 and args[2].upper() == b'EX' else None
+                self.data[args[0]] = (args[1], expires_at)
+                return 'OK'
+            if command == b'DEL':
+                return sum(self.data.pop(key, None) is not None for key in args)
+            if command == b'INCR':
+                value = int(self.data.get(args[0], (b'0', None))[0]) + 1
+                self.data[args[0]] = (str(value).encode(), None)
+                return value
+            if command == b'SCAN':
+                pattern = args[args.index(b'MATCH') + 1].decode() if b'MATCH' in args else '*'
+                keys = [key for key in self.data if fnmatch.fnmatchcase(key.decode(), pattern)]
+                return [b'0', keys]
+            if command == b'SELECT':
+                return 'OK'
+        raise ValueError(f'comando não suportado: {command!r}')
+
+
+class RespHandler(socketserver.StreamRequestHandler):
+    def read_command(self):
+        line = self.rfile.readline()
+        if not line:
+            return None
+        args = []
+        for _ in range(int(line[1:])):
+            length = int(self.rfile.readline()[1:])
+            args.append(self.rfile.read(length + 2)[:-2])
+        return args
+
+    def encode(self, value):
+        if value is None:
+            return b'$-1\r\n'
+        if isinstance(value, str):
+            return f'+{value}\r\n'.encode()
+        if isinstance(value, int):
+            return f':{value}\r\n'.encode()
+        if isinstance(value, bytes):
+            return b'$%d\r\n%s\r\n' % (len(value), value)
+        return b'*%d\r\n' % len(value) + b''.join(self.encode(item) for item in value)
+
+    def handle(self):
+        while True:
+            args = self.read_command()
+            if args is None:
+                return
+            try:
+                reply = self.encode(self.server.run(args[0].upper(), args[1:]))
+            except ValueError as error:
+                reply = f'-ERR {error}\r\n'.encode()
+            self.wfile.write(reply)
+
+
+def check(condition, message, failures):
+    print(f"{'ok     ' if condition else 'FALHOU '} {message}")
+    if not condition:
+        failures.append(message)
+
+
+def exercise(name, cache, failures):
+    """Mesma sequência de operações para qualquer backend"""
+    cache.clear()
+    check(cache.get(('sala', 1)) is None, f'{name}: chave ausente retorna None', failures)
+    cache.set(('sala', 1), {'nome': 'Racha', 'vagas': [1, 2, 3]})
+    check(cache.get(('sala', 1)) == {'nome': 'Racha', 'vagas': [1, 2, 3]}, f'{name}: lê o valor gravado', failures)
+    cache.delete(('sala', 1))
+    check(cache.get(('sala', 1)) is None, f'{name}: delete remove a chave', failures)
+
+    generation = cache.generation('cidade')
+    cache.set(('listagem', generation), 'página')
+    cache.bump('cidade')
+    check(cache.get(('listagem', cache.generation('cidade'))) is None,
+          f'{name}: bump invalida as chaves da geração anterior', failures)
+
+    cache.set('curta', 'valor', ttl=1)
+    time.sleep(1.1)
+    check(cache.get('curta') is None, f'{name}: entrada expira após o ttl', failures)
+
+
+def other_worker(kind, location, queue):
+    """Executado em outro processo: lê o que o primeiro gravou e incrementa uma geração"""
+    cache = FileCache(location) if kind == 'file' else RedisCache(location, prefix='teste:')
+    queue.put((cache.get('compartilhada'), cache.bump('cidade')))
+
+
+def shared_between_processes(name, kind, location, cache, failures):
+    cache.set('compartilhada', [1, 2, 3])
+    before = cache.generation('cidade')
+    queue = multiprocessing.Queue()
+    process = multiprocessing.Process(target=other_worker, args=(kind, location, queue))
+    process.start()
+    value, generation = queue.get(timeout=10)
+    process.join()
+    check(value == [1, 2, 3], f'{name}: outro processo lê a entrada gravada', failures)
+    check(generation == before + 1 and cache.generation('cidade') == generation,
+          f'{name}: bump em outro processo é visto por este', failures)
+
+
+def run():
+    logging.disable(logging.CRITICAL)
+    failures = []
+
+    exercise('memória', LRUCache(max_entries=100), failures)
+    small = LRUCache(max_entries=100, max_bytes=1000)
+    for i in range(10):
+        small.set(i, 'x' * 300)
+    check(small.info()['bytes'] <= 1000 and small.get(9) is not None and small.get(0) is None,
+          'memória: limite por bytes descarta as entradas menos usadas', failures)
+
+    directory = tempfile.mkdtemp()
+    file_cache = FileCache(directory)
+    exercise('arquivos', file_cache, failures)
+    shared_between_processes('arquivos', 'file', directory, file_cache, failures)
+    limited = FileCache(tempfile.mkdtemp(), max_bytes=4000)
+    for i in range(20):
+        limited.set(i, 'x' * 500)
+    limited.sweep()
+    check(limited.info()['bytes'] <= 4000 and limited.get(19) is not None,
+          'arquivos: sweep mantém o diretório dentro de max_bytes', failures)
+
+    server = RespStandIn()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    redis_cache = RedisCache(server.url, prefix='teste:')
+    exercise('redis', redis_cache, failures)
+    shared_between_processes('redis', 'redis', server.url, redis_cache, failures)
+
+    registered = register('teste_metricas')
+    registered.backend = RedisCache('redis://127.0.0.1:1/0', prefix='teste:')
+    registered.set('a', 1)
+    check(registered.get('a') is None and registered.stats()['errors'] >= 2,
+          'registrado: servidor fora do ar vira falta, sem exceção', failures)
+    registered.backend = redis_cache
+    registered._down_until = 0
+    registered.reset_stats()
+    registered.set('a', 1)
+    registered.get('a')
+    registered.get('b')
+    check(registered.stats()['hit_rate'] == 0.5, 'registrado: taxa de acerto', failures)
+
+    server.shutdown()
+    print('OK' if not failures else f'FALHOU ({len(failures)})')
+    return not failures
+
+
+if __name__ == '__main__':
+    sys.exit(0 if run() else 1)
@@ -0,0 +1,97 @@
+"""
+Dispara centenas de inscrições simultâneas em uma sala e verifica o resultado
+
+Uso: python test_join_concurrency.py [usuarios] [vagas]
+Roda em um banco SQLite temporário, sem tocar no banco da aplicação.
+"""
+import os
+import sys
+import tempfile
+import threading
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from app import create_app, db
+from app.models.models import User, Room, Participant
+
+
+def run(total_users=300, max_participants=20, taps_per_user=2, workers=64):
+    logging.getLogger('sqlalchemy').setLevel(logging.WARNING)
+    logging.getLogger('sqlalchemy.engine').setLevel(logging.WARNING)
+
+    tmp_dir = tempfile.mkdtemp()
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{os.path.join(tmp_dir, 'join_concurrency.db')}",
+        'JOBS_DB_PATH': os.path.join(tmp_dir, 'jobs.db'),
+        'JOBS_INLINE_WORKER': False,
+        'WTF_CSRF_ENABLED': False
+    })
+
+    with app.app_context():
+        # Usuários criados direto na tabela para não pagar o hash de senha
+        db.session.execute(User.__table__.insert(), [
+            {'username': f'jogador{i}', 'email': f'jogador{i}@example.com', 'name': f'Jogador {i}',
+             'password_hash': '!', 'created_at': datetime.utcnow(), 'is_active': True}
+            for i in range(1, total_users + 2)
+        ])
+        room = Room(name='Racha de teste', sport='Futebol', date=datetime.utcnow() + timedelta(days=1),
+                    max_participants=max_participants, creator_id=total_users + 1, city='São Paulo - SP')
+        db.session.add(room)
+        db.session.commit()
+        link_code = room.link_code
+        room_id = room.id
+
+    flashes = {}
+    flashes_lock = threading.Lock()
+    start = threading.Barrier(min(workers, total_users * taps_per_user))
+
+    def tap(user_id):
+        client = app.test_client()
+        with client.session_transaction() as session:
+            session['_user_id'] = str(user_id)
+            session['_fresh'] = True
+        try:
+            start.wait(timeout=5)
+        except threading.BrokenBarrierError:
+            pass
+        response = client.get(f'/sala/{link_code}/participar')
+        with client.session_transaction() as session:
+            categories = [category for category, _ in session.get('_flashes', [])]
+        with flashes_lock:
+            for category in categories:
+                flashes[category] = flashes.get(category, 0) + 1
+        return response.status_code
+
+    requests = [user_id for user_id in range(1, total_users + 1) for _ in range(taps_per_user)]
+    began = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        statuses = list(pool.map(tap, requests))
+    elapsed = time.perf_counter() - began
+
+    with app.app_context():
+        active = Participant.query.filter_by(room_id=room_id, is_active=True).count()
+        distinct_users = db.session.query(db.func.count(db.distinct(Participant.user_id))).filter(
+            Participant.room_id == room_id, Participant.is_active == True).scalar()
+
+    print(f'Requisições: {len(requests)} em {elapsed:.2f}s ({len(requests) / elapsed:.0f} req/s)')
+    print(f'Status HTTP: { {s: statuses.count(s) for s in set(statuses)} }')
+    print(f'Mensagens: {flashes}')
+    print(f'Participações ativas: {active} (usuários distintos: {distinct_users})')
+
+    expected_waiting = max(0, total_users - max_participants)
+    ok = (
+        active == total_users
+        and distinct_users == total_users
+        and flashes.get('success', 0) == min(total_users, max_participants)
+        and flashes.get('warning', 0) == expected_waiting
+        and flashes.get('info', 0) == total_users * (taps_per_user - 1)
+    )
+    print('OK' if ok else 'FALHOU')
+    return ok
+
+
+if __name__ == '__main__':
+    args = [int(arg) for arg in sys.argv[1:3]]
+    sys.exit(0 if run(*args) else 1)
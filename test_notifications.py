@@ -0,0 +1,194 @@
+"""
+Testa os avisos de promoção da lista de espera contra um servidor SMTP local
+
+Uso: python test_notifications.py
+Monta um banco temporário, faz confirmados saírem (e serem removidos pelo
+organizador) pelas rotas da aplicação e executa a tarefa de envio da fila.
+Verifica que as saídas agendam uma única tarefa, que cada usuário recebe uma
+só mensagem com todas as salas em que foi confirmado, que o limite por
+execução deixa o restante para a próxima e que desativar um confirmado pela
+API do painel também avisa.
+"""
+import email
+import logging
+import os
+import socketserver
+import sys
+import tempfile
+import threading
+from datetime import datetime, timedelta
+
+from app import create_app, db
+from app.models.models import Notification, Participant, Room, User
+from app.utils import jobs
+
+
+class SmtpStandIn(socketserver.ThreadingTCPServer):
+    """Servidor que aceita qualquer mensagem e a guarda em memória"""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), SmtpHandler)
+        self.messages = []
+
+
+class SmtpHandler(socketserver.StreamRequestHandler):
+    def reply(self, line):
+        self.wfile.write(f'{line}\r\n'.encode())
+
+    def handle(self):
+        self.reply('220 localhost')
+        recipients = []
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode().strip().upper()
+            if command.startswith('EHLO') or command.startswith('HELO'):
+                self.reply('250 localhost')
+            elif command.startswith('RCPT'):
+                recipients.append(line.decode().split(':', 1)[1].strip(' <>\r\n'))
+                self.reply('250 OK')
+            elif command == 'DATA':
+                self.reply('354 fim com .')
+                data = []
+                while True:
+                    line = self.rfile.readline()
+                    if line in (b'.\r\n', b''):
+                        break
+                    data.append(line[1:] if line.startswith(b'..') else line)
+                self.server.messages.append((recipients, email.message_from_bytes(b''.join(data))))
+                recipients = []
+                self.reply('250 OK')
+            elif command == 'QUIT':
+                self.reply('221 tchau')
+                return
+            else:
+                # MAIL, RSET, NOOP
+                self.reply('250 OK')
+
+
+def check(condition, message, failures):
+    print(f"{'ok     ' if condition else 'FALHOU '} {message}")
+    if not condition:
+        failures.append(message)
+
+
+def client_for(app, user_id):
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user_id)
+        session['_fresh'] = True
+    return client
+
+
+def seed(app):
+    """Organizador, dois confirmados e três na espera na sala 1; um confirmado e um na espera nas salas 2 e 3"""
+    with app.app_context():
+        users = [User(f'jogador{i}', f'jogador{i}@example.com', f'Jogador {i}', 'senha') for i in range(6)]
+        db.session.add_all(users)
+        db.session.commit()
+        organizer, ana, bia, caio, davi, edu = [user.id for user in users]
+
+        first = Room('Racha de quinta', 'Futebol', datetime.utcnow() + timedelta(days=2), 2,
+                     creator_id=organizer, city='Recife - PE', location='Quadra Central')
+        second = Room('Vôlei de sábado', 'Vôlei', datetime.utcnow() + timedelta(days=4), 1,
+                      creator_id=organizer, city='Recife - PE')
+        third = Room('Basquete de domingo', 'Basquete', datetime.utcnow() + timedelta(days=5), 1,
+                     creator_id=organizer, city='Recife - PE')
+        db.session.add_all([first, second, third])
+        db.session.commit()
+        for room, user_ids in ((first, [ana, bia, caio, davi, edu]), (second, [ana, caio]), (third, [bia, edu])):
+            for user_id in user_ids:
+                db.session.add(Participant(user_id, room.id))
+                db.session.commit()
+        bia_participation = Participant.query.filter_by(room_id=first.id, user_id=bia).one()
+        edu_participation = Participant.query.filter_by(room_id=first.id, user_id=edu).one()
+        bia_third = Participant.query.filter_by(room_id=third.id, user_id=bia).one()
+        return {
+            'users': (organizer, ana, bia, caio, davi, edu),
+            'first': first.link_code, 'second': second.link_code,
+            'bia': bia_participation.id, 'edu': edu_participation.id,
+            'third_id': third.id, 'bia_third': bia_third.id,
+        }
+
+
+def run_queued(app):
+    """Executa as tarefas de envio prontas; retorna os resultados"""
+    queue = jobs.get_queue()
+    worker = jobs.Worker(app, queue)
+    results = []
+    while True:
+        job = queue.claim()
+        if job is None:
+            return results
+        worker.run_job(job)
+        results.append(next(entry for entry in queue.stats()['recent'] if entry['id'] == job['id']))
+
+
+def run():
+    logging.disable(logging.CRITICAL)
+    failures = []
+
+    server = SmtpStandIn()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    directory = tempfile.mkdtemp()
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{os.path.join(directory, 'teste.db')}",
+        'JOBS_DB_PATH': os.path.join(directory, 'jobs.db'),
+        'JOBS_INLINE_WORKER': False,
+        'ARCHIVE_INTERVAL': 0,
+        'MAIL_SERVER': '127.0.0.1',
+        'MAIL_PORT': server.server_address[1],
+        'NOTIFY_BATCH_DELAY': 0,
+        'NOTIFY_RATE': 100,
+        'NOTIFY_MAX_PER_RUN': 1,
+    })
+    data = seed(app)
+    organizer, ana, bia, caio, davi, edu = data['users']
+
+    # Ana sai das duas salas (Caio é promovido nas duas), o organizador remove Bia (Davi é promovido)
+    # e Edu, que estava na espera, sai sem promover ninguém
+    client_for(app, ana).get(f"/sala/{data['first']}/sair")
+    client_for(app, ana).get(f"/sala/{data['second']}/sair")
+    client_for(app, organizer).get(f"/sala/{data['first']}/remover/{data['bia']}")
+    client_for(app, edu).get(f"/sala/{data['first']}/sair")
+
+    with app.app_context():
+        pending = sorted((row.user_id, row.room_id) for row in Notification.query.filter_by(sent_at=None))
+    check(len(pending) == 3 and sorted({user_id for user_id, _ in pending}) == sorted([caio, davi]),
+          'saídas de confirmados gravam um aviso por promoção', failures)
+    check(jobs.get_queue().stats()['depth'].get('queued') == 1, 'várias saídas agendam uma única tarefa', failures)
+
+    results = run_queued(app)
+    check(len(results) == 2 and all(result['status'] == 'done' for result in results),
+          'limite por execução deixa o restante para uma nova tarefa', failures)
+
+    by_recipient = {recipients[0]: message for recipients, message in server.messages}
+    check(len(server.messages) == 2, 'uma mensagem por usuário', failures)
+    caio_message = by_recipient.get(f'jogador{caio - 1}@example.com')
+    check(caio_message is not None and 'Racha de quinta' in caio_message.get_payload(decode=True).decode()
+          and 'Vôlei de sábado' in caio_message.get_payload(decode=True).decode(),
+          'promoções do mesmo usuário reunidas em uma mensagem', failures)
+    check(f'jogador{davi - 1}@example.com' in by_recipient, 'remoção pelo organizador também avisa', failures)
+
+    with app.app_context():
+        check(Notification.query.filter_by(sent_at=None).count() == 0, 'avisos marcados como enviados', failures)
+
+    # O organizador desativa Bia pela API do painel: Edu sai da espera da sala 3
+    client_for(app, organizer).put(f"/admin/api/rooms/{data['third_id']}/participants/{data['bia_third']}",
+                                   json={'is_active': False})
+    with app.app_context():
+        pending = [(row.user_id, row.room_id) for row in Notification.query.filter_by(sent_at=None)]
+    check(pending == [(edu, data['third_id'])], 'desativação pela API do painel também avisa', failures)
+
+    server.shutdown()
+    print('OK' if not failures else f'FALHOU ({len(failures)})')
+    return not failures
+
+
+if __name__ == '__main__':
+    sys.exit(0 if run() else 1)
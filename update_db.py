@@ -1,56 +1,29 @@
 from app import create_app, db
 from app.models.models import User, Room, Participant
-import sqlite3
+from app.utils import migrations
 import os
 
-# Criar a aplicação
-app = create_app()
-
 # Caminho para o banco de dados
 db_path = 'app/esportes.db'
+banco_existia = os.path.exists(db_path)
+
+# Criar a aplicação (cria as tabelas que ainda não existem)
+app = create_app()
 
 # Verificar se o arquivo existe
-if os.path.exists(db_path):
-    try:
-        # Conectar ao banco de dados SQLite
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-        
-        # Verificar se as colunas já existem
-        cursor.execute("PRAGMA table_info(rooms)")
-        columns = cursor.fetchall()
-        column_names = [column[1] for column in columns]
-        
-        # Adicionar coluna is_private se não existir
-        if 'is_private' not in column_names:
-            cursor.execute("ALTER TABLE rooms ADD COLUMN is_private BOOLEAN DEFAULT 0")
-            print("Coluna 'is_private' adicionada com sucesso à tabela 'rooms'!")
-        else:
-            print("A coluna 'is_private' já existe na tabela 'rooms'.")
+if banco_existia:
+    with app.app_context():
+        try:
+            # Aplica as migrações versionadas pendentes (ver migrations/)
+            aplicadas = migrations.upgrade()
+            for migration in aplicadas:
+                print(f"Migração {migration.version} aplicada: {migration.description}")
+            if not aplicadas:
+                print("O banco de dados já está atualizado.")
             
-        # Adicionar coluna location se não existir
-        if 'location' not in column_names:
-            cursor.execute("ALTER TABLE rooms ADD COLUMN location TEXT")
-            print("Coluna 'location' adicionada com sucesso à tabela 'rooms'!")
-        else:
-            print("A coluna 'location' já existe na tabela 'rooms'.")
-        
-        # Adicionar coluna city se não existir
-        if 'city' not in column_names:
-            cursor.execute("ALTER TABLE rooms ADD COLUMN city TEXT DEFAULT 'Não informada'")
-            print("Coluna 'city' adicionada com sucesso à tabela 'rooms'!")
-        else:
-            print("A coluna 'city' já existe na tabela 'rooms'.")
-        
-        # Confirmar as alterações
-        conn.commit()
-        
-        # Fechar a conexão
-        conn.close()
-        
-        print("Banco de dados atualizado com sucesso!")
-    except Exception as e:
-        print(f"Erro ao atualizar o banco de dados: {e}")
+            print("Banco de dados atualizado com sucesso!")
+        except Exception as e:
+            print(f"Erro ao atualizar o banco de dados: {e}")
 else:
     print(f"O arquivo de banco de dados {db_path} não foi encontrado.")
     print("Criando um novo banco de dados...")